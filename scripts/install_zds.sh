@@ -510,6 +510,7 @@ if  ! $(_in "-data" $@) && ( $(_in "+data" $@) || $(_in "+base" $@) || $(_in "+f
     fi
 
     python manage.py loaddata fixtures/*.yaml; exVal=$?
+    python manage.py refresh_forum_counters; exVal=($exVal + $?)
     python manage.py load_factory_data fixtures/advanced/aide_tuto_media.yaml; exVal=($exVal + $?)
     python manage.py load_fixtures --size=low --all; exVal=($exVal + $?)
 
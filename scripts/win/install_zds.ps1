@@ -272,6 +272,7 @@ if (-not (_in "-data") -and ((_in "+data") -or (_in "+base") -or (_in "+full")))
   PrintInfo " | -> Make fixtures."
   PrintInfo " | Step 1:"
   python manage.py loaddata (dir .\fixtures\*.yaml); $exVal=$LASTEXITCODE
+  python manage.py refresh_forum_counters; $exVal=($exVal + $LASTEXITCODE)
   PrintInfo " | Step 2:"
   python manage.py load_factory_data .\fixtures\advanced\aide_tuto_media.yaml; $exVal=($exVal + $LASTEXITCODE)
   PrintInfo " | Step 3:"
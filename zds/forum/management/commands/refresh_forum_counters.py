@@ -0,0 +1,26 @@
+from django.core.management import BaseCommand
+from django.db.models import Count
+
+from zds.forum.models import Forum, Topic
+
+
+class Command(BaseCommand):
+    help = "Compute again the numbers of topics and posts and the last messages stored in the forums and topics"
+
+    def handle(self, *args, **options):
+        fixed = 0
+        for topic_pk, post_count, real_post_count in Topic.objects.annotate(real_post_count=Count("post")).values_list(
+            "pk", "post_count", "real_post_count"
+        ):
+            if post_count != real_post_count:
+                Topic.objects.filter(pk=topic_pk).update(post_count=real_post_count)
+                fixed += 1
+        self.stdout.write(f"{fixed} topics fixed")
+
+        fixed = 0
+        for forum in Forum.objects.all():
+            counters = (forum.topic_count, forum.post_count, forum.last_message_id)
+            forum.refresh_counters()
+            if counters != (forum.topic_count, forum.post_count, forum.last_message_id):
+                fixed += 1
+        self.stdout.write(f"{fixed} forums fixed")
@@ -16,28 +16,20 @@ class ForumManager(models.Manager):
 
         :param category: the related category
         :type category: zds.forum.models.ForumCategory
-        :param with_count: optional parameter: if true, will preload thread and post number for each forum inside \
-        category
+        :param with_count: optional parameter: if true, will preload the last message of each forum inside category \
+        (the numbers of threads and posts are always loaded)
         :type with_count: bool
         """
         queryset = self.filter(category=category, groups__isnull=True).select_related("category").distinct()
         if with_count:
-            # this request count the threads in each forum
-            thread_sub_query = "SELECT COUNT(*) FROM forum_topic WHERE forum_topic.forum_id=forum_forum.id"
-            # this request count the posts in each forum
-            post_sub_query = (
-                "SELECT COUNT(*) FROM forum_post WHERE forum_post.topic_id "
-                "IN(SELECT id FROM forum_topic WHERE forum_topic.forum_id=forum_forum.id)"
-            )
-
-            queryset = queryset.extra(select={"thread_count": thread_sub_query, "post_count": post_sub_query})
+            queryset = queryset.select_related("last_message__topic")
         return queryset.all()
 
     def get_private_forums_of_category(self, category, user):
         return (
             self.filter(category=category, groups__in=user.groups.all())
             .order_by("position_in_category")
-            .select_related("category")
+            .select_related("category", "last_message__topic")
             .distinct()
             .all()
         )
@@ -154,21 +146,58 @@ class TopicReadManager(models.Manager):
         """
         Checks if the user has read the **last post** of the topic.
         Returns false if the user read the topic except its last post.
-        Technically this is done by checking if the user has a `TopicRead` object
-        for the last post of this topic.
+        Technically this is done by checking if the read cursor of the user points to the last post of this topic,
+        so that the read states prefetched by ``prefetch_read_states()`` are not queried again.
         :param topic: A topic
         :param user: A user. If undefined, the current user is used.
         :param check_auth: if True will shortcut to ``False`` if user is not authenticated
         :return: ``True`` if topic has been read by user
         """
-        if not hasattr(topic, "_is_read"):
-            setattr(topic, "_is_read", {})
         if user is None or (check_auth and not user.is_authenticated):
             return False
-        cache_is_read = getattr(topic, "_is_read")
-        if user.username not in cache_is_read:
-            cache_is_read[user.username] = self.filter(post=topic.last_message, topic=topic, user=user).exists()
-        return cache_is_read[user.username]
+        cursor = topic.get_read_cursor(user)
+        return cursor is not None and cursor[0] == topic.last_message_id
+
+    def get_read_cursors(self, user, topics):
+        """get the read cursors of a user, which are the primary key and position of the last post he read, for a set \
+        of topics, with a single query.
+
+        :param user: an authenticated user
+        :param topics: the topics (or their primary keys)
+        :type topics: list
+        :return: the ``(post_pk, post_position)`` cursors, by topic primary key. Topics never read are missing.
+        :rtype: dict
+        """
+        queryset = self.filter(user__pk=user.pk, topic__in=topics).values_list("topic_id", "post_id", "post_position")
+        return {topic_pk: (post_pk, post_position) for topic_pk, post_pk, post_position in queryset}
+
+    def prefetch_read_cursors(self, user, topics):
+        """store the read cursors of a user on the topics, so that ``Topic.get_read_cursor()`` (and thus the \
+        "last read post" and "first unread post" methods) no longer query them one topic at a time.
+
+        :param user: a user, nothing is queried if he is not authenticated
+        :param topics: the topics
+        :type topics: list
+        """
+        topics = list(topics)
+        cursors = self.get_read_cursors(user, topics) if user.is_authenticated else {}
+        for topic in topics:
+            topic.__dict__.setdefault("_read_cursors", {})[user.pk] = cursors.get(topic.pk)
+
+    def prefetch_read_states(self, user, topics):
+        """resolve whether the user read the last post of each topic of a list (a page of a topics list for \
+        instance) with a single query. The read cursors are stored on the topics, so that ``topic.is_read`` and the \
+        "last read post" links of these topics do not query anything else.
+
+        :param user: a user, nothing is queried if he is not authenticated
+        :param topics: the topics
+        :type topics: list
+        :return: the primary keys of the topics whose last post was read by the user
+        :rtype: list
+        """
+        topics = list(topics)
+        self.prefetch_read_cursors(user, topics)
+        return [topic.pk for topic in topics if self.is_topic_last_message_read(topic, user)]
 
     def topic_read_by_user(self, user, topic_sub_list=None):
         """get all the topic that the user has already read.
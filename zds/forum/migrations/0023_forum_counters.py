@@ -0,0 +1,60 @@
+# Generated by Django 3.2.12 on 2026-10-18 09:41
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+import django.db.models.deletion
+
+
+def compute_counters(apps, *_):
+    Forum = apps.get_model("forum", "Forum")
+    Topic = apps.get_model("forum", "Topic")
+    Post = apps.get_model("forum", "Post")
+
+    def count(queryset, field):
+        return Coalesce(Subquery(queryset.values(field).annotate(count=Count("pk")).values("count")), 0)
+
+    Topic.objects.update(post_count=count(Post.objects.filter(topic=OuterRef("pk")), "topic"))
+    Forum.objects.update(
+        topic_count=count(Topic.objects.filter(forum=OuterRef("pk")), "forum"),
+        post_count=count(Post.objects.filter(topic__forum=OuterRef("pk")), "topic__forum"),
+        last_message=Subquery(Post.objects.filter(topic__forum=OuterRef("pk")).order_by("-pubdate").values("pk")[:1]),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("forum", "0022_topic_github_repository_name"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="forum",
+            name="last_message",
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                related_name="+",
+                to="forum.post",
+                verbose_name="Dernier message",
+            ),
+        ),
+        migrations.AddField(
+            model_name="forum",
+            name="post_count",
+            field=models.PositiveIntegerField(default=0, verbose_name="Nombre de messages"),
+        ),
+        migrations.AddField(
+            model_name="forum",
+            name="topic_count",
+            field=models.PositiveIntegerField(default=0, verbose_name="Nombre de sujets"),
+        ),
+        migrations.AddField(
+            model_name="topic",
+            name="post_count",
+            field=models.PositiveIntegerField(default=0, verbose_name="Nombre de messages"),
+        ),
+        migrations.RunPython(compute_counters, migrations.RunPython.noop),
+    ]
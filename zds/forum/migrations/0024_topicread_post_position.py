@@ -0,0 +1,27 @@
+# Generated by Django 3.2.12 on 2026-10-18 11:02
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def fill_post_position(apps, *_):
+    TopicRead = apps.get_model("forum", "TopicRead")
+    Post = apps.get_model("forum", "Post")
+
+    TopicRead.objects.update(post_position=Subquery(Post.objects.filter(pk=OuterRef("post")).values("position")[:1]))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("forum", "0023_forum_counters"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="topicread",
+            name="post_position",
+            field=models.PositiveIntegerField(default=0, verbose_name="Position du message lu"),
+        ),
+        migrations.RunPython(fill_post_position, migrations.RunPython.noop),
+    ]
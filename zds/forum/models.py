@@ -6,8 +6,9 @@ from django.conf import settings
 from django.contrib.auth.models import Group, User, AnonymousUser
 from django.urls import reverse
 from django.db import models
+from django.db.models import F
 from django.dispatch import receiver
-from django.db.models.signals import pre_delete
+from django.db.models.signals import pre_delete, post_delete, post_save, m2m_changed
 
 from elasticsearch_dsl.field import Text, Keyword, Integer, Boolean, Float, Date
 
@@ -18,6 +19,18 @@ from zds.utils import get_current_user, old_slugify
 from zds.utils.models import Comment, Tag
 
 
+def _fields_without_counters(instance):
+    """
+    :return: the fields saved by ``save()``: all of them but the counters, which are only updated by queries
+    :rtype: list[str]
+    """
+    return [
+        field.name
+        for field in instance._meta.concrete_fields
+        if not field.primary_key and field.name not in instance.counter_fields
+    ]
+
+
 def sub_tag(tag):
     start = tag.group("start")
     end = tag.group("end")
@@ -94,47 +107,62 @@ class Forum(models.Model):
     position_in_category = models.IntegerField("Position dans la catégorie", null=True, blank=True, db_index=True)
 
     slug = models.SlugField(max_length=80, unique=True)
+
+    # Counters maintained by the signals of Topic and Post, never written by save(). Use refresh_counters() to fix them.
+    topic_count = models.PositiveIntegerField("Nombre de sujets", default=0)
+    post_count = models.PositiveIntegerField("Nombre de messages", default=0)
+    last_message = models.ForeignKey(
+        "Post", null=True, blank=True, related_name="+", verbose_name="Dernier message", on_delete=models.SET_NULL
+    )
+    counter_fields = ("topic_count", "post_count", "last_message")
+
     _nb_group = None
     objects = ForumManager()
 
     def __str__(self):
         return self.title
 
+    def save(self, *args, **kwargs):
+        """Overridden to keep the counters, which may have been updated since this forum was loaded"""
+        if not self._state.adding and kwargs.get("update_fields") is None:
+            kwargs["update_fields"] = _fields_without_counters(self)
+        return super().save(*args, **kwargs)
+
     def get_absolute_url(self):
         return reverse("forum-topics-list", kwargs={"cat_slug": self.category.slug, "forum_slug": self.slug})
 
     def get_topic_count(self):
-        """Retrieve or aggregate the number of threads in this forum. If this number already exists, it must be stored \
-        in thread_count. Otherwise it will process a SQL query.
-
+        """
         :return: the number of threads in the forum.
         """
-        try:
-            return self.thread_count
-        except AttributeError:
-            return Topic.objects.filter(forum=self).count()
+        return self.topic_count
 
     def get_post_count(self):
-        """Retrieve or aggregate the number of posts in this forum. If this number already exists, it must be stored \
-        in post_count. Otherwise it will process a SQL query.
-
+        """
         :return: the number of posts for a forum.
         """
-        try:
-            return self.post_count
-        except AttributeError:
-            return Post.objects.filter(topic__forum=self).count()
+        return self.post_count
 
     def get_last_message(self):
         """
         :return: the last message on the forum, if there are any.
         """
-        try:
-            last_post = Post.objects.select_related("topic").filter(topic__forum=self).order_by("-pubdate").all()[0]
+        last_post = self.last_message
+        if last_post is not None:
             last_post.topic.forum = self
-            return last_post
-        except IndexError:
-            return None
+        return last_post
+
+    def refresh_counters(self):
+        """
+        Compute again the number of topics and posts and the last message of this forum, and save them.
+        """
+        posts = Post.objects.filter(topic__forum=self)
+        self.topic_count = Topic.objects.filter(forum=self).count()
+        self.post_count = posts.count()
+        self.last_message = posts.order_by("-pubdate").first()
+        Forum.objects.filter(pk=self.pk).update(
+            topic_count=self.topic_count, post_count=self.post_count, last_message=self.last_message
+        )
 
     def can_read(self, user):
         """
@@ -215,6 +243,10 @@ class Topic(AbstractESDjangoIndexable):
 
     tags = models.ManyToManyField(Tag, verbose_name="Tags du forum", blank=True, db_index=True)
 
+    # maintained by the signals of Post, never written by save()
+    post_count = models.PositiveIntegerField("Nombre de messages", default=0)
+    counter_fields = ("post_count",)
+
     objects = TopicManager()
     _first_post = None
 
@@ -255,7 +287,7 @@ class Topic(AbstractESDjangoIndexable):
         """
         :return: the number of posts in the topic.
         """
-        return Post.objects.filter(topic__pk=self.pk).count()
+        return self.post_count
 
     def get_last_post(self):
         """
@@ -304,6 +336,22 @@ class Topic(AbstractESDjangoIndexable):
         self.save()
         signals.topic_edited.send(sender=self.__class__, topic=self)
 
+    def get_read_cursor(self, user):
+        """get the primary key and position of the last post the user read in this topic. The cursor is kept on the \
+        topic, and ``TopicRead.objects.prefetch_read_cursors()`` fetches the ones of a whole list of topics at once.
+
+        :param user: a user
+        :return: the ``(post_pk, post_position)`` cursor, or ``None`` if the user never read this topic (or is not \
+        authenticated)
+        :rtype: tuple
+        """
+        if user is None or not user.is_authenticated:
+            return None
+        cursors = self.__dict__.setdefault("_read_cursors", {})
+        if user.pk not in cursors:
+            cursors[user.pk] = TopicRead.objects.get_read_cursors(user, [self.pk]).get(self.pk)
+        return cursors[user.pk]
+
     def last_read_post(self):
         """
         Returns the last post the current user has read in this topic.
@@ -311,15 +359,10 @@ class Topic(AbstractESDjangoIndexable):
         Used in "last read post" balloon (base.html line 91).
         :return: the last post the user has read.
         """
-        try:
-            return (
-                TopicRead.objects.select_related()
-                .filter(topic__pk=self.pk, user__pk=get_current_user().pk)
-                .latest("post__position")
-                .post
-            )
-        except TopicRead.DoesNotExist:
+        cursor = self.get_read_cursor(get_current_user())
+        if cursor is None:
             return self.first_post()
+        return Post.objects.select_related("author").filter(pk=cursor[0]).first() or self.first_post()
 
     def resolve_first_post_absolute_url(self):
         return self.first_post().get_absolute_url()
@@ -344,21 +387,15 @@ class Topic(AbstractESDjangoIndexable):
     def resolve_last_post_pk_and_pos_read_by_user(self, user):
         """get the primary key and position of the last post the user read
 
-        :param user: the current (authenticated) user. Please do not try with unauthenticated user, il would lead to a \
-        useless request.
-        :return: the primary key
-        :rtype: int
+        :param user: the current (authenticated) user.
+        :return: the primary key and the position
+        :rtype: tuple
+        :raise TopicRead.DoesNotExist: if the user never read this topic
         """
-        t_read = (
-            TopicRead.objects.select_related("post")
-            .filter(topic__pk=self.pk, user__pk=user.pk)
-            .latest("post__position")
-        )
-        if t_read:
-            return t_read.post.pk, t_read.post.position
-        return list(
-            Post.objects.filter(topic__pk=self.pk).order_by("position").values("pk", "position").first().values()
-        )
+        cursor = self.get_read_cursor(user)
+        if cursor is None:
+            raise TopicRead.DoesNotExist
+        return cursor
 
     def first_unread_post(self, user=None):
         """
@@ -368,18 +405,12 @@ class Topic(AbstractESDjangoIndexable):
 
         :return: The first unread post for this topic and this user.
         """
-        try:
-            if user is None:
-                user = get_current_user()
-
-            last_post = TopicRead.objects.filter(topic__pk=self.pk, user__pk=user.pk).latest("post__position").post
-
-            next_post = (
-                Post.objects.filter(topic__pk=self.pk, position__gt=last_post.position).select_related("author").first()
-            )
-            return next_post
-        except (TopicRead.DoesNotExist, Post.DoesNotExist):
+        if user is None:
+            user = get_current_user()
+        cursor = self.get_read_cursor(user)
+        if cursor is None:
             return self.first_post()
+        return Post.objects.filter(topic__pk=self.pk, position__gt=cursor[1]).select_related("author").first()
 
     def antispam(self, user=None):
         """
@@ -472,11 +503,18 @@ class Topic(AbstractESDjangoIndexable):
         try:
             old_self = Topic.objects.get(pk=self.pk)
         except Topic.DoesNotExist:
-            pass
+            old_self = None
         else:
             if old_self.forum.pk != self.forum.pk or old_self.title != self.title:
                 Post.objects.filter(topic__pk=self.pk).update(es_flagged=True)
-        return super().save(*args, **kwargs)
+            if kwargs.get("update_fields") is None:
+                # the counters may have been updated since this topic was loaded
+                kwargs["update_fields"] = _fields_without_counters(self)
+        result = super().save(*args, **kwargs)
+        if old_self is not None and old_self.forum.pk != self.forum.pk:
+            old_self.forum.refresh_counters()
+            self.forum.refresh_counters()
+        return result
 
 
 @receiver(pre_delete, sender=Topic)
@@ -485,6 +523,17 @@ def delete_topic_in_elasticsearch(sender, instance, **kwargs):
     return delete_document_in_elasticsearch(instance)
 
 
+@receiver(post_save, sender=Topic)
+def increment_topic_count(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        Forum.objects.filter(pk=instance.forum_id).update(topic_count=F("topic_count") + 1)
+
+
+@receiver(post_delete, sender=Topic)
+def decrement_topic_count(sender, instance, **kwargs):
+    Forum.objects.filter(pk=instance.forum_id).update(topic_count=F("topic_count") - 1)
+
+
 class Post(Comment, AbstractESDjangoIndexable):
     """
     A forum post written by a user.
@@ -580,6 +629,40 @@ def delete_post_in_elasticsearch(sender, instance, **kwargs):
     return delete_document_in_elasticsearch(instance)
 
 
+@receiver(post_save, sender=Post)
+def increment_post_counts(sender, instance, created, raw=False, **kwargs):
+    """Count the new post in its topic and forum, of which it is the last message"""
+    if not created or raw:
+        return
+    Topic.objects.filter(pk=instance.topic_id).update(post_count=F("post_count") + 1)
+    Forum.objects.filter(topic__pk=instance.topic_id).update(post_count=F("post_count") + 1, last_message=instance)
+    if Post.topic.is_cached(instance):
+        instance.topic.post_count += 1
+
+
+@receiver(post_delete, sender=Post)
+def decrement_post_counts(sender, instance, **kwargs):
+    Topic.objects.filter(pk=instance.topic_id).update(post_count=F("post_count") - 1)
+    forums = Forum.objects.filter(topic__pk=instance.topic_id)
+    forums.update(post_count=F("post_count") - 1)
+    # the last message was set to NULL if it was this post
+    for forum in forums.filter(last_message__isnull=True):
+        forum.last_message = Post.objects.filter(topic__forum=forum).order_by("-pubdate").first()
+        Forum.objects.filter(pk=forum.pk).update(last_message=forum.last_message)
+
+
+@receiver([post_save, post_delete], sender=ForumCategory)
+@receiver([post_save, post_delete], sender=Forum)
+@receiver(m2m_changed, sender=Forum.groups.through)
+@receiver([post_save, post_delete], sender=Tag)
+@receiver(m2m_changed, sender=Topic.tags.through)
+@receiver(post_delete, sender=Topic)
+def invalidate_forum_topbar(sender, **kwargs):
+    from zds.utils.templatetags.topbar import invalidate_topbar
+
+    invalidate_topbar()
+
+
 class TopicRead(models.Model):
     """
     This model tracks the last post read in a topic by a user.
@@ -593,12 +676,18 @@ class TopicRead(models.Model):
 
     topic = models.ForeignKey(Topic, db_index=True, on_delete=models.CASCADE)
     post = models.ForeignKey(Post, db_index=True, on_delete=models.CASCADE)
+    # position of the post, so that the read cursor (post, position) is resolved without joining the posts
+    post_position = models.PositiveIntegerField("Position du message lu", default=0)
     user = models.ForeignKey(User, related_name="topics_read", db_index=True, on_delete=models.CASCADE)
     objects = TopicReadManager()
 
     def __str__(self):
         return f"<Sujet '{self.topic}' lu par {self.user}, #{self.post.pk}>"
 
+    def save(self, *args, **kwargs):
+        self.post_position = self.post.position
+        super().save(*args, **kwargs)
+
 
 def mark_read(topic, user=None):
     """
@@ -615,4 +704,8 @@ def mark_read(topic, user=None):
         else:
             current_topic_read.post = topic.last_message
         current_topic_read.save()
+        topic.__dict__.setdefault("_read_cursors", {})[user.pk] = (
+            current_topic_read.post_id,
+            current_topic_read.post_position,
+        )
         signals.topic_read.send(sender=topic.__class__, instance=topic, user=user)
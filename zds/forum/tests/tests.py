@@ -1,14 +1,16 @@
 from datetime import datetime, timedelta
+from io import StringIO
 
 from django.conf import settings
 from django.contrib.auth.models import Group
 from django.core import mail
+from django.core.management import call_command
 from django.urls import reverse
 from django.test import TestCase
 
 from zds.forum.commons import PostEditMixin
 from zds.forum.tests.factories import ForumCategoryFactory, ForumFactory, TopicFactory, PostFactory, TagFactory
-from zds.forum.models import Forum, TopicRead, Post, Topic
+from zds.forum.models import Forum, TopicRead, Post, Topic, mark_read
 from zds.member.tests.factories import ProfileFactory, StaffProfileFactory
 from zds.notification.models import TopicAnswerSubscription
 from zds.utils import old_slugify
@@ -1201,6 +1203,113 @@ class ManagerTests(TestCase):
         self.assertFalse(topic.is_read_by_user(reader.user, check_auth=False))
 
 
+class CountersTests(TestCase):
+    def setUp(self):
+        self.author = ProfileFactory().user
+        category = ForumCategoryFactory()
+        self.forum = ForumFactory(category=category)
+        self.other_forum = ForumFactory(category=category)
+        self.topic = TopicFactory(forum=self.forum, author=self.author)
+        self.posts = [PostFactory(topic=self.topic, author=self.author, position=i) for i in range(1, 4)]
+
+    def assertCounters(self, forum, topic_count, post_count, last_message):
+        forum = Forum.objects.get(pk=forum.pk)
+        self.assertEqual(
+            (topic_count, post_count, last_message),
+            (forum.get_topic_count(), forum.get_post_count(), forum.get_last_message()),
+        )
+
+    def test_new_posts_are_counted(self):
+        self.assertCounters(self.forum, 1, 3, self.posts[-1])
+        self.assertEqual(3, Topic.objects.get(pk=self.topic.pk).get_post_count())
+        # the counters are not overwritten by a topic loaded before the last post
+        self.topic.title = "New title"
+        self.topic.save()
+        self.assertEqual(3, Topic.objects.get(pk=self.topic.pk).get_post_count())
+
+    def test_deleted_posts_are_not_counted(self):
+        self.posts[-1].delete()
+        self.assertCounters(self.forum, 1, 2, self.posts[1])
+        self.assertEqual(2, Topic.objects.get(pk=self.topic.pk).get_post_count())
+
+        self.topic.delete()
+        self.assertCounters(self.forum, 0, 0, None)
+
+    def test_moved_topic_is_counted_in_its_new_forum(self):
+        topic = Topic.objects.get(pk=self.topic.pk)
+        topic.forum = self.other_forum
+        topic.save()
+        self.assertCounters(self.forum, 0, 0, None)
+        self.assertCounters(self.other_forum, 1, 3, self.posts[-1])
+
+    def test_repair_command(self):
+        Forum.objects.update(topic_count=0, post_count=0, last_message=None)
+        Topic.objects.update(post_count=0)
+        call_command("refresh_forum_counters", stdout=StringIO())
+        self.assertCounters(self.forum, 1, 3, self.posts[-1])
+        self.assertEqual(3, Topic.objects.get(pk=self.topic.pk).get_post_count())
+
+    def test_forum_index_queries_do_not_depend_on_forums(self):
+        category = self.forum.category
+        with self.assertNumQueries(1):
+            forums = list(category.get_forums(None, with_count=True))
+            [(forum.get_topic_count(), forum.get_post_count(), forum.get_last_message()) for forum in forums]
+
+
+class ReadCursorsTests(TestCase):
+    def setUp(self):
+        self.reader = ProfileFactory().user
+        author = ProfileFactory().user
+        forum = ForumFactory(category=ForumCategoryFactory())
+        self.topics = [TopicFactory(forum=forum, author=author) for _ in range(3)]
+        self.posts = [
+            [PostFactory(topic=topic, author=author, position=i) for i in range(1, 4)] for topic in self.topics
+        ]
+
+    def test_cursor_follows_the_last_read_post(self):
+        topic = Topic.objects.get(pk=self.topics[0].pk)
+        self.assertIsNone(topic.get_read_cursor(self.reader))
+        self.assertEqual(self.posts[0][0], topic.first_unread_post(self.reader))
+
+        mark_read(topic, self.reader)
+        self.assertEqual((self.posts[0][2].pk, 3), topic.get_read_cursor(self.reader))
+        self.assertEqual(
+            {self.topics[0].pk: (self.posts[0][2].pk, 3)},
+            TopicRead.objects.get_read_cursors(self.reader, self.topics),
+        )
+        self.assertIsNone(topic.first_unread_post(self.reader))
+
+        # marking a post as unread moves the cursor back
+        PostEditMixin.perform_unread_message(self.posts[0][1], self.reader)
+        topic = Topic.objects.get(pk=self.topics[0].pk)
+        self.assertEqual((self.posts[0][0].pk, 1), topic.get_read_cursor(self.reader))
+        self.assertEqual(self.posts[0][1], topic.first_unread_post(self.reader))
+
+    def test_prefetched_cursors_are_not_queried_again(self):
+        mark_read(Topic.objects.get(pk=self.topics[1].pk), self.reader)
+        topics = list(Topic.objects.filter(pk__in=[topic.pk for topic in self.topics]))
+
+        with self.assertNumQueries(1):
+            TopicRead.objects.prefetch_read_cursors(self.reader, topics)
+        with self.assertNumQueries(0):
+            cursors = {topic.pk: topic.get_read_cursor(self.reader) for topic in topics}
+        self.assertEqual(
+            {self.topics[0].pk: None, self.topics[1].pk: (self.posts[1][2].pk, 3), self.topics[2].pk: None}, cursors
+        )
+
+    def test_read_states_are_resolved_in_one_query(self):
+        mark_read(Topic.objects.get(pk=self.topics[0].pk), self.reader)
+        mark_read(Topic.objects.get(pk=self.topics[1].pk), self.reader)
+        PostFactory(topic=self.topics[1], author=self.topics[1].author, position=4)
+        topics = list(Topic.objects.filter(pk__in=[topic.pk for topic in self.topics]).order_by("pk"))
+
+        with self.assertNumQueries(1):
+            read_topics = TopicRead.objects.prefetch_read_states(self.reader, topics)
+        self.assertEqual([self.topics[0].pk], read_topics)
+        with self.assertNumQueries(0):
+            self.assertEqual([True, False, False], [topic.is_read_by_user(self.reader) for topic in topics])
+
+
 class TestMixins(TestCase):
     def test_double_unread_is_handled(self):
         author = ProfileFactory().user
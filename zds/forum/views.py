@@ -30,7 +30,7 @@ from zds.utils.context_processor import get_repository_url
 from zds.utils.forums import create_topic, send_post, CreatePostView
 from zds.utils.mixins import FilterMixin
 from zds.utils.models import Alert, Tag, CommentVote
-from zds.utils.paginator import ZdSPagingListView
+from zds.utils.paginator import ZdSPagingListView, PositionPaginator
 
 
 class CategoriesForumsListView(ListView):
@@ -43,6 +43,15 @@ class CategoriesForumsListView(ListView):
         context = super().get_context_data(**kwargs)
         for category in context.get("categories"):
             category.forums = category.get_forums(self.request.user, with_count=True)
+        TopicRead.objects.prefetch_read_cursors(
+            self.request.user,
+            [
+                forum.last_message.topic
+                for category in context.get("categories")
+                for forum in category.forums
+                if forum.last_message is not None
+            ],
+        )
         return context
 
 
@@ -77,8 +86,9 @@ class LastTopicsListView(ListView):
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
+        context["topics"] = list(context["topics"])
 
-        context.update({"topic_read": TopicRead.objects.list_read_topic_pk(self.request.user, context["topics"])})
+        context.update({"topic_read": TopicRead.objects.prefetch_read_states(self.request.user, context["topics"])})
 
         return context
 
@@ -137,7 +147,7 @@ class ForumTopicsListView(FilterMixin, ForumEditMixin, ZdSPagingListView, Update
             {
                 "forum": self.object,
                 "sticky_topics": sticky,
-                "topic_read": TopicRead.objects.list_read_topic_pk(self.request.user, context["topics"] + sticky),
+                "topic_read": TopicRead.objects.prefetch_read_states(self.request.user, context["topics"] + sticky),
                 "subscriber_count": NewTopicSubscription.objects.get_subscriptions(self.object).count(),
             }
         )
@@ -186,6 +196,17 @@ class TopicPostsListView(ZdSPagingListView, FeatureableMixin, SingleObjectMixin)
     def featured_request_allowed(self):
         return not self.object.is_locked
 
+    def get_paginator(self, queryset, per_page, orphans=0, allow_empty_first_page=True, **kwargs):
+        return PositionPaginator(
+            queryset,
+            per_page,
+            self.object.last_message.position if self.object.last_message else 0,
+            with_previous_item=True,
+            orphans=orphans,
+            allow_empty_first_page=allow_empty_first_page,
+            **kwargs,
+        )
+
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         form = PostForm(self.object, self.request.user)
@@ -440,11 +461,13 @@ class FindTopic(ZdSPagingListView, SingleObjectMixin):
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
+        context["topics"] = list(context["topics"])
         context.update(
             {
                 "usr": self.object,
                 "hidden_topics_count": Topic.objects.filter(author=self.object).count() - context["paginator"].count,
                 "created_topics": True,
+                "topic_read": TopicRead.objects.prefetch_read_states(self.request.user, context["topics"]),
             }
         )
         return context
@@ -472,12 +495,14 @@ class FindFollowedTopic(ZdSPagingListView, SingleObjectMixin):
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
+        context["topics"] = list(context["topics"])
         topics_count = self.object.profile.get_followed_topic_count()
         context.update(
             {
                 "usr": self.object,
                 "hidden_topics_count": topics_count - context["paginator"].count,
                 "followed_topics": True,
+                "topic_read": TopicRead.objects.prefetch_read_states(self.request.user, context["topics"]),
             }
         )
         return context
@@ -530,7 +555,7 @@ class FindTopicByTag(FilterMixin, ForumEditMixin, ZdSPagingListView, SingleObjec
             {
                 "tag": self.object,
                 "subscriber_count": NewTopicSubscription.objects.get_subscriptions(self.object).count(),
-                "topic_read": TopicRead.objects.list_read_topic_pk(self.request.user, context["topics"]),
+                "topic_read": TopicRead.objects.prefetch_read_states(self.request.user, context["topics"]),
             }
         )
         return context
@@ -34,6 +34,7 @@ from zds.member.models import (
     NewEmailProvider,
 )
 from zds.member.views import get_client_ip
+from zds.utils.header_notifications import invalidate_header_alerts
 from zds.mp.models import PrivatePost, PrivateTopic
 from zds.tutorialv2.models.database import PickListOperation
 from zds.utils.models import (
@@ -191,6 +192,7 @@ def unregister(request):
     Ban.objects.filter(moderator=current).update(moderator=anonymous)
     Alert.objects.filter(author=current).update(author=anonymous)
     Alert.objects.filter(moderator=current).update(moderator=anonymous)
+    invalidate_header_alerts()
     BannedEmailProvider.objects.filter(moderator=current).update(moderator=anonymous)
     # Solved hat requests anonymization
     HatRequest.objects.filter(moderator=current).update(moderator=anonymous)
@@ -22,7 +22,7 @@ from zds.mp.decorator import is_participant
 from zds.utils.models import get_hat_from_request
 from zds.utils.forums import CreatePostView
 from zds.utils.mps import send_mp, send_message_mp
-from zds.utils.paginator import ZdSPagingListView
+from zds.utils.paginator import ZdSPagingListView, PositionPaginator
 from .forms import PrivateTopicForm, PrivatePostForm, PrivateTopicEditForm
 from .models import PrivateTopic, PrivatePost, mark_read, NotReachableError
 
@@ -242,6 +242,18 @@ class PrivatePostList(ZdSPagingListView, SingleObjectMixin):
             raise PermissionDenied
         return super().get(request, *args, **kwargs)
 
+    def get_paginator(self, queryset, per_page, orphans=0, allow_empty_first_page=True, **kwargs):
+        return PositionPaginator(
+            queryset,
+            per_page,
+            self.object.last_message.position_in_topic if self.object.last_message else 0,
+            position_field="position_in_topic",
+            with_previous_item=True,
+            orphans=orphans,
+            allow_empty_first_page=allow_empty_first_page,
+            **kwargs,
+        )
+
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         context["topic"] = self.object
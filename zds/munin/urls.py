@@ -1,6 +1,15 @@
 from django.urls import re_path
 
-from zds.munin.views import total_topics, total_posts, total_mps, total_tutorials, total_articles, total_opinions
+from zds.munin.views import (
+    total_topics,
+    total_posts,
+    total_mps,
+    total_tutorials,
+    total_articles,
+    total_opinions,
+    zmd_render_cache,
+    zmd_connections,
+)
 
 
 urlpatterns = [
@@ -10,4 +19,6 @@ urlpatterns = [
     re_path(r"^total_tutorials/$", total_tutorials, name="total_tutorial"),
     re_path(r"^total_articles/$", total_articles, name="total_articles"),
     re_path(r"^total_opinions/$", total_opinions, name="total_opinions"),
+    re_path(r"^zmd_render_cache/$", zmd_render_cache, name="zmd_render_cache"),
+    re_path(r"^zmd_connections/$", zmd_connections, name="zmd_connections"),
 ]
@@ -2,6 +2,8 @@ from munin.helpers import muninview
 from zds.forum.models import Topic, Post
 from zds.mp.models import PrivateTopic, PrivatePost
 from zds.tutorialv2.models.database import PublishableContent, ContentReaction
+from zds.utils.render_cache import get_render_cache
+from zds.utils.templatetags.emarkdown import get_zmd_session_stats
 
 
 @muninview(
@@ -77,3 +79,38 @@ def total_opinions(request):
         ("published", opinions.filter(sha_public__isnull=False).count()),
         ("converted", opinions.filter(converted_to__sha_public__isnull=False).count()),
     ]
+
+
+@muninview(
+    config="""graph_title zmarkdown render cache
+graph_vlabel renders
+graph_args --base 1000 -l 0
+hit.label Hits
+hit.type DERIVE
+hit.min 0
+miss.label Misses
+miss.type DERIVE
+miss.min 0"""
+)
+def zmd_render_cache(request):
+    stats = get_render_cache().stats()
+    return [("hit", stats["hit"]), ("miss", stats["miss"])]
+
+
+@muninview(
+    config="""graph_title zmarkdown connections
+graph_vlabel requests
+graph_args --base 1000 -l 0
+requests.label Requests
+requests.type DERIVE
+requests.min 0
+connections.label New connections
+connections.type DERIVE
+connections.min 0
+reused.label Requests on a reused connection
+reused.type DERIVE
+reused.min 0"""
+)
+def zmd_connections(request):
+    stats = get_zmd_session_stats()
+    return [("requests", stats["requests"]), ("connections", stats["connections"]), ("reused", stats["reused"])]
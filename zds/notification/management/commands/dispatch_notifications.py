@@ -0,0 +1,87 @@
+import logging
+import time
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.core.management import BaseCommand
+from django.db import transaction
+from django.db.models import F, Q
+
+from zds.notification.models import DeferredNotification
+from zds.notification.receivers import send_deferred_notification
+from zds.utils.misc import select_for_update_skip_locked
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = "Send the notifications deferred by the requests (see the deferred_dispatch setting)"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--once", action="store_true", help="Send the deferred notifications, then exit instead of waiting for more"
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            try:
+                processed = self.run()
+            except:
+                logger.exception("Exception during one dispatch_notifications run.")
+                processed = 0
+            if options["once"] and not processed:
+                break
+            if not processed:
+                time.sleep(settings.ZDS_APP["notification"]["dispatch_poll_interval"])
+
+    def claim_batch(self):
+        """
+        Claim ``dispatch_batch_size`` deferred notifications for this command, until their lease
+        (``dispatch_lease``) expires. The rows are locked while they are claimed (when the database supports it) and
+        a deferred notification is only claimed if it is still claimable, so that several commands can run at the
+        same time. The claim is committed before the notifications are sent.
+
+        :return: the claimed deferred notifications
+        :rtype: list[DeferredNotification]
+        """
+        batch_size = settings.ZDS_APP["notification"]["dispatch_batch_size"]
+        max_attempts = settings.ZDS_APP["notification"]["dispatch_max_attempts"]
+        now = datetime.now()
+        claimable = Q(Q(lease_expiration__isnull=True) | Q(lease_expiration__lt=now), attempts__lt=max_attempts)
+        with transaction.atomic():
+            candidates = select_for_update_skip_locked(
+                DeferredNotification.objects.filter(claimable).order_by("pk")
+            ).values_list("pk", flat=True)[:batch_size]
+            claimed_pks = [
+                pk
+                for pk in candidates
+                if DeferredNotification.objects.filter(claimable, pk=pk).update(
+                    lease_expiration=now + timedelta(seconds=settings.ZDS_APP["notification"]["dispatch_lease"]),
+                    attempts=F("attempts") + 1,
+                )
+            ]
+        return list(DeferredNotification.objects.filter(pk__in=claimed_pks).order_by("pk"))
+
+    def run(self):
+        """
+        Send the deferred notifications, ``dispatch_batch_size`` at a time. A sent notification is removed at once,
+        a failed one can be claimed again, until it failed ``dispatch_max_attempts`` times.
+
+        :return: the number of processed deferred notifications
+        :rtype: int
+        """
+        processed = 0
+        while True:
+            batch = self.claim_batch()
+            if not batch:
+                return processed
+            for deferred_notification in batch:
+                try:
+                    with transaction.atomic():
+                        send_deferred_notification(deferred_notification)
+                except:
+                    logger.exception("Failed to send %s", deferred_notification)
+                    DeferredNotification.objects.filter(pk=deferred_notification.pk).update(lease_expiration=None)
+                else:
+                    deferred_notification.delete()
+            processed += len(batch)
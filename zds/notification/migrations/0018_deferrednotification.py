@@ -0,0 +1,34 @@
+# Generated by Django 3.2.12 on 2026-10-18 09:25
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("contenttypes", "0002_remove_content_type_name"),
+        ("notification", "0017_clean_notifications_new_topic_forums_groups"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="DeferredNotification",
+            fields=[
+                ("id", models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("event", models.CharField(max_length=50, verbose_name="Évènement")),
+                ("object_id", models.PositiveIntegerField()),
+                ("options", models.JSONField(blank=True, default=dict, verbose_name="Options")),
+                ("pubdate", models.DateTimeField(auto_now_add=True, verbose_name="Date de création")),
+                ("attempts", models.PositiveSmallIntegerField(default=0, verbose_name="Tentatives")),
+                (
+                    "content_type",
+                    models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to="contenttypes.contenttype"),
+                ),
+            ],
+            options={
+                "verbose_name": "Notification différée",
+                "verbose_name_plural": "Notifications différées",
+            },
+        ),
+    ]
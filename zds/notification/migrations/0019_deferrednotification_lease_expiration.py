@@ -0,0 +1,18 @@
+# Generated by Django 3.2.12 on 2026-10-18 11:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("notification", "0018_deferrednotification"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="deferrednotification",
+            name="lease_expiration",
+            field=models.DateTimeField(blank=True, null=True, verbose_name="Fin de la réservation"),
+        ),
+    ]
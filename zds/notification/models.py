@@ -4,7 +4,7 @@ from smtplib import SMTPException
 from django.contrib.auth.models import User
 from django.contrib.contenttypes.fields import GenericForeignKey
 from django.contrib.contenttypes.models import ContentType
-from django.core.mail import EmailMultiAlternatives
+from django.core.mail import EmailMultiAlternatives, get_connection
 from django.core.validators import validate_email, ValidationError
 from django.db import models, IntegrityError, transaction
 from django.template.loader import render_to_string
@@ -88,6 +88,21 @@ class Subscription(models.Model):
         """
         Sends an email notification
         """
+        message = self.build_email(notification)
+        if message is None:
+            return
+        try:
+            message.send()
+        except SMTPException:
+            LOG.error("Failed sending mail for %s", self, exc_info=True)
+
+    def build_email(self, notification):
+        """
+        Builds the email notification
+
+        :return: the email, or ``None`` if the user has no valid email address
+        :rtype: django.core.mail.EmailMultiAlternatives
+        """
 
         assert hasattr(self, "module")
 
@@ -102,7 +117,7 @@ class Subscription(models.Model):
         try:
             validate_email(receiver.email)
         except ValidationError:
-            return
+            return None
 
         context = {
             "username": receiver.username,
@@ -120,10 +135,26 @@ class Subscription(models.Model):
 
         msg = EmailMultiAlternatives(subject, message_txt, from_email, [receiver.email])
         msg.attach_alternative(message_html, "text/html")
-        try:
-            msg.send()
-        except SMTPException:
-            LOG.error("Failed sending mail for %s", self, exc_info=True)
+        return msg
+
+    @staticmethod
+    def send_emails(subscriptions_and_notifications):
+        """
+        Sends the email notifications of several subscriptions, reusing the same connection to the mail server.
+
+        :param subscriptions_and_notifications: couples of a subscription and the notification to send by email
+        """
+        messages = []
+        for subscription, notification in subscriptions_and_notifications:
+            message = subscription.build_email(notification)
+            if message is not None:
+                messages.append(message)
+        batch_size = settings.ZDS_APP["notification"]["email_batch_size"]
+        for start in range(0, len(messages), batch_size):
+            try:
+                get_connection().send_messages(messages[start : start + batch_size])
+            except SMTPException:
+                LOG.error("Failed sending %d mails", len(messages[start : start + batch_size]), exc_info=True)
 
     @staticmethod
     def has_read_permission(request):
@@ -181,17 +212,140 @@ class SingleNotificationMixin:
                 self.last_notification.content_object = content
                 self.last_notification.save()
 
+    @classmethod
+    def send_notifications(cls, subscriptions, content, sender, send_email=True):
+        """
+        Sends the notification about the given content to several subscriptions at once, as ``send_notification``
+        would do for each of them, but with a constant number of queries.
+
+        :param subscriptions: subscriptions to the same object
+        :param content: the content the notification is about
+        :param sender: the user whose action triggered the notification
+        :param send_email: whether an email must be sent if the subscription by email is active
+        """
+        from zds.utils.header_notifications import invalidate_header_notifications
+
+        subscriptions = list(subscriptions)
+        if not subscriptions:
+            return
+        content_type = ContentType.objects.get_for_model(content)
+        # the notifications are about the same object, so they have the same URL and title
+        url = subscriptions[0].get_notification_url(content)
+        title = subscriptions[0].get_notification_title(content)
+
+        to_notify = [s for s in subscriptions if s.last_notification is None or s.last_notification.is_read]
+        # Update last notification if the new content is older (marking answer as unread)
+        to_move_back = [
+            s.last_notification
+            for s in subscriptions
+            if s.last_notification is not None
+            and not s.last_notification.is_read
+            and s.last_notification.pubdate > content.pubdate
+        ]
+        for notification in to_move_back:
+            notification.content_object = content
+
+        with transaction.atomic():
+            Notification.objects.bulk_update(to_move_back, ["content_type", "object_id"])
+
+            existing = {}
+            duplicates = []
+            for notification in Notification.objects.filter(subscription__in=to_notify).order_by("pk"):
+                if notification.subscription_id in existing:
+                    duplicates.append(notification.pk)
+                else:
+                    existing[notification.subscription_id] = notification
+            if duplicates:
+                LOG.error("Found %s duplicated notifications", len(duplicates))
+                Notification.objects.filter(pk__in=duplicates).delete()
+
+            to_update, to_create = [], []
+            for subscription in to_notify:
+                notification = existing.get(subscription.pk)
+                if notification is None:
+                    notification = existing[subscription.pk] = Notification(subscription=subscription)
+                    to_create.append(notification)
+                else:
+                    to_update.append(notification)
+                notification.content_type = content_type
+                notification.object_id = content.pk
+                notification.sender = sender
+                notification.url = url
+                notification.title = title
+                notification.pubdate = content.pubdate
+                notification.is_read = False
+            Notification.objects.bulk_update(
+                to_update, ["content_type", "object_id", "sender", "url", "title", "pubdate", "is_read"]
+            )
+            _bulk_create_notifications(to_create)
+            for subscription in to_notify:
+                # assigned once the notification has a primary key, so that last_notification_id is set
+                subscription.last_notification = existing[subscription.pk]
+            Subscription.objects.bulk_update(to_notify, ["last_notification"])
+            invalidate_header_notifications(subscription.user_id for subscription in subscriptions)
+
+            if send_email:
+                Subscription.send_emails(
+                    (subscription, subscription.last_notification)
+                    for subscription in to_notify
+                    if subscription.by_email
+                )
+
     def mark_notification_read(self):
         """
         Marks the notification of the subscription as read.
         As there's only one active unread notification at all time,
         no need for more precision
         """
+        from zds.utils.header_notifications import invalidate_header_notifications
+
         if self.last_notification is not None:
             Notification.objects.filter(pk=self.last_notification.pk).update(is_read=True)
+            invalidate_header_notifications([self.user_id])
 
 
 class MultipleNotificationsMixin:
+    @classmethod
+    def send_notifications(cls, subscriptions, content, sender, send_email=True):
+        """
+        Sends the notification about the given content to several subscriptions at once, as ``send_notification``
+        would do for each of them, but with a constant number of queries.
+
+        :param subscriptions: subscriptions to the same object
+        :param content: the content the notification is about
+        :param sender: the user whose action triggered the notification
+        :param send_email: whether an email must be sent if the subscription by email is active
+        """
+        from zds.utils.header_notifications import invalidate_header_notifications
+
+        subscriptions = [s for s in subscriptions if not (s.last_notification and not s.last_notification.is_read)]
+        if not subscriptions:
+            return
+        # the notifications are about the same object, so they have the same URL and title
+        url = subscriptions[0].get_notification_url(content)
+        title = subscriptions[0].get_notification_title(content)
+
+        with transaction.atomic():
+            notifications = []
+            for subscription in subscriptions:
+                notification = Notification(
+                    subscription=subscription, content_object=content, sender=sender, url=url, title=title
+                )
+                notifications.append(notification)
+            _bulk_create_notifications(notifications)
+            for subscription, notification in zip(subscriptions, notifications):
+                # assigned once the notification has a primary key, so that last_notification_id is set
+                subscription.last_notification = notification
+            Subscription.objects.bulk_update(subscriptions, ["last_notification"])
+            invalidate_header_notifications(subscription.user_id for subscription in subscriptions)
+
+            if send_email:
+                Subscription.send_emails(
+                    (subscription, subscription.last_notification)
+                    for subscription in subscriptions
+                    if subscription.by_email
+                )
+
     def send_notification(self, content=None, send_email=True, sender=None):
         """
         Sends the notification about the given content
@@ -432,6 +586,67 @@ class Notification(models.Model):
         return Notification.has_read_permission(request) and self.subscription.user == request.user
 
 
+def _bulk_create_notifications(notifications):
+    """
+    Creates the notifications, each one being the only notification created for its subscription.
+    Their primary keys are then fetched, as not every database returns them from a bulk insert.
+    The rows are matched on their subscription and object (and the first inserted one is taken),
+    so that the notifications inserted meanwhile by other requests for the same subscriptions are left aside.
+    """
+    if not notifications:
+        return notifications
+    last_pk = Notification.objects.order_by("-pk").values_list("pk", flat=True).first() or 0
+    created = Notification.objects.bulk_create(notifications)
+    if created[0].pk is None:
+
+        def identify(notification):
+            return (
+                notification.subscription_id,
+                notification.content_type_id,
+                notification.object_id,
+            )
+
+        rows = (
+            Notification.objects.filter(
+                pk__gt=last_pk,
+                subscription__in={notification.subscription_id for notification in notifications},
+                content_type__in={notification.content_type_id for notification in notifications},
+                object_id__in={notification.object_id for notification in notifications},
+            )
+            .order_by("pk")
+            .values_list("subscription", "content_type", "object_id", "pk")
+        )
+        pks = {}
+        for *identity, pk in rows:
+            pks.setdefault(tuple(identity), pk)
+        for notification in notifications:
+            notification.pk = pks[identify(notification)]
+    return notifications
+
+
+class DeferredNotification(models.Model):
+    """
+    Notifications about a new object which remain to be sent by the ``dispatch_notifications`` command,
+    when ``ZDS_APP["notification"]["deferred_dispatch"]`` is set.
+    """
+
+    class Meta:
+        verbose_name = _("Notification différée")
+        verbose_name_plural = _("Notifications différées")
+
+    event = models.CharField(_("Évènement"), max_length=50)
+    content_type = models.ForeignKey(ContentType, on_delete=models.CASCADE)
+    object_id = models.PositiveIntegerField()
+    content_object = GenericForeignKey("content_type", "object_id")
+    options = models.JSONField(_("Options"), default=dict, blank=True)
+    pubdate = models.DateTimeField(_("Date de création"), auto_now_add=True)
+    attempts = models.PositiveSmallIntegerField(_("Tentatives"), default=0)
+    lease_expiration = models.DateTimeField(_("Fin de la réservation"), null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.event} ({self.content_type} #{self.object_id})"
+
+
 class TopicFollowed(models.Model):
     """
     This model tracks which user follows which topic.
@@ -6,10 +6,11 @@ try:
 except ImportError:
     from django.utils.functional import wraps
 
+from django.conf import settings
 from django.contrib.auth.models import User
 from django.contrib.contenttypes.models import ContentType
 from django.db import DatabaseError
-from django.db.models.signals import post_save, m2m_changed, pre_delete
+from django.db.models.signals import post_save, m2m_changed, pre_delete, post_delete
 from django.dispatch import receiver
 
 from zds.forum.models import Topic, Post, Forum
@@ -22,6 +23,7 @@ from zds.notification.models import (
     PrivateTopicAnswerSubscription,
     Subscription,
     Notification,
+    DeferredNotification,
     NewTopicSubscription,
     NewPublicationSubscription,
     PingSubscription,
@@ -30,10 +32,14 @@ import zds.notification.signals as notification_signals
 from zds.tutorialv2.models.database import PublishableContent, ContentReaction
 import zds.tutorialv2.signals as tuto_signals
 import zds.utils.signals as utils_signals
-from zds.utils.models import Tag
+from zds.utils.header_notifications import invalidate_header_notifications, invalidate_header_alerts
+from zds.utils.models import Alert, Tag
 
 logger = logging.getLogger(__name__)
 
+# functions sending the notifications about a new object, by event name
+_deferrable_notifications = {}
+
 
 @receiver(m2m_changed, sender=User.groups.through)
 def remove_group_subscription_on_quitting_groups(*, sender, instance, action, pk_set, **__):
@@ -86,6 +92,46 @@ def disable_for_loaddata(signal_handler):
     return wrapper
 
 
+def deferrable(event):
+    """
+    Decorator
+    Registers a function sending the notifications about a new object. If ``deferred_dispatch`` is set, calling it
+    only stores a ``DeferredNotification``: the notifications are then sent out of the request by the
+    ``dispatch_notifications`` command. The keyword arguments of the function must be serializable in JSON.
+
+    :param event: unique name of the function, stored in the deferred notifications
+    """
+
+    def decorator(send_notifications):
+        _deferrable_notifications[event] = send_notifications
+
+        @wraps(send_notifications)
+        def wrapper(instance, **options):
+            if settings.ZDS_APP["notification"]["deferred_dispatch"]:
+                DeferredNotification.objects.create(event=event, content_object=instance, options=options)
+            else:
+                send_notifications(instance, **options)
+
+        return wrapper
+
+    return decorator
+
+
+def send_deferred_notification(deferred_notification):
+    """
+    Sends the notifications stored by a function decorated with ``deferrable``.
+    Nothing is sent if the object of the notifications was deleted meanwhile.
+
+    :param deferred_notification: the notifications to send
+    :type deferred_notification: zds.notification.models.DeferredNotification
+    """
+    instance = deferred_notification.content_object
+    if instance is None:
+        logger.info("%s was deleted, its notifications are not sent.", deferred_notification)
+        return
+    _deferrable_notifications[deferred_notification.event](instance, **deferred_notification.options)
+
+
 @receiver(forum_signals.post_unread, sender=Post)
 def unread_topic_event(sender, *, user, post, **__):
     """
@@ -325,12 +371,17 @@ def new_topic_event(sender, *, instance, created=True, **__):
     :param created: a flag set by the event to ensure the save was effective
     """
     if created:
-        topic = instance
+        notify_new_topic(instance)
 
-        subscriptions = NewTopicSubscription.objects.get_subscriptions(topic.forum)
-        for subscription in subscriptions:
-            if subscription.user != topic.author:
-                subscription.send_notification(content=topic, sender=topic.author)
+
+@deferrable("new_topic")
+def notify_new_topic(topic):
+    subscriptions = (
+        NewTopicSubscription.objects.get_subscriptions(topic.forum)
+        .exclude(user=topic.author)
+        .select_related("user", "last_notification")
+    )
+    NewTopicSubscription.send_notifications(subscriptions, content=topic, sender=topic.author)
 
 
 @receiver(post_save, sender=Post)
@@ -346,15 +397,22 @@ def answer_topic_event(sender, *, instance, created=True, **__):
     if created:
         post = instance
 
-        subscription_list = TopicAnswerSubscription.objects.get_subscriptions(post.topic)
-        for subscription in subscription_list:
-            if subscription.user != post.author:
-                subscription.send_notification(content=post, sender=post.author)
+        notify_topic_answer(post)
 
         # Follow topic on answering
         TopicAnswerSubscription.objects.get_or_create_active(post.author, post.topic)
 
 
+@deferrable("topic_answer")
+def notify_topic_answer(post):
+    subscription_list = (
+        TopicAnswerSubscription.objects.get_subscriptions(post.topic)
+        .exclude(user=post.author)
+        .select_related("user", "last_notification")
+    )
+    TopicAnswerSubscription.send_notifications(subscription_list, content=post, sender=post.author)
+
+
 @receiver(post_save, sender=ContentReaction)
 @disable_for_loaddata
 def answer_content_reaction_event(sender, *, instance, created=True, **__):
@@ -368,16 +426,25 @@ def answer_content_reaction_event(sender, *, instance, created=True, **__):
     """
     if created:
         content_reaction = instance
-        publishable_content = content_reaction.related_content
-        author = content_reaction.author
 
-        subscription_list = ContentReactionAnswerSubscription.objects.get_subscriptions(publishable_content)
-        for subscription in subscription_list:
-            if subscription.user != author:
-                subscription.send_notification(content=content_reaction, sender=author)
+        notify_content_reaction_answer(content_reaction)
 
         # Follow publishable content on answering
-        ContentReactionAnswerSubscription.objects.get_or_create_active(author, publishable_content)
+        ContentReactionAnswerSubscription.objects.get_or_create_active(
+            content_reaction.author, content_reaction.related_content
+        )
+
+
+@deferrable("content_reaction_answer")
+def notify_content_reaction_answer(content_reaction):
+    subscription_list = (
+        ContentReactionAnswerSubscription.objects.get_subscriptions(content_reaction.related_content)
+        .exclude(user=content_reaction.author)
+        .select_related("user", "last_notification")
+    )
+    ContentReactionAnswerSubscription.send_notifications(
+        subscription_list, content=content_reaction, sender=content_reaction.author
+    )
 
 
 @receiver(tuto_signals.content_published, sender=PublishableContent)
@@ -400,6 +467,16 @@ def content_published_event(*__, instance, by_email, **___):
         # this allows to fix the "auto subscribe issue" but can deactivate a manually triggered subscription
         subscription.deactivate()
 
+    notify_new_publication(content)
+
+
+@deferrable("new_publication")
+def notify_new_publication(content):
+    """
+    Sends a notification to the users following the authors of the content.
+    """
+    authors = list(content.authors.all())
+    for user in authors:
         for subscription in NewPublicationSubscription.objects.get_subscriptions(user).exclude(user__in=authors):
             # this condition is here to avoid exponential notifications when a user already follows one of the authors
             # while they are also among the authors.
@@ -434,7 +511,11 @@ def answer_private_topic_event(sender, *, post, by_email, no_notification_for=No
     :param by_email: Send or not an email.
     :param no_notification_for: user or group of user to ignore, really usefull when dealing with moderation message.
     """
+    notify_private_topic_answer(post, by_email=by_email)
+
 
+@deferrable("private_topic_answer")
+def notify_private_topic_answer(post, by_email):
     subscription_list = PrivateTopicAnswerSubscription.objects.get_subscriptions(post.privatetopic)
     for subscription in subscription_list:
         if subscription.user != post.author:
@@ -466,6 +547,21 @@ def delete_notifications(sender, instance, **__):
     Notification.objects.filter(sender=instance).delete()
 
 
+@receiver(post_save, sender=Notification)
+@receiver(post_delete, sender=Notification)
+def invalidate_notifications_in_header(sender, *, instance, **__):
+    try:
+        invalidate_header_notifications([instance.subscription.user_id])
+    except Subscription.DoesNotExist:
+        pass  # deleted with its subscription
+
+
+@receiver(post_save, sender=Alert)
+@receiver(post_delete, sender=Alert)
+def invalidate_alerts_in_header(sender, **__):
+    invalidate_header_alerts()
+
+
 @receiver(tuto_signals.content_unpublished, sender=PublishableContent)
 @receiver(tuto_signals.content_unpublished, sender=ContentReaction)
 def cleanup_notification_for_unpublished_content(sender, instance, **__):
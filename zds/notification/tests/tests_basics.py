@@ -1,10 +1,13 @@
 import copy
+from unittest.mock import patch
 from datetime import datetime, timedelta
 from django.contrib.auth.models import Group
 from django.contrib.contenttypes.models import ContentType
 from django.core import mail
 from django.urls import reverse
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.db import connection
 from django.db import IntegrityError
 
 from django.conf import settings
@@ -21,6 +24,7 @@ from zds.notification.models import (
     PrivateTopicAnswerSubscription,
     NewTopicSubscription,
     NewPublicationSubscription,
+    _bulk_create_notifications,
 )
 from zds.tutorialv2.tests.factories import (
     PublishableContentFactory,
@@ -927,3 +931,83 @@ class NotificationTest(TestCase):
         self.assertEqual(0, len(notifications))
 
         self.assertTrue(Topic.objects.get(pk=topic.pk).is_read)
+
+
+class NotificationFanOutTest(TestCase):
+    def setUp(self):
+        self.author = ProfileFactory().user
+        category = ForumCategoryFactory(position=1)
+        self.forum = ForumFactory(category=category, position_in_category=1)
+        self.topic = TopicFactory(forum=self.forum, author=self.author)
+        PostFactory(topic=self.topic, author=self.author, position=1)
+
+    def add_subscribers(self, count, by_email=False):
+        users = [ProfileFactory().user for _ in range(count)]
+        for user in users:
+            TopicAnswerSubscription.objects.toggle_follow(self.topic, user, by_email=by_email)
+        return users
+
+    def notify_answer(self):
+        post = PostFactory(topic=self.topic, author=self.author, position=self.topic.get_post_count() + 1)
+        subscriptions = (
+            TopicAnswerSubscription.objects.get_subscriptions(self.topic)
+            .exclude(user=self.author)
+            .select_related("user", "last_notification")
+        )
+        with CaptureQueriesContext(connection) as queries:
+            TopicAnswerSubscription.send_notifications(subscriptions, content=post, sender=self.author)
+        return post, len(queries)
+
+    def test_every_subscriber_is_notified_once(self):
+        users = self.add_subscribers(3, by_email=True)
+        # the notification of the first subscriber was read, so it is reused
+        PostFactory(topic=self.topic, author=users[1], position=2)
+        Notification.objects.filter(subscription__user=users[0]).update(is_read=True)
+        mail.outbox = []
+
+        post, _ = self.notify_answer()
+
+        for user in users:
+            subscription = TopicAnswerSubscription.objects.get_existing(user, self.topic)
+            notifications = Notification.objects.filter(subscription=subscription)
+            self.assertEqual(1, notifications.count())
+            self.assertEqual(subscription.last_notification, notifications.get())
+        self.assertFalse(Notification.objects.get(subscription__user=users[0]).is_read)
+        self.assertEqual(post, Notification.objects.get(subscription__user=users[0]).content_object)
+        # the unread notification still points to the first unread answer
+        self.assertNotEqual(post, Notification.objects.get(subscription__user=users[2]).content_object)
+        self.assertEqual(sorted([users[0].email, users[1].email]), sorted(message.to[0] for message in mail.outbox))
+
+    def test_notifications_created_meanwhile_are_not_taken(self):
+        (user,) = self.add_subscribers(1)
+        subscription = TopicAnswerSubscription.objects.get_existing(user, self.topic)
+        other_post = PostFactory(topic=self.topic, author=self.author, position=2)
+        post = PostFactory(topic=self.topic, author=self.author, position=3)
+        bulk_create = Notification.objects.bulk_create
+
+        def bulk_create_before_another_request(notifications):
+            created = bulk_create(notifications)
+            # another request notifies the same subscription right after
+            Notification.objects.create(
+                subscription=subscription, content_object=other_post, sender=self.author, url="/", title="Other"
+            )
+            return created
+
+        notification = Notification(
+            subscription=subscription, content_object=post, sender=self.author, url="/", title="Answer"
+        )
+        with patch.object(Notification.objects, "bulk_create", side_effect=bulk_create_before_another_request):
+            _bulk_create_notifications([notification])
+
+        self.assertEqual(post, Notification.objects.get(pk=notification.pk).content_object)
+
+    def test_number_of_queries_does_not_depend_on_subscribers(self):
+        self.add_subscribers(5)
+        _, few_queries = self.notify_answer()
+
+        self.add_subscribers(45)
+        Notification.objects.update(is_read=True)
+        _, many_queries = self.notify_answer()
+
+        self.assertEqual(few_queries, many_queries)
+        self.assertEqual(50, Notification.objects.filter(is_read=False).count())
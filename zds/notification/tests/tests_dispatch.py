@@ -0,0 +1,81 @@
+from copy import deepcopy
+from unittest.mock import patch
+
+from django.conf import settings
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import override_settings
+
+from zds.forum.tests.factories import ForumCategoryFactory, ForumFactory, TopicFactory, PostFactory
+from zds.member.tests.factories import ProfileFactory
+from zds.notification.management.commands.dispatch_notifications import Command as DispatchCommand
+from zds.notification.models import DeferredNotification, Notification, TopicAnswerSubscription
+
+overridden_zds_app = deepcopy(settings.ZDS_APP)
+overridden_zds_app["notification"]["deferred_dispatch"] = True
+
+
+@override_settings(ZDS_APP=overridden_zds_app)
+class DeferredNotificationTest(TestCase):
+    def setUp(self):
+        self.author = ProfileFactory().user
+        self.follower = ProfileFactory().user
+        category = ForumCategoryFactory(position=1)
+        forum = ForumFactory(category=category, position_in_category=1)
+        self.topic = TopicFactory(forum=forum, author=self.author)
+        PostFactory(topic=self.topic, author=self.author, position=1)
+        TopicAnswerSubscription.objects.toggle_follow(self.topic, self.follower)
+        DeferredNotification.objects.all().delete()
+
+    def test_notifications_are_sent_by_the_command(self):
+        post = PostFactory(topic=self.topic, author=self.author, position=2)
+
+        self.assertEqual(0, Notification.objects.filter(subscription__user=self.follower).count())
+        deferred_notification = DeferredNotification.objects.get()
+        self.assertEqual("topic_answer", deferred_notification.event)
+        self.assertEqual(post, deferred_notification.content_object)
+
+        call_command("dispatch_notifications", "--once")
+
+        self.assertEqual(0, DeferredNotification.objects.count())
+        notification = Notification.objects.get(subscription__user=self.follower)
+        self.assertEqual(post, notification.content_object)
+        self.assertFalse(notification.is_read)
+
+    def test_notifications_about_deleted_objects_are_dropped(self):
+        PostFactory(topic=self.topic, author=self.author, position=2).delete()
+
+        call_command("dispatch_notifications", "--once")
+
+        self.assertEqual(0, DeferredNotification.objects.count())
+        self.assertEqual(0, Notification.objects.filter(subscription__user=self.follower).count())
+
+    def test_failed_notifications_are_retried(self):
+        PostFactory(topic=self.topic, author=self.author, position=2)
+
+        with patch.object(TopicAnswerSubscription, "send_notifications", side_effect=RuntimeError):
+            call_command("dispatch_notifications", "--once")
+
+        # retried until the maximal number of attempts, then kept
+        deferred_notification = DeferredNotification.objects.get()
+        self.assertEqual(settings.ZDS_APP["notification"]["dispatch_max_attempts"], deferred_notification.attempts)
+        self.assertEqual(0, Notification.objects.filter(subscription__user=self.follower).count())
+
+    def test_claimed_notifications_are_not_claimed_again(self):
+        PostFactory(topic=self.topic, author=self.author, position=2)
+
+        self.assertEqual(1, len(DispatchCommand().claim_batch()))
+        # the lease of the first command is still valid
+        self.assertEqual([], DispatchCommand().claim_batch())
+        self.assertEqual(0, Notification.objects.filter(subscription__user=self.follower).count())
+
+    def test_notifications_are_sent_without_skip_locked(self):
+        PostFactory(topic=self.topic, author=self.author, position=2)
+
+        # like MariaDB: the rows can be locked, but the locked ones cannot be skipped
+        with patch.multiple(connection.features, has_select_for_update=True, has_select_for_update_skip_locked=False):
+            call_command("dispatch_notifications", "--once")
+
+        self.assertEqual(0, DeferredNotification.objects.count())
+        self.assertEqual(1, Notification.objects.filter(subscription__user=self.follower).count())
@@ -15,6 +15,7 @@ from zds.forum.models import Post
 from zds.tutorialv2.models.database import ContentReaction
 from zds.forum.models import mark_read as mark_topic_read
 from zds.tutorialv2.utils import mark_read as mark_content_read
+from zds.utils.header_notifications import invalidate_header_notifications
 
 
 class NotificationList(ZdSPagingListView):
@@ -61,6 +62,7 @@ def mark_notifications_as_read(request):
             mark_content_read(notification.content_object.related_content, request.user)
 
     notifications.update(is_read=True)
+    invalidate_header_notifications([request.user.pk])
 
     messages.success(request, _("Vos notifications ont bien été marquées comme lues."))
 
@@ -1,3 +1,5 @@
+from datetime import datetime
+
 from django.urls import reverse
 from django.test import TestCase
 from django.test.utils import override_settings
@@ -6,7 +8,7 @@ from django.utils.translation import gettext_lazy as _
 from zds.forum.models import Post
 from zds.forum.tests.factories import create_category_and_forum, create_topic_in_forum
 from zds.member.tests.factories import ProfileFactory, StaffProfileFactory
-from zds.utils.models import CommentEdit
+from zds.utils.models import Alert, CommentEdit
 from zds.utils.templatetags.emarkdown import render_markdown
 
 
@@ -130,6 +132,19 @@ class PagesStaffTests(TestCase):
 
         self.assertEqual(result.status_code, 200)
 
+    def test_url_alerts(self):
+        """Test: check that the alerts page links to the alerted posts."""
+        _, forum = create_category_and_forum()
+        author = ProfileFactory()
+        topic = create_topic_in_forum(forum, author)
+        post = topic.last_message
+        Alert.objects.create(author=self.staff, comment=post, scope="FORUM", text="pouet", pubdate=datetime.now())
+
+        result = self.client.get(reverse("pages-alerts"))
+
+        self.assertEqual(result.status_code, 200)
+        self.assertContains(result, post.get_absolute_url())
+
 
 class PagesGuestTests(TestCase):
     def test_url_home(self):
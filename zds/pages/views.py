@@ -12,12 +12,13 @@ from django.core.exceptions import PermissionDenied
 from django.views.decorators.http import require_POST
 
 from zds.featured.models import FeaturedResource, FeaturedMessage
-from zds.forum.models import Topic
+from zds.forum.models import Topic, TopicRead
 from zds.member.decorator import can_write_and_read_now
 from zds.pages.models import GroupContact
 from zds.searchv2.forms import SearchForm
 from zds.tutorialv2.models.database import PublishableContent, PublishedContent
 from zds.utils.context_processor import get_repository_url
+from zds.utils.header_notifications import resolve_alerts
 from zds.utils.models import Alert, CommentEdit, Comment
 
 
@@ -35,6 +36,8 @@ def home(request):
     articles = PublishableContent.objects.get_last_articles()
     opinions = PublishableContent.objects.get_last_opinions()
     quote = random.choice(QUOTES)
+    last_topics = list(Topic.objects.get_last_topics())
+    TopicRead.objects.prefetch_read_cursors(request.user, last_topics)
 
     return render(
         request,
@@ -45,7 +48,7 @@ def home(request):
             "last_articles": articles,
             "last_opinions": opinions,
             "last_featured_resources": FeaturedResource.objects.get_last_featured(),
-            "last_topics": Topic.objects.get_last_topics(),
+            "last_topics": last_topics,
             "contents_count": PublishedContent.objects.get_contents_count(),
             "quote": quote.replace("\n", ""),
             "search_form": SearchForm(initial={}),
@@ -100,8 +103,11 @@ def cookies(request):
 @login_required
 @permission_required("forum.change_post", raise_exception=True)
 def alerts(request):
-    outstanding = Alert.objects.filter(solved=False).order_by("-pubdate")
-    solved = Alert.objects.filter(solved=True).order_by("-solved_date")[:15]
+    alerts = Alert.objects.select_related(
+        "author", "moderator", "comment__author", "content__public_version", "profile__user"
+    )
+    outstanding = resolve_alerts(list(alerts.filter(solved=False).order_by("-pubdate")))
+    solved = resolve_alerts(list(alerts.filter(solved=True).order_by("-solved_date")[:15]))
 
     return render(
         request,
@@ -1,3 +1,5 @@
+import time
+
 from django.core.management.base import BaseCommand, CommandError
 from django.conf import settings
 
@@ -67,8 +69,10 @@ class Command(BaseCommand):
             if force_reindexing:
                 print(f"- indexing {model.get_es_document_type()}s")
 
+            start = time.time()
             indexed_counter = self.index_manager.es_bulk_indexing_of_model(model, force_reindexing=force_reindexing)
             if force_reindexing:
-                print(f"  {indexed_counter}\titems indexed")
+                obj_per_sec = round(indexed_counter / ((time.time() - start) or 1), 2)
+                print(f"  {indexed_counter}\titems indexed ({obj_per_sec} obj/s)")
 
         self.index_manager.refresh_index()
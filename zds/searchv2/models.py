@@ -1,3 +1,5 @@
+from collections import deque
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
 from functools import partial
 import logging
 import time
@@ -12,7 +14,7 @@ from elasticsearch_dsl import Mapping
 from elasticsearch_dsl.query import MatchAll
 from elasticsearch_dsl.connections import connections
 
-from django.db import transaction
+from django.db import connections as django_connections
 
 
 def es_document_mapper(force_reindexing, index, obj):
@@ -20,6 +22,53 @@ def es_document_mapper(force_reindexing, index, obj):
     return obj.get_es_document_as_bulk_action(index, action)
 
 
+def es_documents_mapper(force_reindexing, index, objects):
+    """Format a batch of objects as bulk actions (in the workers of ``get_es_build_executor()``)."""
+    return [es_document_mapper(force_reindexing, index, obj) for obj in objects]
+
+
+def es_documents_mapper_in_thread(force_reindexing, index, objects):
+    try:
+        return es_documents_mapper(force_reindexing, index, objects)
+    finally:
+        # each thread has its own connections to the database
+        django_connections.close_all()
+
+
+class InlineExecutor(Executor):
+    """Executor running the functions as soon as they are submitted, in the current thread."""
+
+    def submit(self, fn, /, *args, **kwargs):
+        future = Future()
+        try:
+            future.set_result(fn(*args, **kwargs))
+        except BaseException as e:
+            future.set_exception(e)
+        return future
+
+
+def get_es_build_executor(workers, pool):
+    """
+    :param workers: number of workers building the documents, they are built in the current thread if it is 1
+    :type workers: int
+    :param pool: ``"process"`` or ``"thread"``, the kind of workers
+    :type pool: str
+    :return: the executor building the documents of the batches
+    :rtype: concurrent.futures.Executor
+    """
+
+    if workers <= 1:
+        return InlineExecutor()
+    if pool == "process":
+        executor = ProcessPoolExecutor(max_workers=workers)
+        # The workers are forked on the first submission, and they must not share the connections to the database
+        # of this process: they are closed, then the workers are started before they are opened again.
+        django_connections.close_all()
+        executor.submit(int).result()
+        return executor
+    return ThreadPoolExecutor(max_workers=workers)
+
+
 class AbstractESIndexable:
     """Mixin for indexable objects.
 
@@ -38,6 +87,9 @@ class AbstractESIndexable:
     es_id = ""
 
     objects_per_batch = 100
+    # whether the objects of the batches can be sent to other processes to build their documents, they are built by
+    # threads otherwise (whatever ``ZDS_APP["search"]["indexing"]["pool"]``)
+    es_batches_picklable = True
 
     @classmethod
     def get_es_document_type(cls):
@@ -445,6 +497,10 @@ class ESIndexManager:
     def es_bulk_indexing_of_model(self, model, force_reindexing=False):
         """Perform a bulk action on documents of a given model. Use the ``objects_per_batch`` property to index.
 
+        The indexing is pipelined (see ``ZDS_APP["search"]["indexing"]``): while a batch is sent to ES, the documents
+        of the next batches are built by ``workers`` threads or processes (threads if ``model.es_batches_picklable``
+        is ``False``), and at most ``queue_size`` batches wait for each stage.
+
         See http://elasticsearch-py.readthedocs.io/en/master/api.html#elasticsearch.Elasticsearch.bulk
         and http://elasticsearch-py.readthedocs.io/en/master/helpers.html#elasticsearch.helpers.parallel_bulk
 
@@ -471,97 +527,123 @@ class ESIndexManager:
             self.logger.warn("Cannot index FakeChapter model. Please index its parent model.")
             return 0
 
-        documents_formatter = partial(es_document_mapper, force_reindexing, self.index)
+        indexing = settings.ZDS_APP["search"]["indexing"]
+        queue_size = indexing["queue_size"]
         objects_per_batch = getattr(model, "objects_per_batch", 100)
+
+        # stages of the pipeline: the batches are fetched (in this thread), their documents are built (by the
+        # workers), then they are sent to ES (by another thread) and marked as indexed (in this thread), so that
+        # the fetching, the building and the sending of different batches overlap
+        pool = indexing["pool"] if model.es_batches_picklable else "thread"
+        build_executor = get_es_build_executor(indexing["workers"], pool)
+        mapper = (
+            es_documents_mapper_in_thread if isinstance(build_executor, ThreadPoolExecutor) else es_documents_mapper
+        )
+        documents_formatter = partial(mapper, force_reindexing, self.index)
+        submit_executor = ThreadPoolExecutor(max_workers=1)
+        builds = deque()  # (objects, future documents), at most ``queue_size``
+        submissions = deque()  # (objects, future submission), at most ``queue_size``
         indexed_counter = 0
+        start = time.time()
+
+        def submit_built_batch():
+            objects, documents = builds.popleft()
+            submission = submit_executor.submit(
+                self.es_bulk_submit, documents.result(), objects_per_batch, indexing["bulk_requests"]
+            )
+            submissions.append((objects, submission))
+
+        def mark_submitted_batch():
+            nonlocal indexed_counter
+            objects, submission = submissions.popleft()
+            submission.result()
+            self.mark_as_indexed(model, objects)
+            indexed_counter += len(objects)
+            if force_reindexing:
+                obj_per_sec = round(indexed_counter / ((time.time() - start) or 1), 2)
+                print(f"    {indexed_counter} so far ({obj_per_sec} obj/s)")
+
+        try:
+            for objects in self.get_es_batches(model, force_reindexing, objects_per_batch):
+                builds.append((objects, build_executor.submit(documents_formatter, objects)))
+                while len(builds) > queue_size:
+                    submit_built_batch()
+                while len(submissions) > queue_size:
+                    mark_submitted_batch()
+            while builds:
+                submit_built_batch()
+            while submissions:
+                mark_submitted_batch()
+        finally:
+            # on failure, the batches which are not sent yet are dropped, they remain flagged
+            build_executor.shutdown(cancel_futures=True)
+            submit_executor.shutdown(cancel_futures=True)
+
+        return indexed_counter
+
+    @staticmethod
+    def get_es_batches(model, force_reindexing, objects_per_batch):
+        """Iterator that yield the objects of a model to index, by batches of ``objects_per_batch`` objects.
+
+        :param model: the model
+        :type model: class
+        :param force_reindexing: force all document to be returned
+        :type force_reindexing: bool
+        :param objects_per_batch: the size of the batches
+        :type objects_per_batch: int
+        :rtype: collections.Iterable[list]
+        """
+
         if model.__name__ == "PublishedContent":
-            generate = model.get_es_indexable(force_reindexing)
-            while True:
-                with transaction.atomic():
-                    try:
-                        # fetch a batch
-                        objects = next(generate)
-                    except StopIteration:
-                        break
-                    if not objects:
-                        break
-                    if hasattr(objects[0], "parent_model"):
-                        model_to_update = objects[0].parent_model
-                        pks = [o.parent_id for o in objects]
-                    else:
-                        model_to_update = model
-                        pks = [o.pk for o in objects]
-
-                    formatted_documents = list(map(documents_formatter, objects))
-
-                    for _, hit in parallel_bulk(
-                        self.es, formatted_documents, chunk_size=objects_per_batch, request_timeout=30
-                    ):
-                        action = list(hit.keys())[0]
-                        self.logger.info("{} {} with id {}".format(action, hit[action]["_type"], hit[action]["_id"]))
-
-                    # mark all these objects as indexed at once
-                    model_to_update.objects.filter(pk__in=pks).update(es_already_indexed=True, es_flagged=False)
-                    indexed_counter += len(objects)
-            return indexed_counter
+            # already batched, along with the chapters
+            yield from model.get_es_indexable(force_reindexing)
+            return
+
+        last_pk = 0
+        object_source = model.get_es_indexable(force_reindexing)
+        while True:
+            objects = list(object_source.filter(pk__gt=last_pk)[:objects_per_batch])
+            if not objects:
+                return
+            yield objects
+            last_pk = objects[-1].pk
+
+    def es_bulk_submit(self, documents, chunk_size, thread_count):
+        """Send bulk actions to ES, through ``thread_count`` parallel requests.
+
+        :param documents: the bulk actions
+        :type documents: list
+        :param chunk_size: number of actions per request
+        :type chunk_size: int
+        :param thread_count: number of parallel requests
+        :type thread_count: int
+        """
+
+        for _, hit in parallel_bulk(
+            self.es, documents, chunk_size=chunk_size, thread_count=thread_count, request_timeout=30
+        ):
+            if self.logger.getEffectiveLevel() <= logging.INFO:
+                action = list(hit.keys())[0]
+                self.logger.info("{} {} with id {}".format(action, hit[action]["_type"], hit[action]["_id"]))
+
+    @staticmethod
+    def mark_as_indexed(model, objects):
+        """Mark a batch of indexed objects as indexed, at once.
+
+        :param model: the indexed model
+        :type model: class
+        :param objects: the objects (or the chapters of the objects)
+        :type objects: list
+        """
+
+        if hasattr(objects[0], "parent_model"):
+            model_to_update = objects[0].parent_model
+            pks = [o.parent_id for o in objects]
         else:
-            then = time.time()
-            prev_obj_per_sec = False
-            last_pk = 0
-            object_source = model.get_es_indexable(force_reindexing)
-
-            while True:
-                with transaction.atomic():
-                    # fetch a batch
-                    objects = list(object_source.filter(pk__gt=last_pk)[:objects_per_batch])
-                    if not objects:
-                        break
-
-                    formatted_documents = list(map(documents_formatter, objects))
-
-                    for _, hit in parallel_bulk(
-                        self.es, formatted_documents, chunk_size=objects_per_batch, request_timeout=30
-                    ):
-                        if self.logger.getEffectiveLevel() <= logging.INFO:
-                            action = list(hit.keys())[0]
-                            self.logger.info(
-                                "{} {} with id {}".format(action, hit[action]["_type"], hit[action]["_id"])
-                            )
-
-                    # mark all these objects as indexed at once
-                    model.objects.filter(pk__in=[o.pk for o in objects]).update(
-                        es_already_indexed=True, es_flagged=False
-                    )
-                    indexed_counter += len(objects)
-
-                    # basic estimation of indexed objects per second
-                    now = time.time()
-                    last_batch_duration = int(now - then) or 1
-                    then = now
-                    obj_per_sec = round(float(objects_per_batch) / last_batch_duration, 2)
-                    if force_reindexing:
-                        print(
-                            "    {} so far ({} obj/s, batch size: {})".format(
-                                indexed_counter, obj_per_sec, objects_per_batch
-                            )
-                        )
-
-                    if prev_obj_per_sec is False:
-                        prev_obj_per_sec = obj_per_sec
-                    else:
-                        ratio = obj_per_sec / prev_obj_per_sec
-                        # if we processed this batch 10% slower/faster than the previous one,
-                        # shrink/increase batch size
-                        if abs(1 - ratio) > 0.1:
-                            objects_per_batch = int(objects_per_batch * ratio)
-                            if force_reindexing:
-                                print(f"     {round(ratio, 2)}x, new batch size: {objects_per_batch}")
-                        prev_obj_per_sec = obj_per_sec
-
-                    # fetch next batch
-                    last_pk = objects[-1].pk
-
-            return indexed_counter
+            model_to_update = model
+            pks = [o.pk for o in objects]
+
+        model_to_update.objects.filter(pk__in=pks).update(es_already_indexed=True, es_flagged=False)
 
     def refresh_index(self):
         """Force the refreshing the index. The task is normally done periodically, but may be forced with this method.
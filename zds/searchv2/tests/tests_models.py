@@ -1,13 +1,18 @@
+import os
+from copy import deepcopy
+from unittest.mock import patch
+
 from elasticsearch_dsl import Search
 from elasticsearch_dsl.query import MatchAll
 
 from django.conf import settings
-from django.test import TestCase
+from django.db import connection
+from django.test import TestCase, override_settings
 
 from zds.forum.tests.factories import TopicFactory, PostFactory, Topic, Post
 from zds.forum.tests.factories import create_category_and_forum
 from zds.member.tests.factories import ProfileFactory, StaffProfileFactory
-from zds.searchv2.models import ESIndexManager
+from zds.searchv2.models import ESIndexManager, django_connections, get_es_build_executor
 from zds.tutorialv2.tests.factories import PublishableContentFactory, ContainerFactory, ExtractFactory, publish_content
 from zds.tutorialv2.models.database import PublishedContent, FakeChapter, PublishableContent
 from zds.tutorialv2.tests import TutorialTestMixin, override_for_contents
@@ -364,3 +369,87 @@ class ESIndexManagerTests(TutorialTestMixin, TestCase):
 
         # delete index:
         self.manager.clear_es_index()
+
+
+class PipelinedIndexingTests(TestCase):
+    def setUp(self):
+        self.category, self.forum = create_category_and_forum()
+        self.user = ProfileFactory().user
+        for _ in range(5):
+            topic = TopicFactory(forum=self.forum, author=self.user)
+            PostFactory(topic=topic, author=self.user, position=1)
+
+        self.manager = ESIndexManager(**settings.ES_SEARCH_INDEX)
+        # ES itself is replaced by the fake bulk requests below
+        self.manager.connected_to_es = True
+        self.manager.index_exists = True
+        self.sent_documents = []
+
+    def fake_parallel_bulk(self, es, documents, **kwargs):
+        for document in documents:
+            self.sent_documents.append(document)
+            yield True, {document["_op_type"]: {"_type": document["_type"], "_id": document["_id"]}}
+
+    def index(self, model, workers, pool="thread"):
+        overridden_zds_app = deepcopy(settings.ZDS_APP)
+        overridden_zds_app["search"]["indexing"].update(workers=workers, pool=pool, queue_size=1)
+
+        def fake_document_mapper(force_reindexing, index, obj):
+            return {"_op_type": "index", "_type": obj.get_es_document_type(), "_id": obj.es_id}
+
+        with override_settings(ZDS_APP=overridden_zds_app):
+            with patch("zds.searchv2.models.parallel_bulk", side_effect=self.fake_parallel_bulk):
+                with patch("zds.searchv2.models.es_document_mapper", side_effect=fake_document_mapper):
+                    with patch.object(Post, "objects_per_batch", 2):
+                        return self.manager.es_bulk_indexing_of_model(model, force_reindexing=False)
+
+    def test_all_batches_are_indexed(self):
+        self.assertEqual(5, self.index(Post, workers=1))
+        self.assertEqual(
+            sorted(str(pk) for pk in Post.objects.values_list("pk", flat=True)),
+            sorted(document["_id"] for document in self.sent_documents),
+        )
+        self.assertFalse(Post.objects.filter(es_flagged=True).exists())
+        self.assertEqual(5, Post.objects.filter(es_already_indexed=True).count())
+
+        # nothing left to index
+        self.assertEqual(0, self.index(Post, workers=1))
+
+    def test_documents_built_by_workers(self):
+        self.assertEqual(5, self.index(Post, workers=2))
+        self.assertEqual(5, len(self.sent_documents))
+        self.assertFalse(Post.objects.filter(es_flagged=True).exists())
+
+    def test_documents_built_by_worker_processes(self):
+        events = []
+        fork = os.fork
+
+        def record_fork():
+            events.append("fork")
+            return fork()
+
+        def record_query(execute, sql, params, many, context):
+            events.append("query")
+            return execute(sql, params, many, context)
+
+        with patch("os.fork", side_effect=record_fork), connection.execute_wrapper(record_query):
+            with patch.object(django_connections, "close_all", side_effect=lambda: events.append("close")):
+                self.assertEqual(5, self.index(Post, workers=2, pool="process"))
+
+        self.assertEqual(5, len(self.sent_documents))
+        self.assertFalse(Post.objects.filter(es_flagged=True).exists())
+        # the workers are forked without any connection to the database, before the batches are fetched
+        self.assertEqual(["close", "fork", "fork", "query"], events[:4])
+
+    def test_unpicklable_batches_are_built_by_threads(self):
+        with patch("zds.searchv2.models.get_es_build_executor", wraps=get_es_build_executor) as build_executor:
+            with patch.object(Post, "es_batches_picklable", False):
+                self.assertEqual(5, self.index(Post, workers=2, pool="process"))
+        build_executor.assert_called_once_with(2, "thread")
+        self.assertEqual(5, len(self.sent_documents))
+
+    def test_failed_batches_are_not_marked(self):
+        with patch.object(ESIndexManager, "es_bulk_submit", side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                self.index(Topic, workers=1)
+        self.assertEqual(0, Topic.objects.filter(es_already_indexed=True).count())
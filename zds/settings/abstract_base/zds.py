@@ -116,6 +116,8 @@ ZDS_APP = {
             # 'discord': 'https://discord.gg/ue5MTKq'
         },
         "cnil": "1771020",
+        # seconds during which the forums, categories and tags of the top bar are cached (0 disables the cache)
+        "topbar_cache_timeout": zds_config.get("topbar_cache_timeout", 600),
     },
     "github_projects": {
         "base_url": "https://github.com/{}".format,
@@ -168,6 +170,14 @@ ZDS_APP = {
         # or 'extra_content_generation_policy': 'NOTHING'
         "extra_content_generation_policy": "WATCHDOG",
         "extra_content_watchdog_dir": BASE_DIR / "watchdog-build",
+        # number of contents the watchdog exports at the same time (the formats of a content are generated in turn)
+        "extra_content_watchdog_workers": zds_config.get("extra_content_watchdog_workers", 2),
+        # seconds after which the watchdog looks for events it was not notified of
+        "extra_content_watchdog_poll_interval": zds_config.get("extra_content_watchdog_poll_interval", 60),
+        # seconds a watchdog keeps an event without renewing its lease, after which another watchdog may claim it
+        "extra_content_watchdog_lease": zds_config.get("extra_content_watchdog_lease", 120),
+        # number of times an event is claimed before being marked as failed
+        "extra_content_watchdog_max_attempts": zds_config.get("extra_content_watchdog_max_attempts", 3),
         "max_tree_depth": 3,
         "default_licence_pk": 7,
         "content_per_page": 42,
@@ -183,6 +193,23 @@ ZDS_APP = {
         "default_image": BASE_DIR / "fixtures" / "noir_black.png",
         "import_image_prefix": "archive",
         "build_pdf_when_published": True,
+        # number of processes generating the downloadable formats of a content concurrently (except markdown)
+        "extra_content_generation_workers": zds_config.get("extra_content_generation_workers", 1),
+        # if greater than 1, texts are rendered separately, with at most this number of concurrent requests to
+        # zmarkdown, instead of rendering the whole content at once
+        "publication_render_concurrency": zds_config.get("publication_render_concurrency", 1),
+        # if True, only the texts which changed since the last publication are rendered again
+        "incremental_publication": zds_config.get("incremental_publication", False),
+        # number of versions of the published files kept on disk, the last one being online
+        "publication_generations_kept": zds_config.get("publication_generations_kept", 2),
+        # manifests and texts of the versions (which never change) are cached in-process, then in the Django cache
+        # named ``shared_cache`` (if any), instead of being read from git
+        "version_cache": {
+            "enabled": zds_config.get("content_version_cache_enabled", True),
+            "local_max_entries": zds_config.get("content_version_cache_local_max_entries", 256),
+            "shared_cache": zds_config.get("content_version_cache_shared_cache", "default"),
+            "shared_timeout": zds_config.get("content_version_cache_shared_timeout", 86400),
+        },
         "maximum_slug_size": 150,
         "characters_per_minute": 1500,
         "editorial_line_link": "https://zestedesavoir.com/articles/222/la-ligne-editoriale-officielle-de-zeste-de-savoir/",
@@ -192,6 +219,12 @@ ZDS_APP = {
             "katex": BASE_DIR / "dist" / "css" / "katex.min.css",
         },
         "latex_template_repo": "NOT_EXISTING_DIR",
+        # PDF already built from the same LaTeX file and images are taken from there, set to None to disable
+        "latex_build_cache_dir": zds_config.get("latex_build_cache_dir", str(BASE_DIR / "latex-build-cache")),
+        "latex_build_cache_max_entries": zds_config.get("latex_build_cache_max_entries", 500),
+        # zip archives of the downloaded versions are kept there, set to None to disable
+        "archive_cache_dir": zds_config.get("archive_cache_dir", str(BASE_DIR / "archive-cache")),
+        "archive_cache_max_entries": zds_config.get("archive_cache_max_entries", 200),
     },
     "forum": {
         "posts_per_page": 21,
@@ -222,11 +255,35 @@ ZDS_APP = {
     },
     "notification": {
         "per_page": 50,
+        # seconds during which the notifications and alerts shown in the header are cached (0 disables the cache)
+        "header_cache_timeout": zds_config.get("notification_header_cache_timeout", 300),
+        # number of notification emails sent with the same connection to the mail server
+        "email_batch_size": 100,
+        # send the notifications about new topics, posts, reactions and publications with the dispatch_notifications
+        # command instead of during the request
+        "deferred_dispatch": zds_config.get("notification_deferred_dispatch", False),
+        # number of deferred notifications sent in the same transaction
+        "dispatch_batch_size": 50,
+        # seconds between two checks for deferred notifications
+        "dispatch_poll_interval": 5,
+        # deferred notifications are not sent any more once they failed this many times
+        "dispatch_max_attempts": 3,
+        # seconds during which the deferred notifications claimed by a command cannot be claimed by another one
+        "dispatch_lease": 300,
     },
     "paginator": {"folding_limit": 4},
     "search": {
         "mark_keywords": ["javafx", "haskell", "groovy", "powershell", "latex", "linux", "windows"],
         "results_per_page": 20,
+        "indexing": {
+            # number of threads or processes ("pool") building the documents, 1 to build them in the indexing process
+            "workers": zds_config.get("es_indexing_workers", 1),
+            "pool": zds_config.get("es_indexing_pool", "process"),
+            # maximal number of batches waiting to be built, and to be sent
+            "queue_size": zds_config.get("es_indexing_queue_size", 2),
+            # number of simultaneous bulk requests sending a batch
+            "bulk_requests": zds_config.get("es_indexing_bulk_requests", 4),
+        },
         "search_groups": {
             "content": (_("Contenus publiés"), ["publishedcontent", "chapter"]),
             "topic": (_("Sujets du forum"), ["topic"]),
@@ -261,6 +318,20 @@ ZDS_APP = {
     },
     "visual_changes": [],
     "display_search_bar": True,
-    "zmd": {"server": "http://127.0.0.1:27272", "disable_pings": False},
+    "zmd": {
+        "server": "http://127.0.0.1:27272",
+        "disable_pings": False,
+        # connections to the server are kept alive and shared by the whole process
+        "pool_size": zds_config.get("zmd_pool_size", 10),
+        "retry_backoff": zds_config.get("zmd_retry_backoff", 0.1),
+        # renders are cached in-process, then in the Django cache named ``shared_cache`` (if any);
+        # pings are resolved at render time, so ``shared_timeout`` bounds how long a stale ping may be served
+        "render_cache": {
+            "enabled": zds_config.get("zmd_render_cache_enabled", True),
+            "local_max_entries": zds_config.get("zmd_render_cache_local_max_entries", 512),
+            "shared_cache": zds_config.get("zmd_render_cache_shared_cache", "default"),
+            "shared_timeout": zds_config.get("zmd_render_cache_shared_timeout", 3600),
+        },
+    },
     "very_top_banner": {},
 }
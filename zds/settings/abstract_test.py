@@ -1,6 +1,19 @@
+import os
+import tempfile
+
 DEBUG = False
 
 PASSWORD_HASHERS = (
     "django.contrib.auth.hashers.MD5PasswordHasher",
     "django.contrib.auth.hashers.SHA1PasswordHasher",
 )
+
+from .abstract_base.zds import ZDS_APP
+
+# the cache outlives the database of each test, which is rolled back without sending any signal
+ZDS_APP["notification"]["header_cache_timeout"] = 0
+ZDS_APP["site"]["topbar_cache_timeout"] = 0
+ZDS_APP["zmd"]["render_cache"]["enabled"] = False
+# the archives of the downloaded versions and the LaTeX builds are not kept in the application directory
+ZDS_APP["content"]["archive_cache_dir"] = os.path.join(tempfile.gettempdir(), "zds-test-archive-cache")
+ZDS_APP["content"]["latex_build_cache_dir"] = os.path.join(tempfile.gettempdir(), "zds-test-latex-build-cache")
@@ -99,7 +99,7 @@ class ContentReadAdmin(admin.ModelAdmin):
 
 
 class PublicationEventAdmin(admin.ModelAdmin):
-    list_display = ("published_object", "date", "state_of_processing", "format_requested")
+    list_display = ("published_object", "date", "state_of_processing", "format_requested", "worker", "attempts")
     ordering = ("published_object", "date", "state_of_processing")
     search_fields = ("state_of_processing", "published_object__title", "date")
 
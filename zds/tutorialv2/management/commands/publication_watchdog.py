@@ -1,67 +1,227 @@
 import logging
+import os
+import socket
+import threading
 import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
 
 from pathlib import Path
 
+from django.conf import settings
 from django.core.management import BaseCommand
+from django.db import connections, transaction
+from django.db.models import F, Q
 
 from zds.tutorialv2.models.database import PublicationEvent
-from zds.tutorialv2.publication_utils import PublicatorRegistry, FailureDuringPublication
+from zds.tutorialv2.publication_utils import PublicatorRegistry, FailureDuringPublication, get_watchdog_wake_file
+from zds.utils.misc import select_for_update_skip_locked
 
 logger = logging.getLogger(__name__)
 
+# seconds between two checks of the wake file, which cost nothing to the database
+WAKE_CHECK_INTERVAL = 0.5
+
 
 class Command(BaseCommand):
     help = "Launch a watchdog that generate all exported formats (epub, pdf...) files without blocking request handling"
 
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--once", action="store_true", help="Process the requested events, then exit instead of waiting for more"
+        )
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # identifies the events claimed by this watchdog, among the ones running on every host
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
     def handle(self, *args, **options):
-        # We mark running events as failure, in case this command failed while running
-        running_events = PublicationEvent.objects.filter(state_of_processing="RUNNING")
-        for publication_event in running_events.iterator():
-            publication_event.state_of_processing = "FAILURE"
-            publication_event.save()
+        # Events left running by a stopped watchdog are claimed again once their lease expires,
+        # so that other watchdogs running at the same time are not disturbed.
+        stop_heartbeat = threading.Event()
+        heartbeat = threading.Thread(target=self.renew_leases_until, args=(stop_heartbeat,), daemon=True)
+        heartbeat.start()
+        try:
+            while True:
+                # read before looking for events, so that a notification sent in between is not missed
+                last_wake = self.get_wake_time()
+                try:
+                    processed = self.run()
+                except:
+                    logger.exception("Exception during one publication_watchdog run.")
+                    processed = 0
+                if options["once"] and not processed:
+                    break
+                if not processed:
+                    self.wait_for_events(last_wake)
+        finally:
+            stop_heartbeat.set()
+            heartbeat.join()
 
-        while True:
-            requested_events = PublicationEvent.objects.filter(state_of_processing="REQUESTED")
-            while requested_events.count() == 0:
-                time.sleep(60)
+    def get_lease_expiration(self):
+        return datetime.now() + timedelta(seconds=settings.ZDS_APP["content"]["extra_content_watchdog_lease"])
 
-            try:
-                self.run()
-            except:
-                logger.exception("Exception during one publication_watchdog run.")
+    def renew_leases(self):
+        """
+        Extend the lease of the events being processed by this watchdog.
 
-    def run(self):
-        requested_events = PublicationEvent.objects.select_related(
-            "published_object", "published_object__content", "published_object__content__image"
-        ).filter(state_of_processing="REQUESTED")
-
-        for publication_event in requested_events.iterator():
-            try:
-                content = publication_event.published_object
-                extra_content_dir = content.get_extra_contents_directory()
-                building_extra_content_path = Path(
-                    str(Path(extra_content_dir).parent) + "__building", "extra_contents", content.content_public_slug
+        :return: the number of events whose lease was renewed
+        :rtype: int
+        """
+        return PublicationEvent.objects.filter(worker=self.worker_id, state_of_processing="RUNNING").update(
+            lease_expiration=self.get_lease_expiration()
+        )
+
+    def renew_leases_until(self, stop):
+        # renew well before the lease expires, so that a slow database does not make us lose it
+        interval = settings.ZDS_APP["content"]["extra_content_watchdog_lease"] / 3
+        try:
+            while not stop.wait(interval):
+                try:
+                    self.renew_leases()
+                except:
+                    logger.exception("Could not renew the leases of %s.", self.worker_id)
+        finally:
+            connections.close_all()
+
+    @staticmethod
+    def get_wake_time():
+        try:
+            return get_watchdog_wake_file().stat().st_mtime_ns
+        except OSError:
+            return None
+
+    def wait_for_events(self, last_wake):
+        """
+        Sleep until new events are notified through the wake file, or until the database has to be polled again
+        (``extra_content_watchdog_poll_interval``) for events which were not notified.
+        """
+        deadline = time.monotonic() + settings.ZDS_APP["content"]["extra_content_watchdog_poll_interval"]
+        while time.monotonic() < deadline:
+            time.sleep(WAKE_CHECK_INTERVAL)
+            if self.get_wake_time() != last_wake:
+                return
+
+    def claim_events(self, max_contents):
+        """
+        Claim the requested events of the oldest contents for this watchdog, as well as the running events whose
+        lease expired (their watchdog stopped). The rows are locked while they are claimed (when the database
+        supports it) and an event is only claimed if it is still claimable, so that several watchdogs can share the
+        events. An event claimed more than ``extra_content_watchdog_max_attempts`` times is marked as failed.
+
+        :param max_contents: maximal number of contents whose events are claimed
+        :return: the claimed events
+        :rtype: list[PublicationEvent]
+        """
+        max_attempts = settings.ZDS_APP["content"]["extra_content_watchdog_max_attempts"]
+        with transaction.atomic():
+            claimable = Q(state_of_processing="REQUESTED") | Q(
+                Q(lease_expiration__isnull=True) | Q(lease_expiration__lt=datetime.now()), state_of_processing="RUNNING"
+            )
+            claimable_events = select_for_update_skip_locked(
+                PublicationEvent.objects.filter(claimable).order_by("date", "pk")
+            )
+            content_pks = []
+            for content_pk in claimable_events.values_list("published_object", flat=True):
+                if content_pk not in content_pks:
+                    content_pks.append(content_pk)
+            claimed_pks = [
+                event_pk
+                for event_pk in claimable_events.filter(published_object__in=content_pks[:max_contents]).values_list(
+                    "pk", flat=True
+                )
+                if PublicationEvent.objects.filter(claimable, pk=event_pk).update(
+                    state_of_processing="RUNNING",
+                    worker=self.worker_id,
+                    lease_expiration=self.get_lease_expiration(),
+                    attempts=F("attempts") + 1,
                 )
-                if not building_extra_content_path.exists():
-                    building_extra_content_path.mkdir(parents=True)
-                base_name = str(building_extra_content_path)
-                md_file_path = base_name + ".md"
-
-                logger.info("Exporting « %s » as %s", content.title(), publication_event.format_requested)
-                publication_event.state_of_processing = "RUNNING"
-                publication_event.save()
-
-                publicator = PublicatorRegistry.get(publication_event.format_requested)
-                publicator.publish(md_file_path, base_name)
-            except:
-                # Update and save the publication state before logging, in case
-                # content.title() would raise an exception (it already used to
-                # happen!).
-                publication_event.state_of_processing = "FAILURE"
-                publication_event.save()
-                logger.exception("Failed to export « %s » as %s", content.title(), publication_event.format_requested)
+            ]
+            PublicationEvent.objects.filter(pk__in=claimed_pks, attempts__gt=max_attempts).update(
+                state_of_processing="FAILURE"
+            )
+        return list(
+            PublicationEvent.objects.select_related(
+                "published_object", "published_object__content", "published_object__content__image"
+            )
+            .filter(pk__in=claimed_pks, state_of_processing="RUNNING")
+            .order_by("date", "pk")
+        )
+
+    def run(self):
+        """
+        Process the requested events of ``extra_content_watchdog_workers`` contents at a time. The events of a
+        content share its build directory, so they are processed one after the other, by the same worker.
+
+        :return: the number of processed events
+        :rtype: int
+        """
+        workers = settings.ZDS_APP["content"]["extra_content_watchdog_workers"]
+        processed = 0
+        while True:
+            publication_events = self.claim_events(max_contents=workers)
+            if not publication_events:
+                return processed
+            events_by_content = {}
+            for publication_event in publication_events:
+                events_by_content.setdefault(publication_event.published_object_id, []).append(publication_event)
+            # the other formats are generated from the markdown file
+            contents_events = [
+                sorted(events, key=lambda event: event.format_requested != "md")
+                for events in events_by_content.values()
+            ]
+            if workers > 1 and len(contents_events) > 1:
+                with ThreadPoolExecutor(max_workers=workers) as executor:
+                    list(executor.map(self.process_events_in_thread, contents_events))
             else:
-                publication_event.state_of_processing = "SUCCESS"
-                publication_event.save()
-                logger.info("Succeed to export « %s » as %s", content.title(), publication_event.format_requested)
+                for events in contents_events:
+                    self.process_events(events)
+            processed += len(publication_events)
+
+    def process_events_in_thread(self, publication_events):
+        try:
+            self.process_events(publication_events)
+        finally:
+            # each thread has its own connections to the database
+            connections.close_all()
+
+    def process_events(self, publication_events):
+        for publication_event in publication_events:
+            self.process_event(publication_event)
+
+    def process_event(self, publication_event):
+        try:
+            content = publication_event.published_object
+            extra_content_dir = content.get_extra_contents_directory()
+            building_extra_content_path = Path(
+                str(Path(extra_content_dir).parent) + "__building", "extra_contents", content.content_public_slug
+            )
+            building_extra_content_path.mkdir(parents=True, exist_ok=True)
+            base_name = str(building_extra_content_path)
+            md_file_path = base_name + ".md"
+
+            logger.info("Exporting « %s » as %s", content.title(), publication_event.format_requested)
+
+            publicator = PublicatorRegistry.get(publication_event.format_requested)
+            publicator.publish(md_file_path, base_name)
+        except:
+            # Update and save the publication state before logging, in case
+            # content.title() would raise an exception (it already used to
+            # happen!).
+            self.finish_event(publication_event, "FAILURE")
+            logger.exception("Failed to export « %s » as %s", content.title(), publication_event.format_requested)
+        else:
+            self.finish_event(publication_event, "SUCCESS")
+            logger.info("Succeed to export « %s » as %s", content.title(), publication_event.format_requested)
+
+    def finish_event(self, publication_event, state_of_processing):
+        """
+        Save the state of a processed event, unless its lease expired and another watchdog claimed it meanwhile.
+        """
+        publication_event.state_of_processing = state_of_processing
+        if not PublicationEvent.objects.filter(
+            pk=publication_event.pk, worker=self.worker_id, state_of_processing="RUNNING"
+        ).update(state_of_processing=state_of_processing, lease_expiration=None):
+            logger.warning("%s lost the lease of the publication event %d.", self.worker_id, publication_event.pk)
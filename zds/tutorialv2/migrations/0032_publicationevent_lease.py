@@ -0,0 +1,28 @@
+# Generated by Django 3.2.12 on 2026-10-18 09:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("tutorialv2", "0031_source_is_url"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="publicationevent",
+            name="attempts",
+            field=models.PositiveSmallIntegerField(default=0, verbose_name="nombre de tentatives"),
+        ),
+        migrations.AddField(
+            model_name="publicationevent",
+            name="lease_expiration",
+            field=models.DateTimeField(blank=True, null=True, verbose_name="fin de la réservation"),
+        ),
+        migrations.AddField(
+            model_name="publicationevent",
+            name="worker",
+            field=models.CharField(blank=True, default="", max_length=255, verbose_name="observateur"),
+        ),
+    ]
@@ -1,3 +1,5 @@
+from collections.abc import Iterator
+
 from django.contrib import messages
 from django.core.exceptions import PermissionDenied
 from django.urls import reverse
@@ -525,11 +527,16 @@ class DownloadViewMixin(View):
     def get(self, context, **response_kwargs):
         """
         Access to a file with only get method then write the file content in response stream.
-        Properly sets Content-Type and Content-Disposition headers
+        Properly sets Content-Type and Content-Disposition headers.
+        When ``get_contents()`` returns an iterator of chunks instead of the whole file, they are streamed.
         """
-        response = HttpResponse(content_type=self.get_mimetype())
+        contents = self.get_contents()
+        if isinstance(contents, Iterator):
+            response = StreamingHttpResponse(contents, content_type=self.get_mimetype())
+        else:
+            response = HttpResponse(content_type=self.get_mimetype())
+            response.write(contents)
         response["Content-Disposition"] = "filename=" + self.get_filename()
-        response.write(self.get_contents())
 
         return response
 
@@ -35,11 +35,12 @@ from zds.tutorialv2.managers import PublishedContentManager, PublishableContentM
 from zds.tutorialv2.models import TYPE_CHOICES, STATUS_CHOICES, CONTENT_TYPES_REQUIRING_VALIDATION, PICK_OPERATIONS
 from zds.tutorialv2.models.mixins import TemplatableContentModelMixin, OnlineLinkableContentMixin
 from zds.tutorialv2.models.versioned import NotAPublicVersion
-from zds.tutorialv2.utils import get_content_from_json, BadManifestError
+from zds.tutorialv2.publication_generations import remove_published_files
+from zds.tutorialv2.utils import get_blob, get_content_from_json, BadManifestError
+from zds.tutorialv2.version_cache import get_cached_file
 from zds.utils import get_current_user
 from zds.utils.models import SubCategory, Licence, HelpWriting, Comment, Tag
 from zds.utils.templatetags.emarkdown import render_markdown_stats
-from zds.utils.tutorials import get_blob
 from zds.utils.uuslug_wrapper import uuslug
 
 ALLOWED_TYPES = ["pdf", "md", "html", "epub", "zip", "tex"]
@@ -382,15 +383,20 @@ class PublishableContent(models.Model, TemplatableContentModelMixin):
             if not os.path.isdir(path):
                 raise OSError(path)
 
-            repo = Repo(path)
-            data = get_blob(repo.commit(sha).tree, "manifest.json")
-            try:
-                manifest = json_handler.loads(data)
-                logger.debug("loaded json")
-            except ValueError:
-                raise BadManifestError(
-                    _("Une erreur est survenue lors de la lecture du manifest.json, est-ce du JSON ?")
-                )
+            def read_manifest():
+                repo = Repo(path)
+                data = get_blob(repo.commit(sha).tree, "manifest.json")
+                try:
+                    manifest = json_handler.loads(data)
+                    logger.debug("loaded json")
+                except ValueError:
+                    raise BadManifestError(
+                        _("Une erreur est survenue lors de la lecture du manifest.json, est-ce du JSON ?")
+                    )
+                return manifest
+
+            # a version never changes, its manifest is read from git once
+            manifest = get_cached_file(self.pk, sha, "manifest.json", read_manifest)
 
         return manifest
 
@@ -601,8 +607,7 @@ class PublishableContent(models.Model, TemplatableContentModelMixin):
         if os.path.exists(self.get_repo_path()):
             shutil.rmtree(self.get_repo_path(), False)
         if self.in_public() and self.public_version:
-            if os.path.exists(self.public_version.get_prod_path()):
-                shutil.rmtree(self.public_version.get_prod_path())
+            remove_published_files(self.public_version.get_prod_path())
 
         Validation.objects.filter(content=self).delete()
 
@@ -655,6 +660,8 @@ class PublishedContent(AbstractESDjangoIndexable, TemplatableContentModelMixin,
     """
 
     objects_per_batch = 25
+    # the public versions loaded by get_es_indexable() are not pickled, the documents are built by threads
+    es_batches_picklable = False
 
     class Meta:
         verbose_name = "Contenu publié"
@@ -684,6 +691,7 @@ class PublishedContent(AbstractESDjangoIndexable, TemplatableContentModelMixin,
     sizes = models.CharField("Tailles des fichiers téléchargeables", max_length=512, default="{}")
     _meta_description = None
     _manifest = None
+    _es_categories = None
 
     @staticmethod
     def get_slug_from_file_path(file_path):
@@ -692,6 +700,12 @@ class PublishedContent(AbstractESDjangoIndexable, TemplatableContentModelMixin,
     def __str__(self):
         return _('Version publique de "{}"').format(self.content.title)
 
+    def __getstate__(self):
+        """Overridden because the loaded public version cannot be pickled, it is loaded again when needed."""
+        state = super().__getstate__()
+        state.pop("versioned_model", None)
+        return state
+
     def title(self):
         if self.versioned_model:
             return self.versioned_model.title
@@ -746,6 +760,16 @@ class PublishedContent(AbstractESDjangoIndexable, TemplatableContentModelMixin,
         self.versioned_model = self.content.load_version(sha=self.sha_public, public=self)
         return self.versioned_model
 
+    def get_es_categories(self):
+        """
+        :return: the slugs of the categories and of the subcategories of the content, computed once for the
+            documents of the content and of its chapters
+        :rtype: tuple[list[str], list[str]]
+        """
+        if self._es_categories is None:
+            self._es_categories = get_categories_slugs(self.content.subcategory.all())
+        return self._es_categories
+
     def get_extra_contents_directory(self):
         """
         :return: path to all the 'extra contents'
@@ -1036,7 +1060,9 @@ class PublishedContent(AbstractESDjangoIndexable, TemplatableContentModelMixin,
             chapters = []
 
             for content in objects:
+                # loaded once, then shared by the documents of the content and of its chapters
                 versioned = content.load_public_version()
+                categories = content.get_es_categories()
 
                 # chapters are only indexed for middle and big tuto
                 if versioned.has_sub_containers():
@@ -1049,7 +1075,7 @@ class PublishedContent(AbstractESDjangoIndexable, TemplatableContentModelMixin,
 
                     # (re)index the new one(s)
                     for chapter in versioned.get_list_of_chapters():
-                        chapters.append(FakeChapter(chapter, versioned, content.es_id))
+                        chapters.append(FakeChapter(chapter, versioned, content.es_id, categories))
 
             if chapters:
                 # since we want to return at most PublishedContent.objects_per_batch items
@@ -1072,8 +1098,10 @@ class PublishedContent(AbstractESDjangoIndexable, TemplatableContentModelMixin,
 
         data = super().get_es_document_source(excluded_fields=excluded_fields)
 
-        # fetch versioned information
-        versioned = self.load_public_version()
+        # fetch versioned information (the version loaded by get_es_indexable(), if any)
+        if not self.versioned_model:
+            self.load_public_version()
+        versioned = self.versioned_model
 
         data["title"] = versioned.title
         data["description"] = versioned.description
@@ -1082,17 +1110,7 @@ class PublishedContent(AbstractESDjangoIndexable, TemplatableContentModelMixin,
         if self.content.image:
             data["thumbnail"] = self.content.image.physical["content_thumb"].url
 
-        categories = []
-        subcategories = []
-        for subcategory in versioned.subcategory.all():
-            parent_category = subcategory.get_parent_category()
-            if subcategory.slug not in subcategories:
-                subcategories.append(subcategory.slug)
-            if parent_category and parent_category.slug not in categories:
-                categories.append(parent_category.slug)
-
-        data["categories"] = categories
-        data["subcategories"] = subcategories
+        data["categories"], data["subcategories"] = self.get_es_categories()
 
         if versioned.has_extracts():
             data["text"] = versioned.get_content_online()
@@ -1137,6 +1155,23 @@ def delete_published_content_in_elasticsearch_if_set_to_redirect(sender, instanc
             delete_published_content_in_elasticsearch(sender, instance, **kwargs)
 
 
+def get_categories_slugs(subcategories):
+    """
+    :param subcategories: the subcategories of a content
+    :return: the slugs of the parent categories and of the subcategories, without duplicates
+    :rtype: tuple[list[str], list[str]]
+    """
+    categories = []
+    subcategories_slugs = []
+    for subcategory in subcategories:
+        parent_category = subcategory.get_parent_category()
+        if subcategory.slug not in subcategories_slugs:
+            subcategories_slugs.append(subcategory.slug)
+        if parent_category and parent_category.slug not in categories:
+            categories.append(parent_category.slug)
+    return categories, subcategories_slugs
+
+
 class FakeChapter(AbstractESIndexable):
     """A simple class that is used by ES to index chapters, constructed from the containers.
 
@@ -1157,7 +1192,7 @@ class FakeChapter(AbstractESIndexable):
     categories = None
     subcategories = None
 
-    def __init__(self, chapter, main_container, parent_id):
+    def __init__(self, chapter, main_container, parent_id, categories=None):
         self.title = chapter.title
         self.text = chapter.get_content_online()
         self.parent_id = parent_id
@@ -1172,14 +1207,9 @@ class FakeChapter(AbstractESIndexable):
         if main_container.image:
             self.thumbnail = main_container.image.physical["content_thumb"].url
 
-        self.categories = []
-        self.subcategories = []
-        for subcategory in main_container.subcategory.all():
-            parent_category = subcategory.get_parent_category()
-            if subcategory.slug not in self.subcategories:
-                self.subcategories.append(subcategory.slug)
-            if parent_category and parent_category.slug not in self.categories:
-                self.categories.append(parent_category.slug)
+        if categories is None:
+            categories = get_categories_slugs(main_container.subcategory.all())
+        self.categories, self.subcategories = categories
 
     @classmethod
     def get_es_document_type(cls):
@@ -1426,6 +1456,10 @@ class PublicationEvent(models.Model):
     # 25 for formats such as "printable.pdf", if tomorrow we want other "long" formats this will be ready
     format_requested = models.CharField(blank=False, null=False, max_length=25)
     created = models.DateTimeField(verbose_name="date de création", name="date", auto_now_add=True)
+    # the watchdog processing the event, which must renew its lease until the event is processed
+    worker = models.CharField(verbose_name="observateur", blank=True, default="", max_length=255)
+    lease_expiration = models.DateTimeField(verbose_name="fin de la réservation", null=True, blank=True)
+    attempts = models.PositiveSmallIntegerField(verbose_name="nombre de tentatives", default=0)
 
     def __str__(self):
         return f"{self.published_object.title()}: {self.format_requested} - {self.state_of_processing}"
@@ -17,7 +17,8 @@ from django.template.loader import render_to_string
 from zds.tutorialv2.models.mixins import TemplatableContentModelMixin
 from zds.tutorialv2.models import SINGLE_CONTAINER_CONTENT_TYPES, CONTENT_TYPES_BETA, CONTENT_TYPES_REQUIRING_VALIDATION
 from zds.tutorialv2.utils import default_slug_pool, export_content, get_commit_author, InvalidOperationError
-from zds.tutorialv2.utils import get_blob, InvalidSlugError, check_slug
+from zds.tutorialv2.utils import GitTreeIndex, InvalidSlugError, check_slug
+from zds.tutorialv2.version_cache import get_cached_file
 from zds.utils.misc import compute_hash
 from zds.utils.templatetags.emarkdown import emarkdown
 from zds.utils.uuslug_wrapper import slugify
@@ -427,13 +428,7 @@ class Container:
         :rtype: str
         """
         if self.introduction:
-            return (
-                get_blob(
-                    self.top_container().repository.commit(self.top_container().current_version).tree,
-                    self.introduction.replace("\\", "/"),
-                )
-                or ""
-            )
+            return self.top_container().get_blob(self.introduction) or ""
         return ""
 
     def get_conclusion(self):
@@ -442,13 +437,7 @@ class Container:
         :rtype: str
         """
         if self.conclusion:
-            return (
-                get_blob(
-                    self.top_container().repository.commit(self.top_container().current_version).tree,
-                    self.conclusion.replace("\\", "/"),
-                )
-                or ""
-            )
+            return self.top_container().get_blob(self.conclusion) or ""
         return ""
 
     def get_introduction_online(self):
@@ -1019,10 +1008,7 @@ class Extract:
         :rtype: str
         """
         if self.text:
-            return get_blob(
-                self.container.top_container().repository.commit(self.container.top_container().current_version).tree,
-                self.text.replace("\\", "/"),
-            )
+            return self.container.top_container().get_blob(self.text)
         return ""
 
     def compute_hash(self):
@@ -1162,6 +1148,7 @@ class VersionedContent(Container, TemplatableContentModelMixin):
     current_version = None
     slug_repository = ""
     repository = None
+    _tree_index = None  # (repository, version) and its GitTreeIndex
 
     PUBLIC = False  # this variable is set to true when the VersionedContent is created from the public repository
 
@@ -1235,6 +1222,23 @@ class VersionedContent(Container, TemplatableContentModelMixin):
     def __str__(self):
         return self.title
 
+    def get_blob(self, path):
+        """Read a file of this version of the content. The files are cached (see ``zds.tutorialv2.version_cache``),
+        the others are looked up through the same ``GitTreeIndex``, built once for the repository and the version.
+
+        :param path: path of the file, relative to the root of the repository
+        :type path: str
+        :return: the content of the file, or ``None`` if there is no such file
+        :rtype: str
+        """
+        return get_cached_file(self.pk, self.current_version, path, lambda: self._read_blob(path))
+
+    def _read_blob(self, path):
+        key = (self.repository.git_dir, self.current_version)
+        if self._tree_index is None or self._tree_index[0] != key:
+            self._tree_index = (key, GitTreeIndex(self.repository.commit(self.current_version).tree))
+        return self._tree_index[1].get_blob(path)
+
     def get_absolute_url(self, version=None):
         return TemplatableContentModelMixin.get_absolute_url(self, version)
 
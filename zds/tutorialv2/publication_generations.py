@@ -0,0 +1,146 @@
+"""
+Generations of the published files of a content.
+
+The public directory of a content (``contents-public/<slug>``) is a symbolic link to one of the directories of
+``contents-public/<slug>__generations``. A new publication is written to a new generation, then the link is replaced
+in a single ``rename()``: readers either see the previous version or the new one, never a missing or half-written
+directory. The previous generations are kept (see ``publication_generations_kept``) so that a publication can be
+rolled back instantly.
+"""
+import logging
+import os
+import shutil
+from datetime import datetime
+from pathlib import Path
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+GENERATIONS_SUFFIX = "__generations"
+LINK_SUFFIX = "__link"
+# name given to a directory published before generations were introduced, sorts before any other generation
+LEGACY_GENERATION = "00000000-000000-000000"
+
+
+def get_generations_directory(prod_path):
+    """
+    :param prod_path: public directory of a content
+    :return: the directory containing the generations of this content
+    :rtype: pathlib.Path
+    """
+    prod_path = Path(prod_path)
+    return prod_path.with_name(prod_path.name + GENERATIONS_SUFFIX)
+
+
+def _new_generation_name():
+    # names sort in chronological order
+    return datetime.now().strftime("%Y%m%d-%H%M%S-%f")
+
+
+def create_generation(prod_path):
+    """
+    Create an empty generation for the content published in ``prod_path``.
+
+    :param prod_path: public directory of a content
+    :return: the directory of the new generation
+    :rtype: pathlib.Path
+    """
+    generation = get_generations_directory(prod_path) / _new_generation_name()
+    generation.mkdir(parents=True)
+    return generation
+
+
+def list_generations(prod_path):
+    """
+    :param prod_path: public directory of a content
+    :return: the generations of this content, from the oldest to the newest
+    :rtype: list[pathlib.Path]
+    """
+    generations_directory = get_generations_directory(prod_path)
+    if not generations_directory.is_dir():
+        return []
+    return sorted(child for child in generations_directory.iterdir() if child.is_dir())
+
+
+def get_current_generation(prod_path):
+    """
+    :param prod_path: public directory of a content
+    :return: the generation ``prod_path`` links to, or ``None`` if it is not a link
+    :rtype: pathlib.Path
+    """
+    prod_path = Path(prod_path)
+    if not prod_path.is_symlink():
+        return None
+    return get_generations_directory(prod_path) / Path(os.readlink(prod_path)).name
+
+
+def switch_to_generation(prod_path, generation):
+    """
+    Atomically make ``prod_path`` point to ``generation``.
+
+    If ``prod_path`` is still a regular directory (content published before generations were introduced),
+    it is first moved to the generations so that the link can replace it.
+
+    :param prod_path: public directory of a content
+    :param generation: the generation to put online
+    """
+    prod_path = Path(prod_path)
+    if prod_path.is_dir() and not prod_path.is_symlink():
+        os.rename(prod_path, get_generations_directory(prod_path) / LEGACY_GENERATION)
+    link = prod_path.with_name(prod_path.name + LINK_SUFFIX)
+    if link.is_symlink():
+        link.unlink()  # left by an interrupted switch
+    link.symlink_to(os.path.relpath(generation, prod_path.parent), target_is_directory=True)
+    os.replace(link, prod_path)
+
+
+def collect_generations(prod_path, kept=None):
+    """
+    Remove the oldest generations, keeping the current one and the most recent ones.
+
+    :param prod_path: public directory of a content
+    :param kept: number of generations to keep, defaults to ``publication_generations_kept``
+    :return: the removed generations
+    :rtype: list[pathlib.Path]
+    """
+    if kept is None:
+        kept = settings.ZDS_APP["content"]["publication_generations_kept"]
+    current = get_current_generation(prod_path)
+    generations = list_generations(prod_path)
+    removed = [generation for generation in generations[: -max(kept, 1)] if generation != current]
+    for generation in removed:
+        logger.debug("remove publication generation %s", generation)
+        shutil.rmtree(generation, ignore_errors=True)
+    return removed
+
+
+def rollback_publication(prod_path):
+    """
+    Put the generation preceding the current one back online. Only the files are concerned: the database still
+    refers to the last published version.
+
+    :param prod_path: public directory of a content
+    :return: the generation now online, or ``None`` if there is no previous generation
+    :rtype: pathlib.Path
+    """
+    current = get_current_generation(prod_path)
+    previous = [generation for generation in list_generations(prod_path) if current is None or generation < current]
+    if not previous:
+        return None
+    switch_to_generation(prod_path, previous[-1])
+    return previous[-1]
+
+
+def remove_published_files(prod_path):
+    """
+    Remove the public directory of a content and all its generations.
+
+    :param prod_path: public directory of a content
+    """
+    prod_path = Path(prod_path)
+    if prod_path.is_symlink():
+        prod_path.unlink()
+    elif prod_path.is_dir():
+        shutil.rmtree(prod_path)
+    shutil.rmtree(get_generations_directory(prod_path), ignore_errors=True)
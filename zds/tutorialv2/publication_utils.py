@@ -1,17 +1,22 @@
 import contextlib
 import copy
+import hashlib
 import json
 import logging
+import multiprocessing
 import os
 import shutil
 import subprocess
+import time
 import zipfile
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
 from os import makedirs, path
 from pathlib import Path
 
 import requests
 from django.core.exceptions import ObjectDoesNotExist
+from django.db import connections, transaction
 from django.template.loader import render_to_string
 from django.utils import translation
 from django.utils.translation import gettext_lazy as _
@@ -19,7 +24,13 @@ from django.conf import settings
 from zds.tutorialv2 import signals
 from zds.tutorialv2.epub_utils import build_ebook
 from zds.tutorialv2.models.database import ContentReaction, PublishedContent, PublicationEvent
-from zds.tutorialv2.publish_container import publish_use_manifest
+from zds.tutorialv2.publication_generations import (
+    collect_generations,
+    create_generation,
+    remove_published_files,
+    switch_to_generation,
+)
+from zds.tutorialv2.publish_container import link_or_copy, publish_use_manifest
 from zds.tutorialv2.signals import content_unpublished
 from zds.tutorialv2.utils import export_content
 from zds.utils.forums import send_post, lock_topic
@@ -27,6 +38,10 @@ from zds.utils.templatetags.emarkdown import render_markdown, MD_PARSING_ERROR
 from zds.utils.templatetags.smileys_def import SMILEYS_BASE_PATH, LICENSES_BASE_PATH
 
 logger = logging.getLogger(__name__)
+WATCHDOG_WAKE_FILENAME = "wake"
+# files written by a LaTeX pass to be read by the next one: references, table of contents, bookmarks and glossary
+LATEX_AUXILIARY_EXTENSIONS = (".aux", ".toc", ".out", ".glo", ".gls")
+MAX_LATEX_PASSES = 5
 licences = {
     "by-nc-nd": "by-nc-nd.svg",
     "by-nc-sa": "by-nc-sa.svg",
@@ -69,16 +84,29 @@ def publish_content(db_object, versioned, is_major_update=True):
     if is_major_update:
         versioned.pubdate = datetime.now()
 
-    # First write the files to a temporary directory: if anything goes wrong,
+    # First write the files to a new generation: if anything goes wrong,
     # the last published version is not impacted !
+    prod_path = path.join(settings.ZDS_APP["content"]["repo_public_path"], versioned.slug)
+    generation = create_generation(prod_path)
+    # extra contents are built aside, then copied to the public directory
     tmp_path = path.join(settings.ZDS_APP["content"]["repo_public_path"], versioned.slug + "__building")
     if path.exists(tmp_path):
         shutil.rmtree(tmp_path)  # remove previous attempt, if any
 
-    # render HTML:
+    # render HTML, reusing the files of the current publication when possible:
+    previous_dir = None
+    if settings.ZDS_APP["content"]["incremental_publication"] and db_object.public_version:
+        previous_dir = db_object.public_version.get_prod_path()
+        if not path.isdir(previous_dir):
+            previous_dir = None
     altered_version = copy.deepcopy(versioned)
-    char_count = publish_use_manifest(db_object, tmp_path, altered_version)
-    altered_version.dump_json(path.join(tmp_path, "manifest.json"))
+    try:
+        char_count = publish_use_manifest(db_object, str(generation), altered_version, previous_dir)
+        altered_version.dump_json(path.join(generation, "manifest.json"))
+        makedirs(path.join(generation, settings.ZDS_APP["content"]["extra_contents_dirname"]), exist_ok=True)
+    except Exception:
+        shutil.rmtree(generation, ignore_errors=True)  # an incomplete generation must not be rolled back to
+        raise
 
     # make room for 'extra contents'
     build_extra_contents_path = path.join(tmp_path, settings.ZDS_APP["content"]["extra_contents_dirname"])
@@ -108,8 +136,6 @@ def publish_content(db_object, versioned, is_major_update=True):
     public_version.must_reindex = True
     public_version.char_count = char_count
     public_version.save()
-    with contextlib.suppress(FileExistsError):
-        makedirs(public_version.get_extra_contents_directory())
     if is_major_update or not is_update:
         public_version.publication_date = datetime.now()
     elif is_update:
@@ -121,9 +147,9 @@ def publish_content(db_object, versioned, is_major_update=True):
     for author in db_object.authors.all():
         public_version.authors.add(author)
 
-    # this puts the manifest.json and base json file on the prod path.
-    shutil.rmtree(public_version.get_prod_path(), ignore_errors=True)
-    shutil.copytree(tmp_path, public_version.get_prod_path())
+    # this puts the manifest.json and base json file on the prod path, in a single rename.
+    switch_to_generation(public_version.get_prod_path(), generation)
+    collect_generations(public_version.get_prod_path())
     db_object.sha_public = versioned.current_version
     public_version.save()
     if settings.ZDS_APP["content"]["extra_content_generation_policy"] == "SYNC":
@@ -137,13 +163,13 @@ def publish_content(db_object, versioned, is_major_update=True):
 
 def update_existing_publication(db_object, versioned):
     public_version = db_object.public_version
-    # the content has been published in the past, so clean up old files!
-    old_path = public_version.get_prod_path()
-    logging.getLogger(__name__).debug("erase " + old_path)
-    shutil.rmtree(old_path)
     # if the slug has changed, create a new object instead of reusing the old one
     # this allows us to handle permanent redirection so that SEO is not impacted.
     if versioned.slug != public_version.content_public_slug:
+        # the old files are not reachable anymore, so clean them up! Otherwise, they are replaced by the new generation.
+        old_path = public_version.get_prod_path()
+        logging.getLogger(__name__).debug("erase " + old_path)
+        remove_published_files(old_path)
         public_version.must_redirect = True  # set redirection
         public_version.save(update_fields=["must_redirect"])
         publication_date = public_version.publication_date
@@ -175,29 +201,75 @@ def generate_external_content(
     """
     generate all static file that allow offline access to content
 
+    The markdown file is generated first, as the other formats are built from it. The other formats do not depend
+    on each other: if ``extra_content_generation_workers`` is greater than 1, they are generated concurrently in a
+    pool of processes.
+
     :param base_name: base nae of file (without extension)
     :param extra_contents_path: internal directory where all files will be pushed
     :param md_file_path: bundled markdown file path
     :param overload_settings: this option force the function to generate all registered formats even when settings \
     ask for PDF not to be published
     :param excluded: list of excluded format, None if no exclusion
+    :return: for each format, whether it was generated, how long it took (in seconds) and the error if any
+    :rtype: dict
     """
     excluded = excluded or ["watchdog"]
     if not settings.ZDS_APP["content"]["build_pdf_when_published"] and not overload_settings:
         excluded.append("pdf")
-    for publicator_name, publicator in PublicatorRegistry.get_all_registered(excluded):
-        try:
-            publicator.publish(
-                md_file_path,
-                base_name,
-                change_dir=extra_contents_path,
-                cur_language=translation.get_language(),
-                **kwargs,
-            )
-        except (FailureDuringPublication, OSError):
-            logging.getLogger(__name__).exception(
-                "Could not publish %s format from %s base.", publicator_name, md_file_path
-            )
+    publicator_names = [name for name, publicator in PublicatorRegistry.get_all_registered(excluded)]
+    kwargs.update(change_dir=extra_contents_path, cur_language=translation.get_language())
+
+    report = {}
+    if "md" in publicator_names:
+        publicator_names.remove("md")
+        report["md"] = _run_publicator("md", md_file_path, base_name, kwargs)
+    # the versioned content is only used to build the markdown file, and cannot be sent to another process
+    kwargs.pop("versioned", None)
+
+    workers = settings.ZDS_APP["content"]["extra_content_generation_workers"]
+    if workers > 1 and len(publicator_names) > 1:
+        # the forked processes must not share the connections to the database of this one
+        connections.close_all()
+        with ProcessPoolExecutor(
+            max_workers=min(workers, len(publicator_names)), mp_context=multiprocessing.get_context("fork")
+        ) as executor:
+            futures = {
+                publicator_name: executor.submit(_run_publicator, publicator_name, md_file_path, base_name, kwargs)
+                for publicator_name in publicator_names
+            }
+            for publicator_name, future in futures.items():
+                report[publicator_name] = future.result()
+    else:
+        for publicator_name in publicator_names:
+            report[publicator_name] = _run_publicator(publicator_name, md_file_path, base_name, kwargs)
+
+    for publicator_name, result in report.items():
+        logger.info(
+            "%s format from %s base: %s in %.2fs.",
+            publicator_name,
+            md_file_path,
+            "generated" if result["success"] else "failed",
+            result["duration"],
+        )
+    return report
+
+
+def _run_publicator(publicator_name, md_file_path, base_name, kwargs):
+    start = time.monotonic()
+    error = None
+    try:
+        PublicatorRegistry.get(publicator_name).publish(md_file_path, base_name, **kwargs)
+    except (FailureDuringPublication, OSError) as e:
+        logging.getLogger(__name__).exception(
+            "Could not publish %s format from %s base.", publicator_name, md_file_path
+        )
+        error = str(e)
+    finally:
+        # in a worker process, the connection would otherwise stay open until the pool is shut down
+        if multiprocessing.parent_process() is not None:
+            connections.close_all()
+    return {"success": error is None, "duration": time.monotonic() - start, "error": error}
 
 
 class PublicatorRegistry:
@@ -388,7 +460,7 @@ class ZMarkdownRebberLatexPublicator(Publicator):
         if (settings.MEDIA_ROOT / "galleries" / str(gallery_pk)).exists():
             for image in (settings.MEDIA_ROOT / "galleries" / str(gallery_pk)).iterdir():
                 with contextlib.suppress(OSError):
-                    shutil.copy2(str(image.absolute()), str(image_dir))
+                    link_or_copy(image.absolute(), image_dir / image.name)
         content_type = depth_to_size_map[public_versionned_source.get_tree_level()]
         if self.latex_classes:
             content_type += ", " + self.latex_classes
@@ -453,13 +525,110 @@ class ZMarkdownRebberLatexPublicator(Publicator):
             latex_file.write(content)
         shutil.copy2(latex_file_path, published_content_entity.get_extra_contents_directory())
 
-        self.full_tex_compiler_call(latex_file_path, draftmode="-draftmode")
-        self.full_tex_compiler_call(latex_file_path, draftmode="-draftmode")
-        self.make_glossary(base_name.split("/")[-1], latex_file_path)
-        self.full_tex_compiler_call(latex_file_path)
+        build_key = self.get_build_key(latex_file_path, image_dir)
+        # the PDF of a previous build must not be taken for the result of this one
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(pdf_file_path)
+        if not self.get_cached_build(build_key, pdf_file_path):
+            self.compile(base_name.split("/")[-1], latex_file_path)
+            self.cache_build(build_key, pdf_file_path)
 
         shutil.copy2(pdf_file_path, published_content_entity.get_extra_contents_directory())
 
+    def get_build_key(self, latex_file_path, image_dir):
+        """
+        Compute the key of a build: the PDF only depends on the LaTeX file, the images it includes and the
+        document class.
+
+        :param latex_file_path: the LaTeX file to compile
+        :param image_dir: the directory containing the images of the content
+        :return: the key of the build in the cache
+        :rtype: str
+        """
+        build_hash = hashlib.sha256(self.extension.encode("utf-8"))
+        dependencies = [Path(latex_file_path), Path(path.dirname(latex_file_path), "zmdocument.cls")]
+        if Path(image_dir).is_dir():
+            dependencies += sorted(image for image in Path(image_dir).iterdir() if image.is_file())
+        for dependency in dependencies:
+            with contextlib.suppress(OSError):
+                build_hash.update(dependency.name.encode("utf-8"))
+                build_hash.update(dependency.read_bytes())
+        return build_hash.hexdigest()
+
+    def get_cached_build(self, build_key, pdf_file_path):
+        """
+        Put the PDF built from the same sources in the past at ``pdf_file_path``, if any.
+
+        :return: ``True`` if the PDF was found in the cache
+        :rtype: bool
+        """
+        cache_dir = settings.ZDS_APP["content"]["latex_build_cache_dir"]
+        if not cache_dir:
+            return False
+        cached_pdf = Path(cache_dir, build_key + self.extension)
+        try:
+            # copied, not linked: the build directory is kept and LaTeX rewrites its PDF in place
+            shutil.copyfile(cached_pdf, pdf_file_path)
+            cached_pdf.touch()  # most recently used
+        except OSError:
+            return False
+        logger.info("%s taken from the LaTeX build cache", pdf_file_path)
+        return True
+
+    def cache_build(self, build_key, pdf_file_path):
+        """
+        Keep the PDF built from the sources identified by ``build_key``, removing the least recently used ones
+        when there are more than ``latex_build_cache_max_entries`` PDF in the cache.
+        """
+        cache_dir = settings.ZDS_APP["content"]["latex_build_cache_dir"]
+        if not cache_dir:
+            return
+        try:
+            Path(cache_dir).mkdir(parents=True, exist_ok=True)
+            # copied under another name first, so that a partially written PDF is never taken from the cache
+            partial_pdf = Path(cache_dir, build_key + ".part")
+            shutil.copyfile(pdf_file_path, partial_pdf)
+            os.replace(partial_pdf, Path(cache_dir, build_key + self.extension))
+            cached_builds = sorted(
+                Path(cache_dir).glob("*" + self.extension), key=lambda cached: cached.stat().st_mtime
+            )
+            for cached in cached_builds[: -settings.ZDS_APP["content"]["latex_build_cache_max_entries"]]:
+                cached.unlink()
+        except OSError:
+            logger.exception("Could not update the LaTeX build cache with %s", pdf_file_path)
+
+    def compile(self, basename, latex_file_path):
+        """
+        Compile the LaTeX file as many times as needed: the first pass (in draft mode) collects the references, the
+        table of contents and the glossary entries, and the other passes are run until these files do not change
+        anymore, up to ``MAX_LATEX_PASSES`` passes. The glossary is only made when there are entries, and made
+        again if they changed.
+        """
+        self.full_tex_compiler_call(latex_file_path, draftmode="-draftmode")
+        glossary_state = None
+        for _pass in range(MAX_LATEX_PASSES - 1):
+            glossary_entries = Path(path.splitext(latex_file_path)[0] + ".glo")
+            if glossary_entries.exists() and glossary_entries.stat().st_size > 0:
+                if glossary_entries.read_bytes() != glossary_state:
+                    glossary_state = glossary_entries.read_bytes()
+                    self.make_glossary(basename, latex_file_path)
+            state_before = self.get_auxiliary_state(latex_file_path)
+            self.full_tex_compiler_call(latex_file_path)
+            if self.get_auxiliary_state(latex_file_path) == state_before:
+                break
+
+    @staticmethod
+    def get_auxiliary_state(latex_file_path):
+        """
+        :return: the content of the files written by a LaTeX pass to be read by the next one
+        :rtype: dict
+        """
+        state = {}
+        for extension in LATEX_AUXILIARY_EXTENSIONS:
+            with contextlib.suppress(OSError):
+                state[extension] = Path(path.splitext(latex_file_path)[0] + extension).read_bytes()
+        return state
+
     def full_tex_compiler_call(self, latex_file, draftmode: str = ""):
         success_flag = self.tex_compiler(latex_file, draftmode)
         if not success_flag:
@@ -569,6 +738,29 @@ class WatchdogFilePublicator(Publicator):
                 published_object=published_content,
                 format_requested=requested_format[0],
             )
+        # the events must be visible to the watchdog when it wakes up
+        transaction.on_commit(notify_watchdog)
+
+
+def get_watchdog_wake_file():
+    """
+    :return: the file touched to wake up the publication watchdogs
+    :rtype: pathlib.Path
+    """
+    return Path(settings.ZDS_APP["content"]["extra_content_watchdog_dir"], WATCHDOG_WAKE_FILENAME)
+
+
+def notify_watchdog():
+    """
+    Wake up the publication watchdogs waiting for new events. If they cannot see the wake file (e.g. they run on
+    another host), they still find the events when they poll the database.
+    """
+    wake_file = get_watchdog_wake_file()
+    try:
+        wake_file.parent.mkdir(parents=True, exist_ok=True)
+        wake_file.touch()
+    except OSError:
+        logger.warning("Could not wake up the publication watchdog with %s", wake_file)
 
 
 class FailureDuringPublication(Exception):
@@ -643,8 +835,7 @@ def unpublish_content(db_object, moderator=None):
         # clean files
         old_path = public_version.get_prod_path()
         public_version.content.update(public_version=None, sha_public=None)
-        if path.exists(old_path):
-            shutil.rmtree(old_path)
+        remove_published_files(old_path)
         return True
 
     return False
@@ -1,29 +1,222 @@
+import asyncio
 import collections
 import contextlib
+import functools
+import hashlib
+import json
+import logging
+import os
+import shutil
+from concurrent.futures import ThreadPoolExecutor
 from os import path, makedirs
 from pathlib import Path
 import copy
 
 import requests
-from django.template.loader import render_to_string
+from django.conf import settings
+from django.template.loader import get_template, render_to_string
 from django.utils.translation import gettext_lazy as _
 
 from zds.tutorialv2.models.database import PublishableContent
 from zds.tutorialv2.models.versioned import Container, VersionedContent
 from zds.tutorialv2.utils import export_content
-from zds.utils.templatetags.emarkdown import emarkdown, render_markdown
+from zds.utils.templatetags.emarkdown import emarkdown, get_zmd_version, render_markdown
 
+logger = logging.getLogger(__name__)
 
-def publish_use_manifest(db_object, base_dir, versionable_content: VersionedContent):
+
+# written next to the published files, to know what has to be rendered again at the next publication
+RENDER_REPORT_FILENAME = "render_report.json"
+
+
+def publish_use_manifest(db_object, base_dir, versionable_content: VersionedContent, previous_dir=None):
+    """
+    Render a content and write its HTML files in ``base_dir``.
+
+    :param previous_dir: directory of the previous publication of the content. If set, only the files whose \
+        markdown has changed since this publication are rendered, the other ones are linked from there.
+    :return: the number of signs of the content
+    :rtype: int
+    """
     base_content = export_content(versionable_content, with_text=True)
+    if previous_dir is not None:
+        return publish_incrementally(db_object, base_dir, versionable_content, base_content, previous_dir)
 
-    md, metadata, __ = render_markdown(
-        base_content, disable_jsfiddle=not db_object.js_support, full_json=True, stats=True
-    )
+    max_concurrency = settings.ZDS_APP["content"]["publication_render_concurrency"]
+    if max_concurrency > 1:
+        md, metadata = render_manifest_concurrently(
+            base_content, max_concurrency, disable_jsfiddle=not db_object.js_support, stats=True
+        )
+    else:
+        md, metadata, __ = render_markdown(
+            base_content, disable_jsfiddle=not db_object.js_support, full_json=True, stats=True
+        )
     publish_container_new(db_object, base_dir, versionable_content, md)
     return metadata.get("stats", {}).get("signs", 0)
 
 
+def _manifest_texts(node):
+    """
+    Yields ``(node, key)`` for each markdown text of an exported manifest (introductions, conclusions
+    and extracts), in document order.
+    """
+    for key in ("introduction", "text", "conclusion"):
+        if node.get(key):
+            yield node, key
+    for child in node.get("children", []):
+        yield from _manifest_texts(child)
+
+
+async def _render_texts(texts, max_concurrency, **opts):
+    loop = asyncio.get_running_loop()
+    semaphore = asyncio.Semaphore(max_concurrency)
+    with ThreadPoolExecutor(max_workers=max_concurrency) as executor:
+
+        async def render(text):
+            async with semaphore:
+                return await loop.run_in_executor(executor, functools.partial(render_markdown, text, **opts))
+
+        return await asyncio.gather(*(render(text) for text in texts))
+
+
+def _render_manifest_texts(manifest, max_concurrency, **opts):
+    """
+    Replace, in place, each text of ``manifest`` by its HTML.
+
+    :return: the number of signs of each text, keyed by ``(id(node), key)``
+    :rtype: dict
+    """
+    slots = list(_manifest_texts(manifest))
+    results = asyncio.run(_render_texts([node[key] for node, key in slots], max_concurrency, **opts))
+    signs = {}
+    for (node, key), (content, metadata, __) in zip(slots, results):
+        node[key] = str(content)
+        signs[id(node), key] = metadata.get("stats", {}).get("signs", 0)
+    return signs
+
+
+def render_manifest_concurrently(manifest, max_concurrency, **opts):
+    """
+    Render an exported manifest (see ``export_content``) with one request per text instead of a
+    single ``full_json`` request, at most ``max_concurrency`` of them being sent at the same time.
+    The publication then takes as long as its longest text rather than as the whole content.
+
+    :param manifest: the manifest, with texts
+    :type manifest: dict
+    :param max_concurrency: maximum number of renders in progress
+    :type max_concurrency: int
+    :param opts: options of the renders, see ``render_markdown``
+    :return: a copy of the manifest where texts are replaced by their HTML, as with ``full_json``, and the \
+        metadata of the whole content (only the signs count)
+    :rtype: tuple
+    """
+    rendered = copy.deepcopy(manifest)
+    signs = _render_manifest_texts(rendered, max_concurrency, **opts)
+    return rendered, {"stats": {"signs": sum(signs.values())}}
+
+
+def get_renderer_version(template, render_opts):
+    """
+    :return: what the HTML depends on besides the markdown: the version of zmarkdown, the modification time
+        of ``template`` (which lays out the chapters) and the options of the renders
+    :rtype: list
+    """
+    return [get_zmd_version(), path.getmtime(get_template(template).origin.name), render_opts]
+
+
+def _publication_units(container, node, renderer):
+    """
+    Yields ``(relative_path, hash, slots)`` for each HTML file written by ``publish_container_new``: one per
+    container with extracts, an introduction and a conclusion for the other ones. ``slots`` are the
+    ``(node, key)`` of the texts the file is made of, and ``hash`` changes whenever its HTML would, given
+    ``renderer`` (see ``get_renderer_version``).
+    """
+    if container.has_extracts():
+        digest = hashlib.sha256(json.dumps([renderer, node], sort_keys=True).encode("utf-8")).hexdigest()
+        yield container.get_prod_path(relative=True), digest, list(_manifest_texts(node))
+        return
+    for key in ("introduction", "conclusion"):
+        if getattr(container, key) and node.get(key):
+            digest = hashlib.sha256(json.dumps([renderer, node[key]], sort_keys=True).encode("utf-8")).hexdigest()
+            yield str(Path(container.get_prod_path(relative=True), key + ".html")), digest, [(node, key)]
+    for child, child_node in zip(container.children, node["children"]):
+        if child.ready_to_publish:
+            yield from _publication_units(child, child_node, renderer)
+
+
+def read_render_report(directory):
+    """
+    :return: the render report of the publication in ``directory``, or an empty one if there is none.
+    :rtype: dict
+    """
+    try:
+        with open(path.join(directory, RENDER_REPORT_FILENAME), encoding="utf-8") as report_file:
+            return json.load(report_file)
+    except (OSError, ValueError):
+        return {"files": {}, "rendered": [], "reused": []}
+
+
+def link_or_copy(source, destination):
+    """
+    Hard link ``source`` to ``destination``, replacing it, or copy it if it cannot be linked.
+    The destination must not be modified in place, as the source would be modified too.
+    """
+    destination = Path(destination)
+    with contextlib.suppress(FileNotFoundError):
+        destination.unlink()
+    try:
+        os.link(source, destination)
+    except OSError:  # e.g. another filesystem
+        shutil.copy2(source, destination)
+
+
+def publish_incrementally(db_object, base_dir, versionable_content, base_content, previous_dir):
+    """
+    Publish a content, rendering only the HTML files whose markdown has changed since the publication in
+    ``previous_dir``. The other files are hard linked from there. The list of rendered and reused files is
+    logged and written in ``RENDER_REPORT_FILENAME``, along with the hash of each file.
+
+    :return: the number of signs of the content
+    :rtype: int
+    """
+    previous_files = read_render_report(previous_dir)["files"]
+    report = {"files": {}, "rendered": [], "reused": []}
+    render_opts = {"disable_jsfiddle": not db_object.js_support, "stats": True}
+    renderer = get_renderer_version("tutorialv2/export/chapter.html", render_opts)
+    units = list(_publication_units(versionable_content, base_content, renderer))
+    for relative_path, digest, slots in units:
+        previous = previous_files.get(relative_path)
+        if previous and previous["hash"] == digest and path.isfile(path.join(previous_dir, relative_path)):
+            report["files"][relative_path] = previous
+            report["reused"].append(relative_path)
+            for node, key in slots:  # nothing to render
+                node[key] = ""
+
+    max_concurrency = max(settings.ZDS_APP["content"]["publication_render_concurrency"], 1)
+    signs = _render_manifest_texts(base_content, max_concurrency, **render_opts)
+    for relative_path, digest, slots in units:
+        if relative_path not in report["files"]:
+            report["files"][relative_path] = {
+                "hash": digest,
+                "signs": sum(signs.get((id(node), key), 0) for node, key in slots),
+            }
+            report["rendered"].append(relative_path)
+
+    publish_container_new(db_object, base_dir, versionable_content, base_content)
+    for relative_path in report["reused"]:
+        link_or_copy(Path(previous_dir, relative_path), Path(base_dir, relative_path))
+
+    with open(path.join(base_dir, RENDER_REPORT_FILENAME), "w", encoding="utf-8") as report_file:
+        json.dump(report, report_file, indent=2)
+    logger.info(
+        "Publication of %s: %d file(s) rendered, %d file(s) reused",
+        versionable_content.slug,
+        len(report["rendered"]),
+        len(report["reused"]),
+    )
+    return sum(unit["signs"] for unit in report["files"].values())
+
+
 def publish_container_new(
     db_object,
     base_dir,
@@ -1,15 +1,17 @@
 import datetime
 import logging
 
-from django.db.models.signals import post_delete
+from django.db.models.signals import post_delete, post_save, m2m_changed
 from django.dispatch.dispatcher import receiver
 from django.utils.translation import gettext_lazy as _
 
-from zds.tutorialv2.models.database import PublishableContent, ContentReaction
+from zds.tutorialv2.models.database import PublishableContent, ContentReaction, PublishedContent
 from zds.tutorialv2.signals import content_unpublished
 from zds.gallery.models import Gallery
 from zds.utils import get_current_user
-from zds.utils.models import Alert
+from zds.utils.header_notifications import invalidate_header_alerts
+from zds.utils.models import Alert, Category, CategorySubCategory, SubCategory
+from zds.utils.templatetags.topbar import invalidate_topbar
 
 
 @receiver(content_unpublished, sender=PublishableContent)
@@ -37,6 +39,7 @@ def cleanup_validation_alerts(sender, instance, *, moderator=None, **__):
             solved_date=datetime.datetime.now(),
             solved=True,
         )
+        invalidate_header_alerts()
 
 
 @receiver(post_delete, sender=Gallery)
@@ -66,3 +69,14 @@ def log_content_deletion(sender, instance, **__):
                 "username": current_user.username,
             },
         )
+
+
+@receiver([post_save, post_delete], sender=PublishedContent)
+@receiver(content_unpublished, sender=PublishableContent)
+@receiver(m2m_changed, sender=PublishableContent.tags.through)
+@receiver(m2m_changed, sender=PublishableContent.subcategory.through)
+@receiver([post_save, post_delete], sender=Category)
+@receiver([post_save, post_delete], sender=SubCategory)
+@receiver([post_save, post_delete], sender=CategorySubCategory)
+def invalidate_publication_topbar(sender, **__):
+    invalidate_topbar()
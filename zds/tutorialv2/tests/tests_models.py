@@ -1,4 +1,5 @@
 import unittest
+from unittest.mock import patch
 
 from django.urls import reverse
 from datetime import datetime, timedelta
@@ -17,7 +18,8 @@ from zds.tutorialv2.tests.factories import (
     PublishedContentFactory,
 )
 from zds.gallery.tests.factories import UserGalleryFactory
-from zds.tutorialv2.models.database import PublishableContent, PublishedContent
+from zds.searchv2.models import AbstractESIndexable
+from zds.tutorialv2.models.database import FakeChapter, PublishableContent, PublishedContent
 from zds.tutorialv2.publication_utils import publish_content
 from zds.tutorialv2.tests import TutorialTestMixin, override_for_contents
 from zds.utils.tests.factories import SubCategoryFactory, LicenceFactory
@@ -569,3 +571,44 @@ class ContentTests(TutorialTestMixin, TestCase):
         content.save()
         content.ensure_author_gallery()
         self.assertEqual(UserGallery.objects.filter(gallery__pk=content.gallery.pk).count(), content.authors.count())
+
+
+@override_for_contents()
+class PublishedContentIndexingTests(TutorialTestMixin, TestCase):
+    def setUp(self):
+        self.tuto = PublishableContentFactory(type="TUTORIAL")
+        tuto_draft = self.tuto.load_version()
+        part = ContainerFactory(parent=tuto_draft, db_object=self.tuto)
+        for _ in range(3):
+            chapter = ContainerFactory(parent=part, db_object=self.tuto)
+            ExtractFactory(container=chapter, db_object=self.tuto)
+
+        def fake_render(manifest, **opts):
+            return manifest, {}, []  # the texts are kept as they are
+
+        self.tuto = PublishableContent.objects.get(pk=self.tuto.pk)
+        tuto_draft = self.tuto.load_version()
+        with patch("zds.tutorialv2.publish_container.render_markdown", side_effect=fake_render):
+            published = publish_content(self.tuto, tuto_draft, is_major_update=True)
+        self.tuto.sha_public = tuto_draft.current_version
+        self.tuto.public_version = published
+        self.tuto.save()
+
+    def test_public_versions_are_loaded_once(self):
+        with patch.object(
+            PublishableContent, "load_manifest", autospec=True, side_effect=PublishableContent.load_manifest
+        ) as load_manifest:
+            items = [item for items in PublishedContent.get_es_indexable(force_reindexing=True) for item in items]
+            # only the fields computed from the public version are filled
+            with patch.object(AbstractESIndexable, "get_es_document_source", side_effect=lambda **kwargs: {}):
+                contents = [item.get_es_document_source() for item in items if isinstance(item, PublishedContent)]
+        self.assertEqual(1, load_manifest.call_count)
+
+        self.assertEqual(1, len(contents))
+        self.assertTrue(contents[0]["has_chapters"])
+        chapters = [item for item in items if isinstance(item, FakeChapter)]
+        self.assertEqual(3, len(chapters))
+        for chapter in chapters:
+            self.assertEqual(contents[0]["categories"], chapter.categories)
+            self.assertEqual(contents[0]["subcategories"], chapter.subcategories)
+            self.assertNotEqual([], chapter.subcategories)
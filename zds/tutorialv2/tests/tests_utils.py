@@ -1,10 +1,21 @@
+import io
 import os
 import shutil
+import threading
+import time
+import zipfile
 from pathlib import Path
 import datetime
+from copy import deepcopy
+from tempfile import TemporaryDirectory
+from unittest.mock import patch
+
+from git import Repo
+from git.objects.tree import Tree
 
 from django.conf import settings
-from django.test import TestCase
+from django.db import connection
+from django.test import TestCase, override_settings
 from django.urls import reverse
 
 from zds.member.tests.factories import ProfileFactory, StaffProfileFactory
@@ -16,7 +27,9 @@ from zds.tutorialv2.tests.factories import (
     ContentReactionFactory,
 )
 from zds.gallery.tests.factories import UserGalleryFactory
-from zds.tutorialv2.models.versioned import Container
+from zds.tutorialv2.models.versioned import Container, VersionedContent
+from zds.tutorialv2.views.archives import ARCHIVE_CHUNK_SIZE, DownloadContent
+from zds.tutorialv2.version_cache import make_version_key, reset_version_cache
 from zds.tutorialv2.utils import (
     get_target_tagged_tree_for_container,
     get_target_tagged_tree_for_extract,
@@ -27,11 +40,34 @@ from zds.tutorialv2.utils import (
     get_commit_author,
     slugify_raise_on_invalid,
     check_slug,
+    GitTreeIndex,
+    get_blob,
+)
+from zds.tutorialv2.publication_generations import (
+    LEGACY_GENERATION,
+    get_current_generation,
+    list_generations,
+    rollback_publication,
 )
 from zds.tutorialv2.publication_utils import publish_content, unpublish_content
-from zds.tutorialv2.models.database import PublishableContent, PublishedContent, ContentReaction, ContentRead
+from zds.tutorialv2.publish_container import publish_use_manifest, read_render_report, render_manifest_concurrently
+from zds.tutorialv2.models.database import (
+    PublishableContent,
+    PublishedContent,
+    ContentReaction,
+    ContentRead,
+    PublicationEvent,
+)
 from django.core.management import call_command
-from zds.tutorialv2.publication_utils import Publicator, PublicatorRegistry, ZMarkdownRebberLatexPublicator
+from zds.tutorialv2.publication_utils import (
+    FailureDuringPublication,
+    Publicator,
+    PublicatorRegistry,
+    ZMarkdownRebberLatexPublicator,
+    generate_external_content,
+    get_watchdog_wake_file,
+)
+from zds.tutorialv2.management.commands.publication_watchdog import Command as WatchdogCommand
 from zds.tutorialv2.tests import TutorialTestMixin, override_for_contents
 from zds import json_handler
 from zds.utils.tests.factories import LicenceFactory
@@ -98,6 +134,17 @@ class UtilsTests(TutorialTestMixin, TestCase):
         self.assertTrue(paths[part2.get_path(True)], "can be moved after or before part2")
         self.assertFalse(paths[part3.get_path(True)], "can be moved after or before part3")
 
+    def test_files_of_a_version_share_the_tree_index(self):
+        extracts = [ExtractFactory(container=self.chapter1, db_object=self.tuto) for _ in range(3)]
+        versioned = self.tuto.load_version()
+        chapter = versioned.children[0].children[0]
+        with patch.object(versioned.repository, "commit", wraps=versioned.repository.commit) as commit:
+            texts = [extract.get_text() for extract in chapter.children]
+            chapter.get_introduction()
+            versioned.get_conclusion()
+        self.assertEqual([extract.get_text() for extract in extracts], texts)
+        self.assertEqual(1, commit.call_count)
+
     def test_publish_content_article(self):
         """test and ensure the behavior of ``publish_content()`` and ``unpublish_content()``"""
 
@@ -648,3 +695,618 @@ class UtilsTests(TutorialTestMixin, TestCase):
     def tearDown(self):
         super().tearDown()
         PublicatorRegistry.registry = self.old_registry
+
+
+class GitTreeIndexTests(TestCase):
+    def setUp(self):
+        # a synthetic tutorial: 10 parts of 10 chapters of 10 extracts
+        self.directory = TemporaryDirectory()
+        self.repository = Repo.init(self.directory.name)
+        self.paths = ["introduction.md", "conclusion.md"]
+        for part in range(10):
+            self.paths += [f"part-{part}/introduction.md", f"part-{part}/conclusion.md"]
+            for chapter in range(10):
+                self.paths += [f"part-{part}/chapter-{chapter}/extract-{extract}.md" for extract in range(10)]
+        for path in self.paths:
+            full_path = Path(self.directory.name, path)
+            full_path.parent.mkdir(parents=True, exist_ok=True)
+            full_path.write_text(f"Text of {path}")
+        self.repository.index.add(self.paths)
+        self.tree = self.repository.index.commit("Synthetic tutorial").tree
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_get_blob(self):
+        index = GitTreeIndex(self.tree)
+        self.assertEqual("Text of introduction.md", index.get_blob("introduction.md"))
+        self.assertEqual("Text of part-3/chapter-4/extract-5.md", index.get_blob("./part-3/chapter-4/extract-5.md"))
+        self.assertEqual("Text of part-3/conclusion.md", index.get_blob("part-3\\conclusion.md"))
+        self.assertIsNone(index.get_blob("part-3/chapter-4/extract-10.md"))
+        self.assertIsNone(index.get_blob("part-10/introduction.md"))
+        self.assertIsNone(index.get_blob("part-3/chapter-4"))
+
+    def test_directories_are_resolved_once(self):
+        index = GitTreeIndex(self.tree)
+        lookups = []
+
+        def truediv(tree, name):
+            lookups.append(name)
+            return tree.join(name)
+
+        with patch.object(Tree, "__truediv__", autospec=True, side_effect=truediv):
+            for path in self.paths:
+                self.assertEqual(f"Text of {path}", index.get_blob(path))
+        # one lookup per file and per directory, instead of a walk of the whole tree per file
+        self.assertEqual(len(self.paths) + 10 + 10 * 10, len(lookups))
+
+
+class StreamedArchiveTests(TestCase):
+    def setUp(self):
+        self.directory = TemporaryDirectory()
+        self.repository = Repo.init(self.directory.name)
+        self.files = {
+            "manifest.json": b"{}",
+            "part/introduction.md": b"Introduction",
+            "part/chapter/extract.md": b"Extract",
+            "images/big.png": os.urandom(3 * ARCHIVE_CHUNK_SIZE + 10),
+        }
+        for path, data in self.files.items():
+            full_path = Path(self.directory.name, path)
+            full_path.parent.mkdir(parents=True, exist_ok=True)
+            full_path.write_bytes(data)
+        self.repository.index.add(list(self.files))
+        self.tree = self.repository.index.commit("Content").tree
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_streamed_archive_is_the_written_archive(self):
+        chunks = list(DownloadContent.stream_zip(self.tree))
+        self.assertTrue(all(len(chunk) <= ARCHIVE_CHUNK_SIZE + 1024 for chunk in chunks))
+        streamed_archive = zipfile.ZipFile(io.BytesIO(b"".join(chunks)))
+        self.assertIsNone(streamed_archive.testzip())
+
+        written_archive_file = io.BytesIO()
+        with zipfile.ZipFile(written_archive_file, "w") as written_archive:
+            DownloadContent.insert_into_zip(written_archive, self.tree)
+        written_archive = zipfile.ZipFile(written_archive_file)
+
+        self.assertEqual(written_archive.namelist(), streamed_archive.namelist())
+        for path, data in self.files.items():
+            self.assertEqual(data, streamed_archive.read(path))
+
+
+@override_for_contents()
+class ArchiveCacheTests(TutorialTestMixin, TestCase):
+    def setUp(self):
+        self.cache_dir = TemporaryDirectory()
+        self.overridden_zds_app = deepcopy(settings.ZDS_APP)
+        self.overridden_zds_app["content"]["archive_cache_dir"] = self.cache_dir.name
+        self.author = ProfileFactory().user
+        self.tuto = PublishableContentFactory(type="TUTORIAL", author_list=[self.author])
+        self.client.force_login(self.author)
+
+    def tearDown(self):
+        self.cache_dir.cleanup()
+
+    def download(self, content):
+        with override_settings(ZDS_APP=self.overridden_zds_app):
+            response = self.client.get(reverse("content:download-zip", args=[content.pk, content.slug]))
+        self.assertEqual(200, response.status_code)
+        return response
+
+    def test_archives_are_built_once_per_version(self):
+        with patch.object(DownloadContent, "stream_zip", wraps=DownloadContent.stream_zip) as stream_zip:
+            archives = [b"".join(self.download(self.tuto).streaming_content) for _ in range(2)]
+        self.assertEqual(1, stream_zip.call_count)
+        self.assertEqual(archives[0], archives[1])
+        self.assertIn("manifest.json", zipfile.ZipFile(io.BytesIO(archives[0])).namelist())
+        self.assertEqual([f"{self.tuto.pk}-{self.tuto.sha_draft}.zip"], os.listdir(self.cache_dir.name))
+
+    def test_interrupted_downloads_are_not_cached(self):
+        response = self.download(self.tuto)
+        next(iter(response.streaming_content))
+        response.close()
+        self.assertEqual([], os.listdir(self.cache_dir.name))
+
+    def test_least_recently_used_archives_are_removed(self):
+        self.overridden_zds_app["content"]["archive_cache_max_entries"] = 1
+        other_tuto = PublishableContentFactory(type="TUTORIAL", author_list=[self.author])
+        for content in (self.tuto, other_tuto):
+            b"".join(self.download(content).streaming_content)
+        self.assertEqual([f"{other_tuto.pk}-{other_tuto.sha_draft}.zip"], os.listdir(self.cache_dir.name))
+
+
+@override_for_contents()
+class VersionCacheTests(TutorialTestMixin, TestCase):
+    def setUp(self):
+        reset_version_cache()
+        self.tuto = PublishableContentFactory(type="TUTORIAL")
+        self.part = ContainerFactory(parent=self.tuto.load_version(), db_object=self.tuto)
+        self.extract = ExtractFactory(container=self.part, db_object=self.tuto)
+        self.tuto = PublishableContent.objects.get(pk=self.tuto.pk)
+
+    def tearDown(self):
+        reset_version_cache()
+
+    def test_versions_are_read_from_git_once(self):
+        with patch("zds.tutorialv2.models.database.get_blob", wraps=get_blob) as read_manifest:
+            with patch.object(VersionedContent, "_read_blob", autospec=True, side_effect=VersionedContent._read_blob):
+                for _ in range(2):
+                    versioned = self.tuto.load_version()
+                    self.assertEqual(self.extract.get_text(), versioned.children[0].children[0].get_text())
+                self.assertEqual(1, read_manifest.call_count)
+                self.assertEqual(1, VersionedContent._read_blob.call_count)
+
+    def test_versions_not_given_by_sha_are_not_cached(self):
+        self.assertIsNone(make_version_key(self.tuto.pk, "HEAD", "manifest.json"))
+        self.assertIsNone(make_version_key(self.tuto.pk, self.tuto.sha_draft[:7], "manifest.json"))
+        self.assertIsNone(make_version_key(None, self.tuto.sha_draft, "manifest.json"))
+        self.assertIsNotNone(make_version_key(self.tuto.pk, self.tuto.sha_draft, "manifest.json"))
+
+
+class ConcurrentManifestRenderingTests(TestCase):
+    manifest = {
+        "object": "container",
+        "title": "Tuto",
+        "introduction": "intro",
+        "conclusion": "",
+        "children": [
+            {
+                "object": "container",
+                "title": "Chapter 1",
+                "introduction": "intro 1",
+                "conclusion": "ccl 1",
+                "children": [
+                    {"object": "extract", "title": "Extract 1", "text": "text 1.1"},
+                    {"object": "extract", "title": "Extract 2", "text": "text 1.2"},
+                ],
+            },
+            {
+                "object": "container",
+                "title": "Chapter 2",
+                "introduction": "intro 2",
+                "conclusion": "ccl 2",
+                "children": [{"object": "extract", "title": "Extract 1", "text": "text 2.1"}],
+            },
+        ],
+    }
+
+    def test_rendered_manifest(self):
+        def fake_render(text, **opts):
+            return f"<p>{text}</p>", {"stats": {"signs": len(text)}}, []
+
+        with patch("zds.tutorialv2.publish_container.render_markdown", side_effect=fake_render) as render:
+            rendered, metadata = render_manifest_concurrently(self.manifest, 3, disable_jsfiddle=True, stats=True)
+
+        self.assertEqual(render.call_count, 8)
+        self.assertEqual(render.call_args.kwargs, {"disable_jsfiddle": True, "stats": True})
+        self.assertEqual(rendered["introduction"], "<p>intro</p>")
+        self.assertEqual(rendered["conclusion"], "")
+        self.assertEqual(rendered["children"][0]["children"][1]["text"], "<p>text 1.2</p>")
+        self.assertEqual(rendered["children"][1]["conclusion"], "<p>ccl 2</p>")
+        self.assertEqual(self.manifest["children"][1]["conclusion"], "ccl 2")
+        texts = ["intro", "intro 1", "ccl 1", "text 1.1", "text 1.2", "intro 2", "ccl 2", "text 2.1"]
+        self.assertEqual(metadata, {"stats": {"signs": sum(len(text) for text in texts)}})
+
+    def test_concurrency_is_bounded(self):
+        lock = threading.Lock()
+        in_progress = []
+        maximum = []
+
+        def fake_render(text, **opts):
+            with lock:
+                in_progress.append(text)
+                maximum.append(len(in_progress))
+            time.sleep(0.02)
+            with lock:
+                in_progress.remove(text)
+            return text, {}, []
+
+        with patch("zds.tutorialv2.publish_container.render_markdown", side_effect=fake_render):
+            render_manifest_concurrently(self.manifest, 2)
+        self.assertEqual(max(maximum), 2)
+
+
+@override_for_contents()
+class IncrementalPublicationTests(TutorialTestMixin, TestCase):
+    def setUp(self):
+        self.tuto = PublishableContentFactory(type="TUTORIAL")
+        versioned = self.tuto.load_version()
+        self.part = ContainerFactory(parent=versioned, db_object=self.tuto)
+        self.chapter1 = ContainerFactory(parent=self.part, db_object=self.tuto)
+        ExtractFactory(container=self.chapter1, db_object=self.tuto)
+        self.chapter2 = ContainerFactory(parent=self.part, db_object=self.tuto)
+        ExtractFactory(container=self.chapter2, db_object=self.tuto)
+        self.public_path = Path(self.overridden_zds_app["content"]["repo_public_path"])
+
+    def publish(self, directory, previous_dir):
+        def fake_render(text, **opts):
+            return f"<p>{text}</p>", {"stats": {"signs": len(text)}}, []
+
+        with patch("zds.tutorialv2.publish_container.render_markdown", side_effect=fake_render) as render:
+            self.tuto.refresh_from_db()
+            signs = publish_use_manifest(self.tuto, str(directory), self.tuto.load_version(), str(previous_dir))
+        return signs, render.call_count
+
+    def test_only_changed_files_are_rendered(self):
+        first, second = self.public_path / "first", self.public_path / "second"
+        signs, render_count = self.publish(first, self.public_path / "nothing")
+        report = read_render_report(first)
+        # introduction and conclusion of the content and of the part, and two chapters
+        self.assertEqual(len(report["rendered"]), 6)
+        self.assertEqual(report["reused"], [])
+        self.assertEqual(signs, sum(item["signs"] for item in report["files"].values()))
+
+        chapter1 = self.tuto.load_version().children[0].children[0]
+        extract = chapter1.children[0]
+        extract.repo_update(extract.title, "A new text")
+        self.tuto.sha_draft = chapter1.top_container().current_version
+        self.tuto.save()
+
+        new_signs, render_count = self.publish(second, first)
+        report = read_render_report(second)
+        chapter1_path = chapter1.get_prod_path(relative=True)
+        self.assertEqual(report["rendered"], [chapter1_path])
+        self.assertEqual(len(report["reused"]), 5)
+        self.assertEqual(render_count, len(list(chapter1.children)) + 2)  # introduction, conclusion and extract
+        self.assertIn("A new text", (second / chapter1_path).read_text())
+        for relative_path in report["reused"]:
+            self.assertEqual((first / relative_path).stat().st_ino, (second / relative_path).stat().st_ino)
+        self.assertEqual(new_signs, sum(item["signs"] for item in report["files"].values()))
+
+    def test_files_are_rendered_again_with_another_renderer(self):
+        first, second = self.public_path / "first", self.public_path / "second"
+        self.publish(first, self.public_path / "nothing")
+        with patch("zds.tutorialv2.publish_container.get_zmd_version", return_value="0.0.0-upgraded"):
+            self.publish(second, first)
+        report = read_render_report(second)
+        self.assertEqual(len(report["rendered"]), 6)
+        self.assertEqual(report["reused"], [])
+
+
+@override_for_contents()
+class PublicationGenerationsTests(TutorialTestMixin, TestCase):
+    def setUp(self):
+        content_settings = {
+            "incremental_publication": True,
+            "publication_generations_kept": 2,
+            "extra_content_generation_policy": "NOTHING",
+        }
+        patcher = patch.dict(self.overridden_zds_app["content"], content_settings)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.tuto = PublishableContentFactory(type="ARTICLE")
+        ExtractFactory(container=self.tuto.load_version(), db_object=self.tuto)
+
+    def publish(self):
+        def fake_render(text, **opts):
+            if opts.get("full_json"):  # the first publication renders the whole manifest at once
+                return text, {"stats": {"signs": 0}}, []
+            return f"<p>{text}</p>", {"stats": {"signs": len(text)}}, []
+
+        with patch("zds.tutorialv2.publish_container.render_markdown", side_effect=fake_render):
+            self.tuto.refresh_from_db()
+            published = publish_content(self.tuto, self.tuto.load_version(), True)
+        self.tuto.public_version = published
+        self.tuto.save()
+        return published
+
+    def test_publication_switches_generations(self):
+        published = self.publish()
+        prod_path = Path(published.get_prod_path())
+        self.assertTrue(prod_path.is_symlink())
+        first = get_current_generation(prod_path)
+        self.assertEqual(list_generations(prod_path), [first])
+        self.assertTrue((prod_path / "manifest.json").is_file())
+        self.assertTrue((prod_path / settings.ZDS_APP["content"]["extra_contents_dirname"]).is_dir())
+
+        self.publish()
+        second = get_current_generation(prod_path)
+        self.assertNotEqual(first, second)
+        self.assertEqual(list_generations(prod_path), [first, second])
+
+        third = self.publish()
+        # only the two last generations are kept
+        self.assertEqual(list_generations(prod_path), [second, get_current_generation(prod_path)])
+
+        self.assertEqual(rollback_publication(prod_path), second)
+        self.assertEqual(get_current_generation(prod_path), second)
+        self.assertTrue((prod_path / "manifest.json").is_file())
+
+        unpublish_content(self.tuto)
+        self.assertFalse(os.path.lexists(third.get_prod_path()))
+        self.assertEqual(list_generations(prod_path), [])
+
+    def test_legacy_directory_is_replaced(self):
+        prod_path = Path(self.overridden_zds_app["content"]["repo_public_path"], self.tuto.slug)
+        prod_path.mkdir(parents=True)
+        (prod_path / "legacy.html").write_text("legacy")
+
+        self.publish()
+        self.assertTrue(prod_path.is_symlink())
+        self.assertFalse((prod_path / "legacy.html").exists())
+        self.assertEqual(rollback_publication(prod_path).name, LEGACY_GENERATION)
+        self.assertEqual((prod_path / "legacy.html").read_text(), "legacy")
+
+
+class FileWritingPublicator(Publicator):
+    """Write the id of the process and the markdown it was built from, or fail if ``fail`` is set."""
+
+    def __init__(self, extension, fail=False):
+        self.extension = extension
+        self.fail = fail
+
+    def publish(self, md_file_path, base_name, **kwargs):
+        if self.fail:
+            raise FailureDuringPublication("failed")
+        content = f"{os.getpid()}\n" + Path(md_file_path).read_text()
+        Path(base_name + self.extension).write_text(content)
+
+
+class ExtraContentGenerationTests(TestCase):
+    def setUp(self):
+        self.old_registry = dict(PublicatorRegistry.registry)
+        PublicatorRegistry.registry = {
+            "md": FileWritingPublicator(".md"),
+            "epub": FileWritingPublicator(".epub"),
+            "pdf": FileWritingPublicator(".pdf"),
+            "zip": FileWritingPublicator(".zip", fail=True),
+        }
+        temporary_directory = TemporaryDirectory()
+        self.addCleanup(temporary_directory.cleanup)
+        self.directory = Path(temporary_directory.name)
+        self.base_name = str(self.directory / "content")
+        Path(self.base_name + ".md").write_text("# Title")
+
+    def tearDown(self):
+        PublicatorRegistry.registry = self.old_registry
+
+    def generate(self, workers):
+        zds_app = deepcopy(settings.ZDS_APP)
+        zds_app["content"]["extra_content_generation_workers"] = workers
+        with override_settings(ZDS_APP=zds_app):
+            return generate_external_content(self.base_name, str(self.directory), self.base_name + ".md")
+
+    def test_serial_generation(self):
+        report = self.generate(workers=1)
+        self.assertEqual(set(report), {"md", "epub", "pdf", "zip"})
+        self.assertTrue(report["pdf"]["success"])
+        self.assertFalse(report["zip"]["success"])
+        self.assertEqual(report["zip"]["error"], "failed")
+        for result in report.values():
+            self.assertGreaterEqual(result["duration"], 0)
+        self.assertEqual(Path(self.base_name + ".pdf").read_text(), f"{os.getpid()}\n{os.getpid()}\n# Title")
+
+    def test_parallel_generation(self):
+        report = self.generate(workers=3)
+        self.assertTrue(report["md"]["success"])
+        self.assertTrue(report["epub"]["success"])
+        self.assertTrue(report["pdf"]["success"])
+        self.assertEqual(report["zip"]["error"], "failed")
+        # the markdown is generated first, by this process, the others are generated by the pool
+        self.assertEqual(Path(self.base_name + ".md").read_text(), f"{os.getpid()}\n# Title")
+        pdf_pid, md_pid, _ = Path(self.base_name + ".pdf").read_text().split("\n")
+        self.assertEqual(md_pid, str(os.getpid()))
+        self.assertNotEqual(pdf_pid, str(os.getpid()))
+
+    def test_excluded_formats(self):
+        zds_app = deepcopy(settings.ZDS_APP)
+        zds_app["content"]["build_pdf_when_published"] = False
+        with override_settings(ZDS_APP=zds_app):
+            report = generate_external_content(
+                self.base_name, str(self.directory), self.base_name + ".md", excluded=["zip"]
+            )
+        self.assertEqual(set(report), {"md", "epub"})
+
+
+@override_for_contents()
+class PublicationWatchdogTests(TutorialTestMixin, TestCase):
+    def setUp(self):
+        self.old_registry = dict(PublicatorRegistry.registry)
+        PublicatorRegistry.registry = {
+            "md": FileWritingPublicator(".md"),
+            "pdf": FileWritingPublicator(".pdf"),
+            "epub": FileWritingPublicator(".epub", fail=True),
+            "watchdog": self.old_registry["watchdog"],
+        }
+        temporary_directory = TemporaryDirectory()
+        self.addCleanup(temporary_directory.cleanup)
+        content_settings = {
+            "extra_content_watchdog_dir": Path(temporary_directory.name),
+            "extra_content_watchdog_workers": 1,
+        }
+        patcher = patch.dict(self.overridden_zds_app["content"], content_settings)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.published = [self.create_published_content() for _ in range(2)]
+
+    def tearDown(self):
+        PublicatorRegistry.registry = self.old_registry
+        super().tearDown()
+
+    def create_published_content(self):
+        content = PublishableContentFactory(type="ARTICLE")
+        published = PublishedContent.objects.create(
+            content=content,
+            content_pk=content.pk,
+            content_public_slug=content.slug,
+            content_type=content.type,
+            sha_public=content.sha_draft,
+        )
+        Path(published.get_prod_path()).mkdir(parents=True)
+        content.load_version().dump_json(str(Path(published.get_prod_path(), "manifest.json")))
+        return published
+
+    def building_base_name(self, published):
+        return Path(str(published.get_prod_path()) + "__building", "extra_contents", published.content_public_slug)
+
+    def test_request_wakes_up_watchdog(self):
+        wake_file = get_watchdog_wake_file()
+        self.assertIsNone(WatchdogCommand.get_wake_time())
+        with self.captureOnCommitCallbacks(execute=True):
+            PublicatorRegistry.get("watchdog").publish_from_published_content(self.published[0])
+            self.assertFalse(wake_file.exists())  # not before the events are committed
+        self.assertIsNotNone(WatchdogCommand.get_wake_time())
+        self.assertEqual(PublicationEvent.objects.filter(state_of_processing="REQUESTED").count(), 3)
+
+    def test_claim_events_of_oldest_contents(self):
+        for published in self.published:
+            PublicatorRegistry.get("watchdog").publish_from_published_content(published)
+        command = WatchdogCommand()
+
+        claimed = command.claim_events(max_contents=1)
+        self.assertEqual({event.published_object for event in claimed}, {self.published[0]})
+        self.assertEqual(len(claimed), 3)
+        self.assertEqual(PublicationEvent.objects.filter(state_of_processing="RUNNING").count(), 3)
+
+        claimed = command.claim_events(max_contents=1)
+        self.assertEqual({event.published_object for event in claimed}, {self.published[1]})
+        self.assertEqual(command.claim_events(max_contents=1), [])
+
+    def test_claim_events_without_skip_locked(self):
+        PublicatorRegistry.get("watchdog").publish_from_published_content(self.published[0])
+        # like MariaDB: the rows can be locked, but the locked ones cannot be skipped
+        with patch.multiple(connection.features, has_select_for_update=True, has_select_for_update_skip_locked=False):
+            claimed = WatchdogCommand().claim_events(max_contents=1)
+        self.assertEqual(len(claimed), 3)
+
+    def test_process_requested_events(self):
+        for published in self.published:
+            self.building_base_name(published).parent.mkdir(parents=True)
+            Path(str(self.building_base_name(published)) + ".md").write_text("# Title")
+            PublicatorRegistry.get("watchdog").publish_from_published_content(published)
+
+        call_command("publication_watchdog", "--once")
+
+        self.assertEqual(PublicationEvent.objects.filter(state_of_processing="SUCCESS").count(), 4)
+        self.assertEqual(
+            set(PublicationEvent.objects.filter(state_of_processing="FAILURE").values_list("format_requested")),
+            {("epub",)},
+        )
+        for published in self.published:
+            self.assertTrue(Path(str(self.building_base_name(published)) + ".pdf").exists())
+
+    def test_events_of_a_content_are_processed_in_turn(self):
+        for published in self.published:
+            PublicatorRegistry.get("watchdog").publish_from_published_content(published)
+        processed = []
+
+        def record(publication_event):
+            processed.append((publication_event.published_object_id, publication_event.format_requested))
+            time.sleep(0.05)
+            processed.append((publication_event.published_object_id, None))  # done
+
+        self.overridden_zds_app["content"]["extra_content_watchdog_workers"] = 2
+        with patch.object(WatchdogCommand, "process_event", side_effect=record):
+            WatchdogCommand().run()
+
+        for published in self.published:
+            steps = [event_format for content_pk, event_format in processed if content_pk == published.pk]
+            # one format at a time, the markdown file first
+            self.assertEqual(6, len(steps))
+            self.assertEqual("md", steps[0])
+            self.assertEqual([None] * 3, steps[1::2])
+
+    def test_expired_leases_are_claimed_again(self):
+        PublicatorRegistry.get("watchdog").publish_from_published_content(self.published[0])
+        first, second = WatchdogCommand(), WatchdogCommand()
+        self.assertNotEqual(first.worker_id, second.worker_id)
+
+        claimed = first.claim_events(max_contents=1)
+        self.assertEqual({event.worker for event in PublicationEvent.objects.all()}, {first.worker_id})
+        self.assertEqual(second.claim_events(max_contents=1), [])  # the lease of the first watchdog is still valid
+        self.assertEqual(first.renew_leases(), 3)
+
+        # the first watchdog stopped
+        PublicationEvent.objects.update(lease_expiration=datetime.datetime.now() - datetime.timedelta(seconds=1))
+        reclaimed = second.claim_events(max_contents=1)
+        self.assertEqual({event.pk for event in reclaimed}, {event.pk for event in claimed})
+        self.assertEqual({event.attempts for event in reclaimed}, {2})
+        self.assertEqual(first.renew_leases(), 0)
+
+        # the first watchdog cannot overwrite the state of the events it lost
+        first.finish_event(claimed[0], "FAILURE")
+        second.finish_event(reclaimed[0], "SUCCESS")
+        self.assertEqual(PublicationEvent.objects.get(pk=claimed[0].pk).state_of_processing, "SUCCESS")
+
+    def test_events_failing_too_often_are_abandoned(self):
+        PublicatorRegistry.get("watchdog").publish_from_published_content(self.published[0])
+        PublicationEvent.objects.update(state_of_processing="RUNNING", attempts=3, lease_expiration=None)
+
+        self.assertEqual(WatchdogCommand().claim_events(max_contents=1), [])
+        self.assertEqual(PublicationEvent.objects.filter(state_of_processing="FAILURE").count(), 3)
+
+
+class LatexBuildTests(TestCase):
+    def setUp(self):
+        temporary_directory = TemporaryDirectory()
+        self.addCleanup(temporary_directory.cleanup)
+        self.directory = Path(temporary_directory.name)
+        self.latex_file = self.directory / "content.tex"
+        self.latex_file.write_text(r"\begin{document}\end{document}")
+        self.publicator = ZMarkdownRebberLatexPublicator(".pdf")
+
+    def fake_compiler(self, auxiliary_files):
+        """Simulate LaTeX passes, the n-th pass writing the n-th auxiliary files."""
+        passes = iter(auxiliary_files)
+
+        def tex_compiler(texfile, draftmode=""):
+            for extension, content in next(passes).items():
+                self.latex_file.with_suffix(extension).write_text(content)
+            self.latex_file.with_suffix(".pdf").write_text("pdf")
+            return True
+
+        return tex_compiler
+
+    def test_passes_stop_when_auxiliary_files_are_stable(self):
+        auxiliary_files = [{".aux": "1", ".toc": "a"}, {".aux": "2", ".toc": "a"}, {".aux": "2", ".toc": "a"}]
+        with patch.object(self.publicator, "tex_compiler", side_effect=self.fake_compiler(auxiliary_files)) as tex:
+            with patch.object(self.publicator, "make_glossary") as make_glossary:
+                self.publicator.compile("content", str(self.latex_file))
+        self.assertEqual(tex.call_count, 3)
+        self.assertEqual(tex.call_args_list[0].args, (str(self.latex_file), "-draftmode"))
+        self.assertEqual(tex.call_args_list[-1].args, (str(self.latex_file), ""))
+        make_glossary.assert_not_called()
+
+    def test_glossary_is_made_when_there_are_entries(self):
+        auxiliary_files = [{".aux": "1", ".glo": "entry"}, {".aux": "1", ".glo": "entry"}]
+        with patch.object(self.publicator, "tex_compiler", side_effect=self.fake_compiler(auxiliary_files)) as tex:
+            with patch.object(self.publicator, "make_glossary") as make_glossary:
+                self.publicator.compile("content", str(self.latex_file))
+        self.assertEqual(tex.call_count, 2)
+        make_glossary.assert_called_once_with("content", str(self.latex_file))
+
+    def test_build_cache(self):
+        zds_app = deepcopy(settings.ZDS_APP)
+        zds_app["content"]["latex_build_cache_dir"] = str(self.directory / "cache")
+        zds_app["content"]["latex_build_cache_max_entries"] = 1
+        image_dir = self.directory / "images"
+        image_dir.mkdir()
+        (image_dir / "image.png").write_bytes(b"image")
+        pdf_file = self.latex_file.with_suffix(".pdf")
+
+        with override_settings(ZDS_APP=zds_app):
+            build_key = self.publicator.get_build_key(str(self.latex_file), image_dir)
+            self.assertFalse(self.publicator.get_cached_build(build_key, str(pdf_file)))
+            pdf_file.write_text("first pdf")
+            self.publicator.cache_build(build_key, str(pdf_file))
+            pdf_file.unlink()
+            self.assertTrue(self.publicator.get_cached_build(build_key, str(pdf_file)))
+            self.assertEqual(pdf_file.read_text(), "first pdf")
+            # LaTeX rewrites the PDF of the build directory in place, without changing the cached one
+            pdf_file.write_text("rewritten pdf")
+            pdf_file.unlink()
+            self.assertTrue(self.publicator.get_cached_build(build_key, str(pdf_file)))
+            self.assertEqual(pdf_file.read_text(), "first pdf")
+
+            # another image gives another PDF, and the cache only keeps the last one
+            (image_dir / "image.png").write_bytes(b"another image")
+            other_key = self.publicator.get_build_key(str(self.latex_file), image_dir)
+            self.assertNotEqual(build_key, other_key)
+            pdf_file.unlink()
+            pdf_file.write_text("second pdf")
+            self.publicator.cache_build(other_key, str(pdf_file))
+            self.assertFalse(self.publicator.get_cached_build(build_key, str(pdf_file)))
+            self.assertEqual(len(list((self.directory / "cache").iterdir())), 1)
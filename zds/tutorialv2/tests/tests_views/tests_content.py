@@ -1317,7 +1317,7 @@ class ContentTests(TutorialTestMixin, TestCase):
         self.assertEqual(result.status_code, 200)
         draft_zip_path = os.path.join(tempfile.gettempdir(), "__draft1.zip")
         f = open(draft_zip_path, "wb")
-        f.write(result.content)
+        f.write(b"".join(result.streaming_content))
         f.close()
 
         versioned = PublishableContent.objects.get(pk=tuto_pk).load_version()
@@ -1369,7 +1369,7 @@ class ContentTests(TutorialTestMixin, TestCase):
         self.assertEqual(result.status_code, 200)
         draft_zip_path_2 = os.path.join(tempfile.gettempdir(), "__draft2.zip")
         f = open(draft_zip_path_2, "wb")
-        f.write(result.content)
+        f.write(b"".join(result.streaming_content))
         f.close()
 
         versioned = PublishableContent.objects.get(pk=tuto_pk).load_version()
@@ -1397,7 +1397,7 @@ class ContentTests(TutorialTestMixin, TestCase):
         self.assertEqual(result.status_code, 200)
         draft_zip_path_3 = os.path.join(tempfile.gettempdir(), "__draft3.zip")
         f = open(draft_zip_path_3, "wb")
-        f.write(result.content)
+        f.write(b"".join(result.streaming_content))
         f.close()
 
         archive = zipfile.ZipFile(draft_zip_path_3, "r")
@@ -1476,7 +1476,7 @@ class ContentTests(TutorialTestMixin, TestCase):
         self.assertEqual(result.status_code, 200)
         draft_zip_path = os.path.join(tempfile.gettempdir(), "__draft1.zip")
         f = open(draft_zip_path, "wb")
-        f.write(result.content)
+        f.write(b"".join(result.streaming_content))
         f.close()
 
         first_version = PublishableContent.objects.get(pk=tuto_pk).load_version()
@@ -1593,7 +1593,7 @@ class ContentTests(TutorialTestMixin, TestCase):
         self.assertEqual(result.status_code, 200)
         draft_zip_path = os.path.join(tempfile.gettempdir(), "__draft1.zip")
         f = open(draft_zip_path, "wb")
-        f.write(result.content)
+        f.write(b"".join(result.streaming_content))
         f.close()
 
         first_version = PublishableContent.objects.get(pk=tuto_pk).load_version()
@@ -1696,7 +1696,7 @@ class ContentTests(TutorialTestMixin, TestCase):
         self.assertEqual(result.status_code, 200)
         draft_zip_path = os.path.join(tempfile.gettempdir(), "__draft1.zip")
         f = open(draft_zip_path, "wb")
-        f.write(result.content)
+        f.write(b"".join(result.streaming_content))
         f.close()
 
         # create the archive with images:
@@ -1796,7 +1796,7 @@ class ContentTests(TutorialTestMixin, TestCase):
         self.assertEqual(result.status_code, 200)
         draft_zip_path = os.path.join(tempfile.gettempdir(), "__draft1.zip")
         with open(draft_zip_path, "wb") as f:
-            f.write(result.content)
+            f.write(b"".join(result.streaming_content))
 
         # Update readiness of part 2 and part1/chapter1
         # Failure to import this information defaults also to True, this is to make sure.
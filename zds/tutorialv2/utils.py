@@ -1,6 +1,7 @@
 from collections import OrderedDict, namedtuple
 import os
 import logging
+import posixpath
 from urllib.parse import urlsplit, urlunsplit, quote
 from django.contrib.auth.models import User
 from django.http import Http404
@@ -773,6 +774,67 @@ class InvalidOperationError(RuntimeError):
     pass
 
 
+class GitTreeIndex:
+    """Lookup of the files of a git tree by their path.
+
+    Each directory of a path is looked up directly in its parent directory (instead of walking every file of the tree)
+    and kept, so that reading all the files of a content resolves each of its directories only once.
+    """
+
+    def __init__(self, tree):
+        """
+        :param tree: Git Tree object
+        :type tree: git.objects.tree.Tree
+        """
+        self.tree = tree
+        self._trees = {"": tree}
+
+    def get_tree(self, path):
+        """
+        :param path: path of a directory, relative to the root of the tree and normalized
+        :type path: str
+        :return: the tree of this directory, or ``None`` if there is no such directory
+        :rtype: git.objects.tree.Tree
+        """
+        if path not in self._trees:
+            parent_path, name = posixpath.split(path)
+            parent = self.get_tree(parent_path)
+            subtree = None
+            if parent is not None:
+                try:
+                    subtree = parent / name
+                except KeyError:
+                    pass
+            self._trees[path] = subtree if subtree is not None and subtree.type == "tree" else None
+        return self._trees[path]
+
+    def get_blob(self, path):
+        """Return the data contained into a given file
+
+        :param path: Path to file, relative to the root of the tree
+        :type path: str
+        :return: the content of the file, or ``None`` if there is no such file
+        :rtype: str
+        """
+        path = posixpath.normpath(path.replace("\\", "/"))
+        if path == "." or path.startswith(("/", "../")):
+            return None
+        parent_path, name = posixpath.split(path)
+        tree = self.get_tree(parent_path)
+        if tree is None:
+            return None
+        try:
+            blob = tree / name
+        except KeyError:
+            return None
+        if blob.type != "blob":
+            return None
+        try:
+            return blob.data_stream.read().decode()
+        except OSError:  # in case of deleted files, or the system cannot get the lock, juste return ""
+            return ""
+
+
 def get_blob(tree, path):
     """Return the data contained into a given file
 
@@ -781,25 +843,9 @@ def get_blob(tree, path):
     :param path: Path to file
     :type path: str
     :return: contains
-    :rtype: bytearray
+    :rtype: str
     """
-    # get all extracts
-    for blob in tree.blobs:
-        try:
-            if os.path.abspath(blob.path) == os.path.abspath(path):
-                data = blob.data_stream.read().decode()
-                return data
-        except OSError:  # in case of deleted files, or the system cannot get the lock, juste return ""
-            return ""
-    # traverse directories when we are at root or in a part or chapter
-    if len(tree.trees) > 0:
-        for subtree in tree.trees:
-            result = get_blob(subtree, path)
-            if result is not None:
-                return result
-        return None
-    else:
-        return None
+    return GitTreeIndex(tree).get_blob(path)
 
 
 class BadArchiveError(Exception):
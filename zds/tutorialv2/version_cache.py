@@ -0,0 +1,79 @@
+"""
+Cache of the files of the versions of the contents.
+
+A version is a git commit, which never changes: its manifest and its texts are stored under the primary key of the
+content, the sha of the version and the path of the file, and read from there instead of git.
+"""
+import hashlib
+import re
+
+from django.conf import settings
+
+from zds.utils.render_cache import RenderCache
+
+KEY_PREFIX = "content-version"
+
+# only full shas identify a version which cannot change (unlike branches or other references)
+SHA_PATTERN = re.compile("[0-9a-f]{40}")
+
+
+def make_version_key(content_pk, sha, path):
+    """
+    Compute the cache key of a file of a version.
+
+    :param int content_pk: primary key of the content
+    :param str sha: the version
+    :param str path: path of the file in the repository
+    :return: the key, or ``None`` if the file cannot be cached (unknown content or version not given as a full sha)
+    :rtype: str
+    """
+    if not content_pk or not isinstance(sha, str) or not SHA_PATTERN.fullmatch(sha):
+        return None
+    return "{}:{}:{}:{}".format(KEY_PREFIX, content_pk, sha, hashlib.sha256(path.encode("utf-8")).hexdigest())
+
+
+_version_cache = None
+
+
+def get_version_cache():
+    """
+    :return: the version cache of the current process, built on first use from
+        ``settings.ZDS_APP["content"]["version_cache"]``.
+    :rtype: zds.utils.render_cache.RenderCache
+    """
+    global _version_cache
+    if _version_cache is None:
+        _version_cache = RenderCache.from_config(settings.ZDS_APP["content"].get("version_cache", {}))
+    return _version_cache
+
+
+def reset_version_cache():
+    """
+    Forget the version cache of the current process, so that the next call to ``get_version_cache``
+    takes the current settings into account.
+    """
+    global _version_cache
+    _version_cache = None
+
+
+def get_cached_file(content_pk, sha, path, read):
+    """
+    Read a file of a version from the cache, or with ``read`` (then store it in the cache).
+
+    :param int content_pk: primary key of the content
+    :param str sha: the version
+    :param str path: path of the file in the repository
+    :param read: function reading the file, which returns ``None`` if there is no such file
+    :return: what ``read`` returned
+    """
+    key = make_version_key(content_pk, sha, path)
+    version_cache = get_version_cache()
+    if key is None or not version_cache.enabled:
+        return read()
+    value = version_cache.get(key)
+    if value is None:
+        value = read()
+        # empty texts are not stored, they may come from a file that could not be read
+        if value:
+            version_cache.set(key, value)
+    return value
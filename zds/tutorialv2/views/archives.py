@@ -1,3 +1,6 @@
+import contextlib
+import io
+import logging
 import os
 import re
 import shutil
@@ -5,6 +8,7 @@ import tempfile
 import time
 import zipfile
 from datetime import datetime
+from pathlib import Path
 
 from PIL import Image as ImagePIL
 from django.conf import settings
@@ -30,8 +34,41 @@ from zds.tutorialv2.utils import (
     default_slug_pool,
     init_new_repo,
 )
+from zds.tutorialv2.version_cache import SHA_PATTERN
 from zds.utils.uuslug_wrapper import slugify
 
+logger = logging.getLogger(__name__)
+
+# size of the chunks read from the git blobs and from the cached archives
+ARCHIVE_CHUNK_SIZE = 64 * 1024
+
+
+class ZipStream(io.RawIOBase):
+    """
+    Unseekable file in which ``zipfile`` writes an archive, the written bytes being taken as soon as they are written
+    (``zipfile`` then writes the size of each file after its data instead of seeking back to its header).
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def take(self):
+        """
+        :return: the bytes written since the last call
+        :rtype: bytes
+        """
+        data = b"".join(self.chunks)
+        self.chunks = []
+        return data
+
 
 class DownloadContent(LoginRequiredMixin, SingleContentDownloadViewMixin):
     """
@@ -42,6 +79,17 @@ class DownloadContent(LoginRequiredMixin, SingleContentDownloadViewMixin):
     only_draft_version = False  # beta version can also be downloaded
     must_be_author = False  # other user can download archive
 
+    @staticmethod
+    def walk_blobs(git_tree):
+        """Iterator that yield the files of a git tree, the files of a directory before its subdirectories
+
+        :param git_tree: Git tree (from ``repository.commit(sha).tree``)
+        :rtype: collections.Iterable[git.Blob]
+        """
+        yield from git_tree.blobs  # first, the files
+        for subtree in git_tree.trees:  # then, recursively, the dirs
+            yield from DownloadContent.walk_blobs(subtree)
+
     @staticmethod
     def insert_into_zip(zip_file, git_tree):
         """Recursively add file into zip
@@ -49,31 +97,113 @@ class DownloadContent(LoginRequiredMixin, SingleContentDownloadViewMixin):
         :param zip_file: a ``zipfile`` object (with writing permissions)
         :param git_tree: Git tree (from ``repository.commit(sha).tree``)
         """
-        for blob in git_tree.blobs:  # first, add files :
+        for blob in DownloadContent.walk_blobs(git_tree):
             zip_file.writestr(blob.path, blob.data_stream.read())
-        if git_tree.trees:  # then, recursively add dirs :
-            for subtree in git_tree.trees:
-                DownloadContent.insert_into_zip(zip_file, subtree)
 
-    def get_contents(self):
-        """get the zip file stream
+    @staticmethod
+    def stream_zip(git_tree):
+        """Iterator that yield the chunks of a zip archive of a git tree as soon as they are written, the files being
+        read by chunks from the repository: neither the archive nor a whole file is held in memory or on the disk.
 
-        :return: a zip file
-        :rtype: byte
+        :param git_tree: Git tree (from ``repository.commit(sha).tree``)
+        :rtype: collections.Iterable[bytes]
         """
-        versioned = self.versioned_object
+        stream = ZipStream()
+        with zipfile.ZipFile(stream, "w") as zip_file:
+            for blob in DownloadContent.walk_blobs(git_tree):
+                # same metadata as the ones set by ``writestr()``
+                info = zipfile.ZipInfo(blob.path, date_time=time.localtime(time.time())[:6])
+                info.external_attr = 0o600 << 16
+                info.file_size = blob.size
+                data_stream = blob.data_stream
+                with zip_file.open(info, "w") as zipped_file:
+                    for chunk in iter(lambda: data_stream.read(ARCHIVE_CHUNK_SIZE), b""):
+                        zipped_file.write(chunk)
+                        data = stream.take()
+                        if data:
+                            yield data
+                data = stream.take()
+                if data:
+                    yield data
+        yield stream.take()  # the central directory
 
-        # create and fill zip
-        path = self.object.get_repo_path()
-        zip_path = path + self.get_filename()
-        zip_file = zipfile.ZipFile(zip_path, "w")
-        self.insert_into_zip(zip_file, versioned.repository.commit(versioned.current_version).tree)
-        zip_file.close()
+    @staticmethod
+    def read_by_chunks(archive):
+        """Iterator that yield the chunks of an opened file, then close it"""
+        with archive:
+            yield from iter(lambda: archive.read(ARCHIVE_CHUNK_SIZE), b"")
 
-        # return content
-        response = open(zip_path, "rb").read()
-        os.remove(zip_path)
-        return response
+    @staticmethod
+    def cache_archive(chunks, archive_path, max_entries):
+        """Iterator that yield the chunks of an archive while writing them in the archive cache. The archive is only
+        put in the cache once complete, then the least recently used archives are removed when there are more than
+        ``max_entries`` archives in the cache.
+
+        :param chunks: the chunks of the archive
+        :param archive_path: path of the archive in the cache
+        :type archive_path: pathlib.Path
+        :param int max_entries: maximal number of archives in the cache
+        :rtype: collections.Iterable[bytes]
+        """
+        try:
+            archive_path.parent.mkdir(parents=True, exist_ok=True)
+            partial_archive = tempfile.NamedTemporaryFile(dir=archive_path.parent, suffix=".part", delete=False)
+        except OSError:
+            logger.exception("Could not write %s in the archive cache", archive_path)
+            yield from chunks
+            return
+        complete = False
+        try:
+            with partial_archive:
+                for chunk in chunks:
+                    partial_archive.write(chunk)
+                    yield chunk
+            os.replace(partial_archive.name, archive_path)
+            complete = True
+            cached_archives = sorted(archive_path.parent.glob("*.zip"), key=lambda cached: cached.stat().st_mtime)
+            for cached in cached_archives[:-max_entries]:
+                cached.unlink()
+        except OSError:
+            logger.exception("Could not update the archive cache with %s", archive_path)
+        finally:
+            if not complete:  # failed, or the download was interrupted
+                with contextlib.suppress(OSError):
+                    os.remove(partial_archive.name)
+
+    def get_cached_archive_path(self):
+        """
+        :return: path of the archive of the downloaded version in the archive cache, ``None`` if it is not cached
+        :rtype: pathlib.Path
+        """
+        cache_dir = settings.ZDS_APP["content"]["archive_cache_dir"]
+        sha = self.versioned_object.current_version
+        if not cache_dir or not isinstance(sha, str) or not SHA_PATTERN.fullmatch(sha):
+            return None
+        return Path(cache_dir, f"{self.object.pk}-{sha}.zip")
+
+    def get_contents(self):
+        """get the zip file stream, built from the repository or taken from the archive cache (a version never
+        changes)
+
+        :return: the chunks of a zip file
+        :rtype: collections.Iterable[bytes]
+        """
+        archive_path = self.get_cached_archive_path()
+        if archive_path is not None:
+            try:
+                archive = archive_path.open("rb")
+            except OSError:
+                pass
+            else:
+                with contextlib.suppress(OSError):
+                    os.utime(archive_path)  # most recently used
+                return self.read_by_chunks(archive)
+
+        versioned = self.versioned_object
+        chunks = self.stream_zip(versioned.repository.commit(versioned.current_version).tree)
+        if archive_path is None:
+            return chunks
+        return self.cache_archive(chunks, archive_path, settings.ZDS_APP["content"]["archive_cache_max_entries"])
 
     def get_filename(self):
         return self.get_object().slug + ".zip"
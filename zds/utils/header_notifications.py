@@ -1,4 +1,7 @@
+from django.conf import settings
 from django.contrib.contenttypes.models import ContentType
+from django.core.cache import cache
+from django.db import transaction
 from django.utils.translation import gettext_lazy as _
 
 from zds.forum.models import Post
@@ -7,6 +10,9 @@ from zds.notification.models import Notification
 from zds.tutorialv2.models.database import ContentReaction, PublishableContent
 from zds.utils.models import Alert
 
+USER_NOTIFICATIONS_CACHE_KEY = "header_notifications_{}"
+ALERTS_CACHE_KEY = "header_alerts"
+
 
 def _notifications_to_list(notifications_query):
     query = notifications_query.select_related("sender__profile").order_by("-pubdate")[:10]
@@ -14,40 +20,110 @@ def _notifications_to_list(notifications_query):
     return [{"pubdate": n.pubdate, "author": n.sender, "title": n.title, "url": n.url} for n in query]
 
 
-def _get_alert_info(alert):
-    if alert.scope == "FORUM":
-        post = Post.objects.select_related("topic").get(pk=alert.comment.pk)
-        return post.topic.title, post.get_absolute_url()
-    elif alert.scope == "CONTENT":
-        published = PublishableContent.objects.select_related("public_version").get(pk=alert.content.pk)
-        title = published.public_version.title if published.public_version else published.title
-        url = published.get_absolute_url_online() if published.public_version else ""
-        return title, url
-    elif alert.scope == "PROFILE":
-        return _("Profil de {}").format(alert.profile.user.username), alert.profile.get_absolute_url() + "#alerts"
-    else:
-        comment = ContentReaction.objects.select_related("related_content").get(pk=alert.comment.pk)
-        return (
-            comment.related_content.title,
-            comment.get_absolute_url(),
-        )
+def resolve_alerts(alerts):
+    """
+    Finds the title and the URL of what each alert is about, with one query per scope (instead of one per alert),
+    and stores them in ``alert.target_title`` and ``alert.target_url``.
+
+    :param alerts: the alerts
+    :type alerts: list[zds.utils.models.Alert]
+    :return: the alerts
+    :rtype: list[zds.utils.models.Alert]
+    """
+    from zds.member.models import Profile
+
+    by_scope = {}
+    for alert in alerts:
+        by_scope.setdefault(alert.scope, []).append(alert)
+
+    targets = {}
+    for scope, scope_alerts in by_scope.items():
+        if scope == "CONTENT":
+            queryset = PublishableContent.objects.select_related("public_version")
+            pks = [alert.content_id for alert in scope_alerts]
+        elif scope == "PROFILE":
+            queryset = Profile.objects.select_related("user")
+            pks = [alert.profile_id for alert in scope_alerts]
+        elif scope == "FORUM":
+            queryset = Post.objects.select_related("topic")
+            pks = [alert.comment_id for alert in scope_alerts]
+        else:
+            queryset = ContentReaction.objects.select_related("related_content__public_version")
+            pks = [alert.comment_id for alert in scope_alerts]
+        targets[scope] = queryset.in_bulk([pk for pk in pks if pk is not None])
+
+    for alert in alerts:
+        alert.target_title, alert.target_url = "", ""
+        if alert.scope == "CONTENT":
+            published = targets["CONTENT"].get(alert.content_id)
+            if published is not None:
+                alert.target_title = published.public_version.title if published.public_version else published.title
+                alert.target_url = published.get_absolute_url_online() if published.public_version else ""
+        elif alert.scope == "PROFILE":
+            profile = targets["PROFILE"].get(alert.profile_id)
+            if profile is not None:
+                alert.target_title = _("Profil de {}").format(profile.user.username)
+                alert.target_url = profile.get_absolute_url() + "#alerts"
+        else:
+            comment = targets[alert.scope].get(alert.comment_id)
+            if comment is not None:
+                alert.target_title = comment.topic.title if alert.scope == "FORUM" else comment.related_content.title
+                alert.target_url = comment.get_absolute_url()
+    return alerts
 
 
 def _alert_to_dict(alert):
-    title, url = _get_alert_info(alert)
-    return {"title": title, "url": url, "pubdate": alert.pubdate, "author": alert.author, "text": alert.text}
+    return {
+        "title": alert.target_title,
+        "url": alert.target_url,
+        "pubdate": alert.pubdate,
+        "author": alert.author,
+        "text": alert.text,
+    }
 
 
 def _alerts_to_list(alerts_query):
-    query = alerts_query.select_related("author", "comment", "content").order_by("-pubdate")[:10]
+    query = alerts_query.select_related("author").order_by("-pubdate")[:10]
 
-    return [_alert_to_dict(a) for a in query]
+    return [_alert_to_dict(a) for a in resolve_alerts(list(query))]
 
 
-def get_header_notifications(user):
-    if not user.is_authenticated:
-        return None
+def _get_cached(key, compute):
+    timeout = settings.ZDS_APP["notification"]["header_cache_timeout"]
+    if not timeout:
+        return compute()
+    value = cache.get(key)
+    if value is None:
+        value = compute()
+        cache.set(key, value, timeout)
+    return value
+
+
+def _invalidate(keys):
+    if not settings.ZDS_APP["notification"]["header_cache_timeout"]:
+        return
+    cache.delete_many(keys)
+    # a request could compute the summary again before the changes are committed
+    transaction.on_commit(lambda: cache.delete_many(keys))
 
+
+def invalidate_header_notifications(user_ids):
+    """
+    Removes the cached notification summaries of the given users, to be called when their notifications change.
+
+    :param user_ids: primary keys of the users
+    """
+    _invalidate([USER_NOTIFICATIONS_CACHE_KEY.format(user_id) for user_id in set(user_ids)])
+
+
+def invalidate_header_alerts():
+    """
+    Removes the cached alert summary shared by the staff, to be called when an alert changes.
+    """
+    _invalidate([ALERTS_CACHE_KEY])
+
+
+def _get_user_notifications(user):
     private_topic = ContentType.objects.get_for_model(PrivateTopic)
 
     notifications = Notification.objects.filter(subscription__user=user, is_read=False)
@@ -56,8 +132,6 @@ def get_header_notifications(user):
 
     private_notifications = notifications.filter(subscription__content_type=private_topic)
 
-    alerts = Alert.objects.filter(solved=False)
-
     return {
         "general_notifications": {
             "total": general_notifications.count(),
@@ -67,9 +141,28 @@ def get_header_notifications(user):
             "total": private_notifications.count(),
             "list": _notifications_to_list(private_notifications),
         },
-        "alerts": user.has_perm("forum.change_post")
-        and {
-            "total": alerts.count(),
-            "list": _alerts_to_list(alerts),
-        },
     }
+
+
+def _get_alerts():
+    alerts = Alert.objects.filter(solved=False)
+
+    return {
+        "total": alerts.count(),
+        "list": _alerts_to_list(alerts),
+    }
+
+
+def get_header_notifications(user):
+    """
+    The summaries are cached for ``header_cache_timeout`` seconds: per user for the notifications, and once for the
+    whole staff for the alerts. They are invalidated when a notification or an alert changes.
+    """
+    if not user.is_authenticated:
+        return None
+
+    header_notifications = _get_cached(
+        USER_NOTIFICATIONS_CACHE_KEY.format(user.pk), lambda: _get_user_notifications(user)
+    )
+    header_notifications["alerts"] = user.has_perm("forum.change_post") and _get_cached(ALERTS_CACHE_KEY, _get_alerts)
+    return header_notifications
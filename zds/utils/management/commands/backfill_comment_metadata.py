@@ -0,0 +1,32 @@
+from django.core.management import BaseCommand
+
+from zds.utils.models import Comment
+from zds.utils.templatetags.emarkdown import render_markdown_batch
+
+
+class Command(BaseCommand):
+    help = "Store the zmarkdown metadata (pings, stats) of the comments saved before they were stored"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=100, help="Number of comments rendered at once")
+        parser.add_argument("--limit", type=int, default=None, help="Maximal number of comments to update")
+
+    def handle(self, *args, **options):
+        comments = Comment.objects.filter(text_metadata__isnull=True).order_by("pk")
+        limit = options["limit"]
+        processed = updated = last_pk = 0
+        while limit is None or processed < limit:
+            batch_size = options["batch_size"] if limit is None else min(options["batch_size"], limit - processed)
+            batch = list(comments.filter(pk__gt=last_pk).values_list("pk", "text")[:batch_size])
+            if not batch:
+                break
+            rendered = render_markdown_batch([text for _, text in batch])
+            for (pk, text), (html, metadata, _) in zip(batch, rendered):
+                if not html and text.strip():
+                    continue  # the rendering failed, the metadata are still unknown
+                # update() does not send the signals of save(): no notification nor reindexation
+                Comment.objects.filter(pk=pk).update(text_metadata=metadata)
+                updated += 1
+            processed += len(batch)
+            last_pk = batch[-1][0]
+            self.stdout.write(f"{updated} comments updated out of {processed}")
@@ -0,0 +1,18 @@
+# Generated by Django 3.2.12 on 2026-10-18 09:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("utils", "0024_alter_hatrequest_is_granted"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="comment",
+            name="text_metadata",
+            field=models.JSONField(blank=True, null=True, verbose_name="Métadonnées du texte"),
+        ),
+    ]
@@ -1,6 +1,8 @@
 import hashlib
 import re
 
+from django.db import connections
+
 THUMB_MAX_WIDTH = 80
 THUMB_MAX_HEIGHT = 80
 
@@ -54,3 +56,18 @@ def contains_utf8mb4(s):
         s = str(s, "utf-8")
     re_pattern = re.compile("[^\u0000-\uD7FF\uE000-\uFFFF]", re.UNICODE)
     return s != re_pattern.sub("\uFFFD", s)
+
+
+def select_for_update_skip_locked(queryset):
+    """
+    Lock the rows selected by the queryset until the end of the transaction, skipping the rows locked by another
+    transaction, when the database supports it (MariaDB does not, for instance). The queryset is returned unchanged
+    otherwise: the callers must then make sure that a row cannot be handled twice.
+
+    :param queryset: the queryset
+    :type queryset: django.db.models.query.QuerySet
+    :rtype: django.db.models.query.QuerySet
+    """
+    if connections[queryset.db].features.has_select_for_update_skip_locked:
+        return queryset.select_for_update(skip_locked=True)
+    return queryset
@@ -398,6 +398,8 @@ class Comment(models.Model):
 
     text = models.TextField("Texte")
     text_html = models.TextField("Texte en Html")
+    # metadata returned by zmarkdown along with `text_html` (pings, stats), None if not known yet
+    text_metadata = models.JSONField("Métadonnées du texte", null=True, blank=True)
 
     like = models.IntegerField("Likes", default=0)
     dislike = models.IntegerField("Dislikes", default=0)
@@ -438,17 +440,32 @@ class Comment(models.Model):
         if not hasattr(self, "old_text"):
             self.old_text = self.text
 
-        _, old_metadata, _ = render_markdown(self.text)
-        html, new_metadata, _ = render_markdown(text, on_error=on_error)
-
         # These attributes will be used by `_save_compute_pings` to create notifications if needed.
         # For the same reason as `old_text`, we only update `old_metadata` if not already set.
         if not hasattr(self, "old_metadata"):
-            self.old_metadata = old_metadata
+            self.old_metadata = self.get_text_metadata()
+        html, new_metadata, _ = render_markdown(text, on_error=on_error)
         self.new_metadata = new_metadata
 
         self.text = text
         self.text_html = html
+        # the metadata are unknown if the rendering failed
+        self.text_metadata = new_metadata if html or not text.strip() else None
+
+    def get_text_metadata(self):
+        """
+        Get the metadata of the current text. They are stored along with the text, except for comments saved
+        before metadata were stored: the text is then rendered again.
+
+        :return: the metadata returned by zmarkdown
+        :rtype: dict
+        """
+        if self.text_metadata is not None:
+            return self.text_metadata
+        if not self.text:
+            return {}
+        _, metadata, _ = render_markdown(self.text)
+        return metadata
 
     def save(self, *args, **kwargs):
         """
@@ -1,10 +1,53 @@
 from django.conf import settings
+from django.utils.functional import cached_property
 from django.views.generic import ListView
 from django.views.generic.list import MultipleObjectMixin
 from django.core.paginator import Paginator, EmptyPage
 from django.http import Http404
 
 
+class PositionPaginator(Paginator):
+    """
+    Paginator for the objects numbered by a position (the posts of a topic for instance), which seeks the positions
+    of the page instead of skipping the objects of the previous pages with an OFFSET, which gets slower as the page
+    gets deeper. The number of objects is the last position, so that no ``COUNT(*)`` is needed either.
+
+    Pages are made of positions, which is also how the links to a post are built: if some positions are missing, the
+    pages are shorter.
+    """
+
+    def __init__(self, object_list, per_page, last_position, position_field="position", with_previous_item=False, **kw):
+        """
+        :param object_list: the queryset of the objects
+        :param per_page: number of positions in a page
+        :param last_position: position of the last object
+        :param position_field: name of the position field of the objects
+        :param with_previous_item: if ``True``, the object just before a page (the last one of the previous page) is \
+        fetched with the page, by the same query
+        """
+        super().__init__(object_list, per_page, **kw)
+        self.last_position = last_position or 0
+        self.position_field = position_field
+        self.with_previous_item = with_previous_item
+
+    @cached_property
+    def count(self):
+        return self.last_position
+
+    def page(self, number):
+        number = self.validate_number(number)
+        bottom = (number - 1) * self.per_page
+        top = bottom + self.per_page
+        if top + self.orphans >= self.count:
+            top = self.count
+        if self.with_previous_item and number > 1:
+            bottom -= 1
+        object_list = self.object_list.filter(
+            **{f"{self.position_field}__gt": bottom, f"{self.position_field}__lte": top}
+        ).order_by(self.position_field)
+        return self._get_page(object_list, number, self)
+
+
 class ZdSPagingListView(ListView):
     paginator = None
     page = 1
@@ -44,6 +87,9 @@ class ZdSPagingListView(ListView):
         For some list paginated, we would like to display the last item of the previous page.
         This function returns the list paginated with this previous item.
         """
+        if getattr(self.paginator, "with_previous_item", False):
+            # the paginator already fetched it with the page
+            return list(queryset)
         original_list = queryset.all()
         items_list = []
         # If necessary, add the last item in the previous page.
@@ -0,0 +1,228 @@
+"""
+Cache of zmarkdown renders.
+
+A render only depends on the markdown input, the output format and the options sent to zmarkdown,
+so its result is stored under a hash of those three values and reused instead of querying the server again.
+"""
+import copy
+import hashlib
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = "zmd-render"
+
+# Options that make zmarkdown write files on disk: the render has side effects and cannot be skipped.
+SIDE_EFFECT_OPTIONS = ("images_download_dir",)
+
+
+def make_render_key(md_input, output_format, opts):
+    """
+    Compute the cache key of a render.
+
+    :param md_input: the markdown sent to zmarkdown.
+    :param str output_format: one of the keys of ``FORMAT_ENDPOINTS``.
+    :param dict opts: the options sent to zmarkdown.
+    :return: a key which does not depend on the order of ``opts``.
+    :rtype: str
+    """
+    normalized = json.dumps(
+        {"md": str(md_input), "format": output_format, "opts": opts}, sort_keys=True, default=str, ensure_ascii=False
+    )
+    return "{}:{}".format(KEY_PREFIX, hashlib.sha256(normalized.encode("utf-8")).hexdigest())
+
+
+def is_cacheable(output_format, full_json, opts):
+    """
+    Tell whether a render can be served from the cache. Manifest renders (``full_json``) are huge and
+    only done at publication time, and renders downloading images must really be done.
+    """
+    if full_json:
+        return False
+    return not any(opts.get(option) for option in SIDE_EFFECT_OPTIONS)
+
+
+class LocalLRUBackend:
+    """
+    In-process cache, bounded to ``max_entries``: the least recently used render is evicted first.
+    Entries also expire after ``timeout`` seconds, if set.
+    """
+
+    name = "local"
+
+    def __init__(self, max_entries=512, timeout=None):
+        self.max_entries = max_entries
+        self.timeout = timeout
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            try:
+                expiration, value = self._entries[key]
+            except KeyError:
+                return None
+            if expiration is not None and expiration <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+        # callers are free to alter the metadata they receive
+        return copy.deepcopy(value)
+
+    def set(self, key, value):
+        value = copy.deepcopy(value)
+        expiration = time.monotonic() + self.timeout if self.timeout is not None else None
+        with self._lock:
+            self._entries[key] = expiration, value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class DjangoCacheBackend:
+    """
+    Cache shared between processes, using one of the caches defined in ``settings.CACHES``.
+    Eviction is left to the cache server, entries also expire after ``timeout`` seconds.
+    """
+
+    name = "shared"
+
+    def __init__(self, alias="default", timeout=3600):
+        self.alias = alias
+        self.timeout = timeout
+
+    @property
+    def cache(self):
+        return caches[self.alias]
+
+    def get(self, key):
+        try:
+            return self.cache.get(key)
+        except Exception:  # a broken cache server must not prevent rendering
+            logger.exception("Unable to read the zmarkdown render cache")
+            return None
+
+    def set(self, key, value):
+        try:
+            self.cache.set(key, value, self.timeout)
+        except Exception:
+            logger.exception("Unable to write the zmarkdown render cache")
+
+    def clear(self):
+        # the shared cache also holds other data, it is only cleared with the ``clear_cache`` command
+        pass
+
+
+class RenderCache:
+    """
+    Chain of backends, fastest first. A value found in a backend is copied into the faster ones.
+    Hits (per backend) and misses are counted for the current process.
+    """
+
+    def __init__(self, backends):
+        self.backends = list(backends)
+        self._lock = threading.Lock()
+        self.reset_stats()
+
+    @classmethod
+    def from_settings(cls):
+        """
+        Build the cache described by ``settings.ZDS_APP["zmd"]["render_cache"]``.
+        """
+        return cls.from_config(settings.ZDS_APP["zmd"].get("render_cache", {}))
+
+    @classmethod
+    def from_config(cls, config):
+        """
+        Build a cache from its configuration: ``enabled``, ``local_max_entries`` (0 to disable the in-process
+        backend), ``shared_cache`` (alias of the shared backend, if any) and ``shared_timeout`` (lifetime
+        of the entries of both backends).
+        """
+        backends = []
+        if config.get("enabled", True):
+            if config.get("local_max_entries", 512) > 0:
+                backends.append(
+                    LocalLRUBackend(config.get("local_max_entries", 512), config.get("shared_timeout", 3600))
+                )
+            if config.get("shared_cache"):
+                backends.append(DjangoCacheBackend(config["shared_cache"], config.get("shared_timeout", 3600)))
+        return cls(backends)
+
+    @property
+    def enabled(self):
+        return bool(self.backends)
+
+    def get(self, key):
+        for index, backend in enumerate(self.backends):
+            value = backend.get(key)
+            if value is not None:
+                for faster_backend in self.backends[:index]:
+                    faster_backend.set(key, value)
+                self._count(backend.name)
+                return value
+        self._count("miss")
+        return None
+
+    def set(self, key, value):
+        for backend in self.backends:
+            backend.set(key, value)
+
+    def clear(self):
+        for backend in self.backends:
+            backend.clear()
+
+    def _count(self, counter):
+        with self._lock:
+            self.counters[counter] = self.counters.get(counter, 0) + 1
+
+    def reset_stats(self):
+        self.counters = {"miss": 0}
+        for backend in self.backends:
+            self.counters[backend.name] = 0
+
+    def stats(self):
+        """
+        :return: the number of hits per backend, the total number of hits and the number of misses.
+        :rtype: dict
+        """
+        with self._lock:
+            stats = dict(self.counters)
+        stats["hit"] = sum(count for name, count in stats.items() if name != "miss")
+        return stats
+
+
+_render_cache = None
+
+
+def get_render_cache():
+    """
+    :return: the render cache of the current process, built on first use.
+    :rtype: RenderCache
+    """
+    global _render_cache
+    if _render_cache is None:
+        _render_cache = RenderCache.from_settings()
+    return _render_cache
+
+
+def reset_render_cache():
+    """
+    Forget the render cache of the current process, so that the next call to ``get_render_cache``
+    takes the current settings into account.
+    """
+    global _render_cache
+    _render_cache = None
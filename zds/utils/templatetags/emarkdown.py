@@ -1,7 +1,14 @@
+import os
 import re
 import json
 import logging
-from requests import post, HTTPError
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from requests import Session, HTTPError
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 from django import template
 from django.conf import settings
@@ -9,6 +16,8 @@ from django.template.defaultfilters import stringfilter
 from django.utils.safestring import mark_safe
 from django.utils.translation import gettext_lazy as _
 
+from zds.utils.render_cache import get_render_cache, is_cacheable, make_render_key
+
 logger = logging.getLogger(__name__)
 register = template.Library()
 """
@@ -19,12 +28,81 @@ Markdown related filters.
 MAX_ATTEMPTS = 3
 MD_PARSING_ERROR = _("Une erreur est survenue dans la génération de texte Markdown. Veuillez rapporter le bug.")
 
+# latex may be really long to generate but it is also restrained by server configuration
 FORMAT_ENDPOINTS = {
-    "html": "/html",
-    "texfile": "/latex-document",
-    "epub": "/epub",
-    "tex": "/latex",
+    "html": {"path": "/html", "timeout": 10},
+    "texfile": {"path": "/latex-document", "timeout": 120},
+    "epub": {"path": "/epub", "timeout": 10},
+    "tex": {"path": "/latex", "timeout": 120},
 }
+MANIFEST_TIMEOUT = 120
+
+_session = None
+_session_pid = None
+_session_lock = threading.Lock()
+
+
+def get_zmd_session():
+    """
+    Returns the HTTP session used to reach zmarkdown, shared by the whole process so that connections
+    are kept alive and reused between renders. A new session is created after a fork, since sockets
+    must not be shared between processes.
+
+    Failed requests (connection errors, 502, 503 and 504) are retried ``MAX_ATTEMPTS`` times,
+    waiting ``ZDS_APP["zmd"]["retry_backoff"]`` seconds, then twice as much, and so on.
+    """
+    global _session, _session_pid
+    with _session_lock:
+        if _session is None or _session_pid != os.getpid():
+            zmd_settings = settings.ZDS_APP["zmd"]
+            retry = Retry(
+                total=MAX_ATTEMPTS,
+                backoff_factor=zmd_settings.get("retry_backoff", 0.1),
+                status_forcelist=(502, 503, 504),
+                allowed_methods=False,  # rendering is idempotent, POST can be retried
+                raise_on_status=False,
+            )
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=zmd_settings.get("pool_size", 10), max_retries=retry)
+            _session = Session()
+            _session.mount("http://", adapter)
+            _session.mount("https://", adapter)
+            _session_pid = os.getpid()
+        return _session
+
+
+def get_zmd_session_stats():
+    """
+    Returns the number of requests sent to zmarkdown by the current process, the number of connections
+    that were opened for them and thus the number of requests sent on a reused connection.
+    """
+    stats = {"requests": 0, "connections": 0}
+    if _session is not None and _session_pid == os.getpid():
+        for adapter in set(_session.adapters.values()):
+            pools = adapter.poolmanager.pools
+            for key in pools.keys():
+                pool = pools[key]
+                stats["requests"] += pool.num_requests
+                stats["connections"] += pool.num_connections
+    stats["reused"] = max(stats["requests"] - stats["connections"], 0)
+    return stats
+
+
+def get_zmd_version():
+    """
+    Returns the version of the zmarkdown package installed in ``zmd/`` (the required one if it is not
+    installed), or None if it is unknown. It is read again on each call, so that an upgrade is noticed.
+    """
+    zmd_dir = Path(settings.BASE_DIR, "zmd")
+    try:
+        with open(zmd_dir / "node_modules" / "zmarkdown" / "package.json", encoding="utf-8") as package_file:
+            return json.load(package_file)["version"]
+    except (OSError, ValueError, KeyError):
+        pass
+    try:
+        with open(zmd_dir / "package.json", encoding="utf-8") as package_file:
+            return json.load(package_file)["dependencies"]["zmarkdown"]
+    except (OSError, ValueError, KeyError):
+        return None
 
 
 def _render_markdown_once(md_input, *, output_format="html", **kwargs):
@@ -42,17 +120,26 @@ def _render_markdown_once(md_input, *, output_format="html", **kwargs):
     if settings.ZDS_APP["zmd"]["disable_pings"] is True:
         kwargs["disable_ping"] = True
 
-    endpoint = FORMAT_ENDPOINTS[output_format]
+    endpoint = FORMAT_ENDPOINTS[output_format]["path"]
+
+    render_cache = get_render_cache()
+    cache_key = None
+    if render_cache.enabled and is_cacheable(output_format, full_json, kwargs):
+        cache_key = make_render_key(md_input, output_format, kwargs)
+        cached = render_cache.get(cache_key)
+        if cached is not None:
+            content, metadata, messages = cached
+            return mark_safe(content), metadata, messages
 
     try:
-        timeout = 10
+        timeout = FORMAT_ENDPOINTS[output_format]["timeout"]
         real_input = str(md_input)
         if output_format.startswith("tex") or full_json:
-            # latex may be really long to generate but it is also restrained by server configuration
-            timeout = 120
             # use manifest renderer
             real_input = md_input
-        response = post(
+        if full_json:
+            timeout = MANIFEST_TIMEOUT
+        response = get_zmd_session().post(
             "{}{}".format(settings.ZDS_APP["zmd"]["server"], endpoint),
             json={
                 "opts": kwargs,
@@ -82,6 +169,8 @@ def _render_markdown_once(md_input, *, output_format="html", **kwargs):
             content = content.strip()
         if inline:
             content = content.replace("</p>\n", "\n\n").replace("\n<p>", "\n")
+        if cache_key is not None and not messages:
+            render_cache.set(cache_key, (str(content), metadata, messages))
         if full_json:
             return content, metadata, messages
         return mark_safe(content), metadata, messages
@@ -111,17 +200,11 @@ def render_markdown(md_input, *, on_error=None, disable_jsfiddle=True, **kwargs)
         # Success!
         return content, metadata, messages
 
-    # Oops, something went wrong
+    # Oops, something went wrong (failed requests were already retried by the session)
 
-    attempts = kwargs.get("attempts", 0)
     inline = kwargs.get("inline", False) is True
 
-    if attempts < MAX_ATTEMPTS:
-        if not kwargs:
-            kwargs = dict()
-        return render_markdown(md_input, **dict(kwargs, attempts=attempts + 1))
-
-    logger.error("Max attempt count reached, giving up")
+    logger.error("Markdown rendering failed, giving up")
     logger.error(f"md_input: {md_input!r}")
     logger.error(f"kwargs: {kwargs!r}")
 
@@ -132,6 +215,28 @@ def render_markdown(md_input, *, on_error=None, disable_jsfiddle=True, **kwargs)
         return mark_safe(f'<div class="error ico-after"><p>{json.dumps(messages)}</p></div>'), metadata, []
 
 
+def render_markdown_batch(md_inputs, *, output_format="html", disable_jsfiddle=True, **kwargs):
+    """Render several markdown strings with the same options.
+
+    Returns a list of tuples ``(rendered_content, metadata, messages)``,
+    in the order of ``md_inputs``.
+
+    zmarkdown renders one text per request: the texts are rendered with
+    parallel calls to ``render_markdown``, which reuse the connections of
+    the session. Texts found in the render cache are not sent.
+
+    """
+    md_inputs = list(md_inputs)
+
+    def render(md_input):
+        return render_markdown(md_input, output_format=output_format, disable_jsfiddle=disable_jsfiddle, **kwargs)
+
+    if len(md_inputs) < 2:
+        return [render(md_input) for md_input in md_inputs]
+    with ThreadPoolExecutor(max_workers=min(len(md_inputs), settings.ZDS_APP["zmd"].get("pool_size", 10))) as pool:
+        return list(pool.map(render, md_inputs))
+
+
 def render_markdown_stats(md_input, **kwargs):
     """
     Returns contents statistics (words and chars)
@@ -1,6 +1,9 @@
+import uuid
 from collections import defaultdict, OrderedDict
 from django import template
 from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
 
 from zds.forum.models import Forum
 from zds.tutorialv2.models.database import PublishedContent
@@ -9,19 +12,71 @@ from django.db.models import Count, Q
 
 register = template.Library()
 
+TOPBAR_CACHE_KEY = "topbar_{}_{}"
+TOPBAR_VERSION_CACHE_KEY = "topbar_version"
+
+
+def _get_cached(name, compute):
+    """
+    Cache the result of ``compute`` for ``topbar_cache_timeout`` seconds. The keys contain a version, which is changed
+    by ``invalidate_topbar()`` so that all the cached top bars (one per set of groups, per type of publications...)
+    are dropped at once.
+    """
+    timeout = settings.ZDS_APP["site"]["topbar_cache_timeout"]
+    if not timeout:
+        return compute()
+    version = cache.get(TOPBAR_VERSION_CACHE_KEY)
+    if version is None:
+        version = uuid.uuid4().hex
+        cache.set(TOPBAR_VERSION_CACHE_KEY, version, None)
+    key = TOPBAR_CACHE_KEY.format(version, name)
+    value = cache.get(key)
+    if value is None:
+        value = compute()
+        cache.set(key, value, timeout)
+    return value
+
+
+def invalidate_topbar():
+    """
+    Drop the cached top bars, to be called when the forums, the tags or the publications change.
+    """
+    if not settings.ZDS_APP["site"]["topbar_cache_timeout"]:
+        return
+    cache.delete(TOPBAR_VERSION_CACHE_KEY)
+    # a request could compute the top bar again before the changes are committed
+    transaction.on_commit(lambda: cache.delete(TOPBAR_VERSION_CACHE_KEY))
+
 
 @register.filter("topbar_forum_categories")
 def topbar_forum_categories(user):
+    """Get the forums the user can read, by category, and the most used tags of their topics. The result is cached
+    for the users belonging to the same groups.
+
+    :param user: the user
+    :return: a dictionary with the most used ``tags`` and the ``categories``, each of these stored in a tuple of the \
+    form ``title, slug, forums``.
+    :rtype: dict
+    """
+    group_pks = sorted(user.groups.values_list("pk", flat=True)) if user.is_authenticated else []
+    return _get_cached(
+        "forums_{}".format("-".join(str(pk) for pk in group_pks)), lambda: _get_forum_categories(group_pks)
+    )
+
+
+def _get_forum_categories(group_pks):
     max_tags = settings.ZDS_APP["forum"]["top_tag_max"]
     forums = (
-        Forum.objects.filter(Q(groups__isnull=True) | Q(groups__isnull=False, groups__in=user.groups.all()))
+        Forum.objects.filter(Q(groups__isnull=True) | Q(groups__isnull=False, groups__in=group_pks))
         .select_related("category")
+        .prefetch_related("groups")
         .distinct()
         .all()
     )
 
     cats = defaultdict(list)
     for forum in forums:
+        forum.has_group  # computed now, so that it is cached with the forum
         cats[forum.category.position].append(forum)
 
     sorted_cats = sorted(cats)
@@ -35,7 +90,7 @@ def topbar_forum_categories(user):
         .order_by("-count_topic")
         .all()[:max_tags]
     )
-    return {"tags": tags_by_popularity, "categories": topbar_cats}
+    return {"tags": list(tags_by_popularity), "categories": topbar_cats}
 
 
 @register.filter("topbar_publication_categories")
@@ -46,11 +101,15 @@ def topbar_publication_categories(_type):
     :param _type: type of the publication
     :type _type: str
     :return: a dictionary, with the title being the name of the category and the publication a list of subcategories,
-    Each of these are stored in a tuple of the form ``title, slug``.
+    Each of these are stored in a tuple of the form ``title, slug``. The result is cached.
     :rtype: OrderedDict
     """
 
     _type = _type if isinstance(_type, list) else [_type]
+    return _get_cached("publications_{}".format("-".join(_type)), lambda: _get_publication_categories(_type))
+
+
+def _get_publication_categories(_type):
     tags = PublishedContent.objects.get_top_tags(_type, limit=settings.ZDS_APP["forum"]["top_tag_max"])
 
     subcategories_contents = (
@@ -79,4 +138,4 @@ def topbar_publication_categories(_type):
         else:
             cats[key] = [(csc["subcategory__title"], csc["subcategory__slug"], csc["category__slug"])]
 
-    return {"tags": tags, "categories": cats}
+    return {"tags": list(tags), "categories": cats}
@@ -1,11 +1,16 @@
+from io import StringIO
+from unittest.mock import patch
+
 from django.conf import settings
 from django.contrib.auth.models import User
+from django.core.management import call_command
 from django.shortcuts import get_object_or_404
 from django.test import TestCase
 from django.urls import reverse
 from rest_framework import status
 from rest_framework.test import APIClient
 
+from zds.forum.models import Post
 from zds.forum.tests.factories import PostFactory, create_category_and_forum, create_topic_in_forum
 from zds.member.tests.factories import ProfileFactory, StaffProfileFactory
 from zds.tutorialv2.tests.factories import PublishedContentFactory
@@ -214,3 +219,47 @@ class PotentialSpamTests(TutorialTestMixin, TestCase):
         response = self.client.post(url_comment_edit, {"text": "Argh du spam (27)"})
         self.assertEqual(response.status_code, status.HTTP_302_FOUND)
         self.assertEqual(len(Alert.objects.filter(author=bot, comment=comment, text=alert_text, solved=False)), 0)
+
+
+def fake_render(text, **kwargs):
+    """Render each ``@username`` of the text as a ping."""
+    pings = [word[1:] for word in text.split() if word.startswith("@")]
+    return f"<p>{text}</p>", {"ping": pings}, []
+
+
+class CommentMetadataTests(TestCase):
+    def setUp(self):
+        self.author = ProfileFactory()
+        self.pinged = [ProfileFactory().user for _ in range(2)]
+        _, forum = create_category_and_forum()
+        self.post = create_topic_in_forum(forum, self.author).last_message
+
+    @patch("zds.utils.models.render_markdown", side_effect=fake_render)
+    def test_edit_uses_stored_metadata(self, render_markdown):
+        self.post.update_content(f"Hello @{self.pinged[0].username}")
+        self.post.save()
+        self.assertEqual(render_markdown.call_count, 2)  # the text of the factory has no stored metadata
+        self.assertEqual(self.post.text_metadata, {"ping": [self.pinged[0].username]})
+
+        post = Post.objects.get(pk=self.post.pk)
+        with patch("zds.utils.signals.ping.send") as ping, patch("zds.utils.signals.unping.send") as unping:
+            post.update_content(f"Hello @{self.pinged[1].username}")
+            post.save()
+        self.assertEqual(render_markdown.call_count, 3)  # only the new text is rendered
+        self.assertEqual(ping.call_args.kwargs["user"], self.pinged[1])
+        self.assertEqual(unping.call_args.kwargs["user"], self.pinged[0])
+
+    @patch("zds.utils.models.render_markdown", return_value=("", {}, []))
+    def test_metadata_of_failed_render_are_not_stored(self, render_markdown):
+        self.post.update_content("Hello")
+        self.assertIsNone(self.post.text_metadata)
+
+    @patch("zds.utils.management.commands.backfill_comment_metadata.render_markdown_batch")
+    def test_backfill(self, render_markdown_batch):
+        render_markdown_batch.side_effect = lambda texts: [fake_render(text) for text in texts]
+        Post.objects.update(text=f"Hello @{self.pinged[0].username}")
+
+        call_command("backfill_comment_metadata", stdout=StringIO())
+        self.assertEqual(Post.objects.get(pk=self.post.pk).text_metadata, {"ping": [self.pinged[0].username]})
+        call_command("backfill_comment_metadata", stdout=StringIO())
+        self.assertEqual(render_markdown_batch.call_count, 1)
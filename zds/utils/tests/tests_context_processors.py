@@ -1,13 +1,23 @@
+from copy import deepcopy
 from datetime import datetime, timedelta
 
+from django.conf import settings
 from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
 from django.test import TestCase
+from django.test.utils import override_settings
 
 from zds.forum.tests.factories import ForumCategoryFactory, ForumFactory, PostFactory, TopicFactory
 from zds.member.tests.factories import ProfileFactory, StaffProfileFactory
+from zds.notification.models import TopicAnswerSubscription
 from zds.utils.context_processor import header_notifications as notifications_processor
+from zds.tutorialv2.tests.factories import ContentReactionFactory, PublishableContentFactory
+from zds.utils.header_notifications import get_header_notifications, resolve_alerts
 from zds.utils.models import Alert
 
+overridden_zds_app = deepcopy(settings.ZDS_APP)
+overridden_zds_app["notification"]["header_cache_timeout"] = 60
+
 
 class AlertsTest(TestCase):
     def setUp(self):
@@ -60,3 +70,91 @@ class AlertsTest(TestCase):
         r = Request()
         r.user = user
         return notifications_processor(r)
+
+
+class ResolveAlertsTest(TestCase):
+    def setUp(self):
+        self.author = ProfileFactory()
+        category = ForumCategoryFactory(position=1)
+        forum = ForumFactory(category=category, position_in_category=1)
+        self.topics = [TopicFactory(forum=forum, author=self.author.user) for _ in range(2)]
+        self.posts = [PostFactory(topic=topic, author=self.author.user, position=1) for topic in self.topics]
+        self.content = PublishableContentFactory(author_list=[self.author.user])
+        self.reaction = ContentReactionFactory(related_content=self.content, author=self.author.user, position=1)
+
+    def create_alerts(self):
+        alerts = [Alert(comment=post, scope="FORUM") for post in self.posts] + [
+            Alert(profile=self.author, scope="PROFILE"),
+            Alert(content=self.content, scope="CONTENT"),
+            Alert(comment=self.reaction, scope=self.content.type),
+        ]
+        for alert in alerts:
+            alert.author = self.author.user
+            alert.pubdate = datetime.now()
+            alert.text = "pouet"
+            alert.save()
+        return list(Alert.objects.order_by("pk"))
+
+    def test_titles_and_urls(self):
+        alerts = resolve_alerts(self.create_alerts())
+
+        self.assertEqual(
+            [self.topics[0].title, self.posts[0].get_absolute_url()], [alerts[0].target_title, alerts[0].target_url]
+        )
+        self.assertEqual(
+            [self.topics[1].title, self.posts[1].get_absolute_url()], [alerts[1].target_title, alerts[1].target_url]
+        )
+        self.assertEqual(self.author.get_absolute_url() + "#alerts", alerts[2].target_url)
+        self.assertEqual([self.content.title, ""], [alerts[3].target_title, alerts[3].target_url])
+        self.assertEqual(self.content.title, alerts[4].target_title)
+
+    def test_one_query_per_scope(self):
+        alerts = self.create_alerts()
+        # forum, profile, content and content reaction
+        with self.assertNumQueries(4):
+            resolve_alerts(alerts)
+
+
+@override_settings(
+    ZDS_APP=overridden_zds_app, CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+)
+class CachedHeaderNotificationsTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.staff = StaffProfileFactory().user
+        self.author = ProfileFactory().user
+
+        category = ForumCategoryFactory(position=1)
+        forum = ForumFactory(category=category, position_in_category=1)
+        self.topic = TopicFactory(forum=forum, author=self.staff)
+        PostFactory(topic=self.topic, author=self.staff, position=1)
+        self.alert = Alert.objects.create(
+            author=self.author, comment=self.topic.last_message, scope="FORUM", text="pouet", pubdate=datetime.now()
+        )
+
+    def tearDown(self):
+        cache.clear()
+
+    def test_cached_summary_does_not_query_the_database(self):
+        get_header_notifications(self.staff)
+        with self.assertNumQueries(0):
+            header_notifications = get_header_notifications(self.staff)
+        self.assertEqual(1, header_notifications["alerts"]["total"])
+
+    def test_summary_is_invalidated_by_notifications(self):
+        self.assertEqual(0, get_header_notifications(self.staff)["general_notifications"]["total"])
+
+        PostFactory(topic=self.topic, author=self.author, position=2)
+        self.assertEqual(1, get_header_notifications(self.staff)["general_notifications"]["total"])
+
+        TopicAnswerSubscription.objects.get_existing(self.staff, self.topic).mark_notification_read()
+        self.assertEqual(0, get_header_notifications(self.staff)["general_notifications"]["total"])
+
+    def test_alerts_are_shared_and_invalidated(self):
+        other_staff = StaffProfileFactory().user
+        self.assertEqual(1, get_header_notifications(self.staff)["alerts"]["total"])
+        self.assertFalse(get_header_notifications(self.author)["alerts"])
+
+        self.alert.solve(other_staff, "done")
+        self.assertEqual(0, get_header_notifications(other_staff)["alerts"]["total"])
+        self.assertEqual(0, get_header_notifications(self.staff)["alerts"]["total"])
@@ -1,9 +1,20 @@
+from copy import deepcopy
 from textwrap import dedent
 
+from django.conf import settings
 from django.test import TestCase
+from django.test.utils import override_settings
 from django.template import Context, Template
 
-from zds.utils.templatetags.emarkdown import shift_heading
+from zds.utils.render_cache import reset_render_cache
+from zds.utils.templatetags import emarkdown as emarkdown_module
+from zds.utils.templatetags.emarkdown import (
+    get_zmd_session_stats,
+    render_markdown,
+    render_markdown_batch,
+    shift_heading,
+)
+from zds.utils.tests.zmd_server import FakeZmdServer
 
 
 class EMarkdownTest(TestCase):
@@ -97,3 +108,65 @@ class EMarkdownTest(TestCase):
         """
         )
         self.assertEqual(shift_heading(sharp_in_code_with_antiquotes, 1), result_sharp_in_code_with_antiquotes)
+
+
+overridden_zds_app = deepcopy(settings.ZDS_APP)
+overridden_zds_app["zmd"]["render_cache"]["enabled"] = False
+overridden_zds_app["zmd"]["retry_backoff"] = 0
+
+
+@override_settings(ZDS_APP=overridden_zds_app)
+class ZmdSessionTest(TestCase):
+    def setUp(self):
+        reset_render_cache()
+        emarkdown_module._session = None
+
+    def tearDown(self):
+        reset_render_cache()
+        emarkdown_module._session = None
+
+    def test_connection_is_reused(self):
+        with FakeZmdServer() as server, self.settings(ZDS_APP=self.zmd_app(server)):
+            for text in ("a", "b", "c"):
+                content, *_ = render_markdown(text)
+                self.assertEqual(content, text)
+            self.assertEqual(len(server.requests), 3)
+            self.assertEqual(get_zmd_session_stats(), {"requests": 3, "connections": 1, "reused": 2})
+
+    def test_unavailable_server_is_retried(self):
+        statuses = [503, 502]
+
+        def responder(path, body):
+            if statuses:
+                return statuses.pop(0), {}
+            return 200, ["<p>ok</p>", {}, []]
+
+        with FakeZmdServer(responder) as server, self.settings(ZDS_APP=self.zmd_app(server)):
+            content, *_ = render_markdown("ok")
+        self.assertEqual(content, "<p>ok</p>")
+        self.assertEqual(len(server.requests), 3)
+
+    def test_batch_rendering(self):
+        texts = [f"text {i}" for i in range(10)]
+        with FakeZmdServer() as server, self.settings(ZDS_APP=self.zmd_app(server)):
+            rendered = render_markdown_batch(texts, inline=True)
+        self.assertEqual([content for content, *_ in rendered], texts)
+        # one request per text, on the usual endpoint
+        self.assertEqual(sorted(body["md"] for _, body in server.requests), sorted(texts))
+        self.assertTrue(all(path == "/html" and body["opts"]["inline"] for path, body in server.requests))
+
+    def test_batch_rendering_skips_cached_texts(self):
+        zds_app = deepcopy(overridden_zds_app)
+        zds_app["zmd"]["render_cache"] = {"enabled": True, "local_max_entries": 10, "shared_cache": None}
+        with FakeZmdServer() as server, self.settings(ZDS_APP=self.zmd_app(server, zds_app)):
+            reset_render_cache()
+            render_markdown("b")
+            rendered = render_markdown_batch(["a", "b", "c"])
+        self.assertEqual([content for content, *_ in rendered], ["a", "b", "c"])
+        self.assertEqual(sorted(body["md"] for _, body in server.requests[1:]), ["a", "c"])
+
+    @staticmethod
+    def zmd_app(server, zds_app=overridden_zds_app):
+        zds_app = deepcopy(zds_app)
+        zds_app["zmd"]["server"] = server.url
+        return zds_app
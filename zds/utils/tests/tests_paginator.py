@@ -0,0 +1,37 @@
+from django.core.paginator import EmptyPage
+from django.test import TestCase
+
+from zds.forum.models import Post
+from zds.forum.tests.factories import ForumCategoryFactory, ForumFactory, TopicFactory, PostFactory
+from zds.member.tests.factories import ProfileFactory
+from zds.utils.paginator import PositionPaginator
+
+
+class PositionPaginatorTest(TestCase):
+    def setUp(self):
+        author = ProfileFactory().user
+        self.topic = TopicFactory(forum=ForumFactory(category=ForumCategoryFactory()), author=author)
+        self.posts = [PostFactory(topic=self.topic, author=author, position=i) for i in range(1, 8)]
+        self.queryset = Post.objects.filter(topic=self.topic)
+
+    def test_pages_are_made_of_positions(self):
+        paginator = PositionPaginator(self.queryset, 3, last_position=7)
+        self.assertEqual(7, paginator.count)
+        self.assertEqual(3, paginator.num_pages)
+        self.assertEqual(self.posts[:3], list(paginator.page(1)))
+        self.assertEqual(self.posts[3:6], list(paginator.page(2)))
+        self.assertEqual(self.posts[6:], list(paginator.page(3)))
+        with self.assertRaises(EmptyPage):
+            paginator.page(4)
+
+    def test_previous_item_is_fetched_with_the_page(self):
+        paginator = PositionPaginator(self.queryset, 3, last_position=7, with_previous_item=True)
+        self.assertEqual(self.posts[:3], list(paginator.page(1)))
+        with self.assertNumQueries(1):
+            self.assertEqual(self.posts[2:6], list(paginator.page(2)))
+
+    def test_missing_positions_do_not_shift_the_pages(self):
+        self.posts[1].delete()
+        paginator = PositionPaginator(self.queryset, 3, last_position=7)
+        self.assertEqual([self.posts[0], self.posts[2]], list(paginator.page(1)))
+        self.assertEqual(self.posts[3:6], list(paginator.page(2)))
@@ -0,0 +1,127 @@
+from unittest.mock import Mock, patch
+
+from django.core.cache import cache
+from django.test import TestCase
+
+from zds.utils import render_cache as render_cache_module
+from zds.utils.render_cache import (
+    DjangoCacheBackend,
+    LocalLRUBackend,
+    RenderCache,
+    is_cacheable,
+    make_render_key,
+)
+from zds.utils.templatetags.emarkdown import _render_markdown_once
+
+
+def zmd_response(content, metadata=None, messages=None, status_code=200):
+    response = Mock(status_code=status_code)
+    response.json.return_value = [content, metadata or {}, messages or []]
+    return response
+
+
+class RenderKeyTest(TestCase):
+    def test_key_ignores_options_order(self):
+        self.assertEqual(
+            make_render_key("**a**", "html", {"inline": True, "disable_ping": True}),
+            make_render_key("**a**", "html", {"disable_ping": True, "inline": True}),
+        )
+
+    def test_key_depends_on_input_format_and_options(self):
+        key = make_render_key("**a**", "html", {"inline": True})
+        self.assertNotEqual(key, make_render_key("**b**", "html", {"inline": True}))
+        self.assertNotEqual(key, make_render_key("**a**", "tex", {"inline": True}))
+        self.assertNotEqual(key, make_render_key("**a**", "html", {"inline": False}))
+
+    def test_side_effects_are_not_cacheable(self):
+        self.assertTrue(is_cacheable("html", False, {"inline": True}))
+        self.assertFalse(is_cacheable("html", True, {}))
+        self.assertFalse(is_cacheable("epub", False, {"images_download_dir": "/tmp/images"}))
+
+
+class RenderCacheTest(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_lru_eviction(self):
+        backend = LocalLRUBackend(max_entries=2)
+        backend.set("a", 1)
+        backend.set("b", 2)
+        backend.get("a")  # "b" is now the least recently used
+        backend.set("c", 3)
+        self.assertEqual(len(backend), 2)
+        self.assertIsNone(backend.get("b"))
+        self.assertEqual(backend.get("a"), 1)
+        self.assertEqual(backend.get("c"), 3)
+
+    @patch("zds.utils.render_cache.time.monotonic")
+    def test_local_expiration(self, monotonic):
+        monotonic.return_value = 1000
+        backend = LocalLRUBackend(timeout=60)
+        backend.set("a", 1)
+        monotonic.return_value = 1059
+        self.assertEqual(backend.get("a"), 1)
+        monotonic.return_value = 1060
+        self.assertIsNone(backend.get("a"))
+        self.assertEqual(len(backend), 0)
+
+    def test_local_timeout_from_config(self):
+        render_cache = RenderCache.from_config({"shared_cache": "default", "shared_timeout": 60})
+        self.assertEqual([backend.timeout for backend in render_cache.backends], [60, 60])
+
+    def test_counters_and_promotion(self):
+        local = LocalLRUBackend()
+        render_cache = RenderCache([local, DjangoCacheBackend("default", 60)])
+        self.assertIsNone(render_cache.get("key"))
+
+        render_cache.set("key", ("<p>a</p>", {}, []))
+        local.clear()
+        self.assertEqual(render_cache.get("key"), ("<p>a</p>", {}, []))
+        self.assertEqual(render_cache.get("key"), ("<p>a</p>", {}, []))
+
+        self.assertEqual(render_cache.stats(), {"miss": 1, "local": 1, "shared": 1, "hit": 2})
+
+
+class CachedRenderingTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        render_cache_module._render_cache = RenderCache([LocalLRUBackend()])
+
+    def tearDown(self):
+        render_cache_module.reset_render_cache()
+
+    @patch("zds.utils.templatetags.emarkdown.get_zmd_session")
+    def test_same_render_is_requested_once(self, get_zmd_session):
+        post = get_zmd_session.return_value.post
+        post.return_value = zmd_response("<p><strong>a</strong></p>", {"ping": ["user"]})
+        first = _render_markdown_once("**a**", disable_jsfiddle=True)
+        first[1]["ping"].append("altered")
+        second = _render_markdown_once("**a**", disable_jsfiddle=True)
+
+        self.assertEqual(post.call_count, 1)
+        self.assertEqual(second, ("<p><strong>a</strong></p>", {"ping": ["user"]}, []))
+        self.assertEqual(render_cache_module.get_render_cache().stats()["hit"], 1)
+
+        _render_markdown_once("**a**", disable_jsfiddle=True, inline=True)
+        self.assertEqual(post.call_count, 2)
+
+    @patch("zds.utils.templatetags.emarkdown.get_zmd_session")
+    def test_failed_render_is_not_cached(self, get_zmd_session):
+        post = get_zmd_session.return_value.post
+        post.return_value = zmd_response("", messages=[{"message": "error"}])
+        _render_markdown_once("**a**")
+        _render_markdown_once("**a**")
+        self.assertEqual(post.call_count, 2)
+
+        post.return_value = zmd_response("", status_code=500)
+        _render_markdown_once("**b**")
+        _render_markdown_once("**b**")
+        self.assertEqual(post.call_count, 4)
+
+    @patch("zds.utils.templatetags.emarkdown.get_zmd_session")
+    def test_render_downloading_images_is_not_cached(self, get_zmd_session):
+        post = get_zmd_session.return_value.post
+        post.return_value = zmd_response("<p>a</p>")
+        _render_markdown_once("a", output_format="epub", images_download_dir="/tmp/images")
+        _render_markdown_once("a", output_format="epub", images_download_dir="/tmp/images")
+        self.assertEqual(post.call_count, 2)
@@ -1,6 +1,10 @@
-from django.contrib.auth.models import Group
+from copy import deepcopy
 
+from django.conf import settings
+from django.contrib.auth.models import Group
+from django.core.cache import cache
 from django.test import TestCase
+from django.test.utils import override_settings
 
 from zds.forum.tests.factories import ForumCategoryFactory, ForumFactory, TopicFactory
 from zds.member.tests.factories import ProfileFactory, StaffProfileFactory
@@ -153,3 +157,51 @@ class TopBarTests(TutorialTestMixin, TestCase):
         expected_2 = [(subcategory_3.title, subcategory_3.slug, category_2.slug)]
         self.assertEqual(top_categories_contents[category_1.title], expected)
         self.assertEqual(top_categories_contents[category_2.title], expected_2)
+
+
+overridden_zds_app = deepcopy(settings.ZDS_APP)
+overridden_zds_app["site"]["topbar_cache_timeout"] = 60
+
+
+@override_settings(
+    ZDS_APP=overridden_zds_app, CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+)
+class CachedTopBarTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = ProfileFactory().user
+        self.staff = StaffProfileFactory().user
+        self.forum = ForumFactory(category=ForumCategoryFactory(position=1), position_in_category=1)
+        self.staff_forum = ForumFactory(category=self.forum.category, position_in_category=2)
+        self.staff_forum.groups.add(Group.objects.filter(name="staff").first())
+        self.topic = TopicFactory(forum=self.forum, author=self.user)
+        self.topic.add_tags(["tag"])
+
+    def tearDown(self):
+        cache.clear()
+
+    def test_cached_for_the_users_of_the_same_groups(self):
+        topbar_forum_categories(self.user)
+        with self.assertNumQueries(1):  # the groups of the user
+            top = topbar_forum_categories(self.user)
+        self.assertEqual([self.forum], top["categories"][0][2])
+        self.assertEqual(["tag"], [tag.title for tag in top["tags"]])
+        with self.assertNumQueries(0):
+            self.assertFalse(top["categories"][0][2][0].has_group)
+
+        # the staff does not share the cache of the members
+        self.assertEqual([self.forum, self.staff_forum], topbar_forum_categories(self.staff)["categories"][0][2])
+
+    def test_invalidated_by_forum_and_tag_changes(self):
+        topbar_forum_categories(self.user)
+
+        other_topic = TopicFactory(forum=self.forum, author=self.user)
+        other_topic.add_tags(["other tag", "tag"])
+        self.assertEqual(["tag", "other tag"], [tag.title for tag in topbar_forum_categories(self.user)["tags"]])
+
+        self.forum.title = "New title"
+        self.forum.save()
+        self.assertEqual("New title", topbar_forum_categories(self.user)["categories"][0][2][0].title)
+
+        self.staff_forum.groups.clear()
+        self.assertEqual(2, len(topbar_forum_categories(self.user)["categories"][0][2]))
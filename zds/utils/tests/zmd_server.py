@@ -0,0 +1,48 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class FakeZmdServer:
+    """
+    Local stand-in for the zmarkdown server, to test the HTTP client without node.
+
+    ``responder`` receives the path and the decoded JSON body of each request and returns a tuple
+    ``(status_code, payload)``. By default, the markdown is sent back as is. Requests are recorded in
+    ``self.requests``. Use it as a context manager; ``self.url`` is the address to put in
+    ``ZDS_APP["zmd"]["server"]``.
+    """
+
+    def __init__(self, responder=None):
+        self.responder = responder or (lambda path, body: (200, [body["md"], {}, []]))
+        self.requests = []
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # keep connections alive
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                server.requests.append((self.path, body))
+                status_code, payload = server.responder(self.path, body)
+                data = json.dumps(payload).encode("utf-8")
+                self.send_response(status_code)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.httpd.daemon_threads = True
+        self.url = "http://127.0.0.1:{}".format(self.httpd.server_address[1])
+
+    def __enter__(self):
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *args):
+        self.httpd.shutdown()
+        self.httpd.server_close()